@@ -0,0 +1,4 @@
+"""Offline benchmarks for the prediction service: micro-benchmarks, an in-process load test and baseline comparison.
+
+Run from the ``RadioSignalsML`` folder: ``python -m benchmarks run`` / ``python -m benchmarks compare``.
+"""
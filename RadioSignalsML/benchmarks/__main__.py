@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+from service.config import ServiceConfig
+
+from . import report
+from .load import run_load
+from .micro import available_technologies, run_micro
+from .payloads import load_payloads, sample
+from .startup import check_budget, format_startup, run_startup
+
+
+def _sizes(text: str):
+    return [int(part) for part in text.split(",") if part.strip()]
+
+
+def _compare(baseline: Path, current: dict, tolerance: float) -> int:
+    previous = report.read(baseline)
+    differences = report.environment_differences(previous, current)
+    if differences:
+        print(f"{baseline} was recorded in another environment; timings are not comparable as-is:", file=sys.stderr)
+        for line in differences:
+            print(f"  {line}", file=sys.stderr)
+    rows = report.compare(previous, current, tolerance)
+    print(report.format_comparison(rows))
+    regressed = [row["name"] for row in rows if row["regressed"]]
+    if regressed:
+        print(f"\n{len(regressed)} regression(s) beyond {tolerance:.0%} against {baseline}", file=sys.stderr)
+        return 1
+    print(f"\nno regressions beyond {tolerance:.0%} against {baseline}")
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m benchmarks")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="Run the benchmarks and write a JSON report")
+    run.add_argument("--data", type=Path, default=Path("signal_data.xlsx"), help="Workbook the payloads are drawn from")
+    run.add_argument("--cache-dir", type=str, default=".cache", help="Cleaned-data cache shared with training")
+    run.add_argument("--out", type=Path, default=Path("benchmarks/results/latest.json"))
+    run.add_argument("--batch-sizes", type=_sizes, default=[1, 10, 100, 1000, 10000])
+    run.add_argument("--min-calls", type=int, default=5, help="Timed calls per micro-benchmark, at least")
+    run.add_argument("--min-seconds", type=float, default=1.0, help="Time per micro-benchmark, at least")
+    run.add_argument("--requests", type=int, default=2000, help="Requests sent by each load test")
+    run.add_argument("--concurrency", type=_sizes, default=[1, 64], help="Concurrent clients per load test")
+    run.add_argument("--unbatched", action="store_true", help="Also run the load tests with micro-batching off")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--skip-micro", action="store_true")
+    run.add_argument("--skip-load", action="store_true")
+    run.add_argument("--skip-startup", action="store_true")
+    run.add_argument("--startup-runs", type=int, default=5, help="Fresh interpreters timed by the startup benchmark")
+    run.add_argument("--baseline", type=Path, default=None, help="Compare against this report after running")
+    run.add_argument("--tolerance", type=float, default=0.25, help="Relative change counted as a regression")
+
+    start = sub.add_parser("startup", help="Time cold starts; exits 1 when over budget or a heavy module loads")
+    start.add_argument("--runs", type=int, default=5, help="Fresh interpreters, each importing service.main")
+    start.add_argument("--budget-ms", type=float, default=None, help="Median budget (default: STARTUP_BUDGET_MS)")
+
+    cmp = sub.add_parser("compare", help="Compare two reports; exits 1 when CURRENT regressed")
+    cmp.add_argument("baseline", type=Path)
+    cmp.add_argument("current", type=Path)
+    cmp.add_argument("--tolerance", type=float, default=0.25)
+
+    args = ap.parse_args(argv)
+    if args.command == "compare":
+        return _compare(args.baseline, report.read(args.current), args.tolerance)
+
+    config = ServiceConfig.from_env()
+    if args.command == "startup":
+        budget = config.startup_budget_ms if args.budget_ms is None else args.budget_ms
+        result = run_startup(args.runs)
+        print(format_startup(result, budget))
+        problems = check_budget(result, budget)
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        return 1 if problems else 0
+
+    payloads = load_payloads(args.data, args.cache_dir)
+    meta = {
+        **report.environment(),
+        "model_backend": config.model_backend,
+        "models": available_technologies(config),
+        "payload_rows": {tech: len(rows) for tech, rows in payloads.items()},
+        "seed": args.seed,
+    }
+    results = []
+    if not args.skip_startup:
+        results.append(run_startup(args.startup_runs))
+    if not args.skip_micro:
+        results += run_micro(config, payloads, args.batch_sizes, args.seed, args.min_calls, args.min_seconds)
+    if not args.skip_load:
+        # a mixed stream in the sheet's technology proportions, limited to technologies that have a model
+        pool = [p for tech in meta["models"] for p in payloads[tech]]
+        stream = sample(pool, args.requests, args.seed)
+        for concurrency in args.concurrency:
+            results.append(run_load(stream, concurrency))
+            if args.unbatched:
+                results.append(run_load(stream, concurrency, microbatch=False))
+    report.write(args.out, meta, results)
+    print(report.format_results(results))
+    print(f"\nwrote {args.out}")
+    if args.baseline is not None:
+        return _compare(args.baseline, {"meta": meta, "results": results}, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
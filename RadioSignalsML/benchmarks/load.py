@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+from typing import Any, Dict, List, Sequence, Tuple
+
+from .report import summarize
+
+
+async def _drive(app, payloads: Sequence[Dict[str, Any]], concurrency: int) -> Tuple[List[float], Dict[int, int], float]:
+    import httpx  # test-client dependency of FastAPI; not needed by the service itself
+
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    queue = iter(payloads)
+
+    async def client_loop(client):
+        for payload in queue:
+            t0 = time.perf_counter()
+            response = await client.post("/predict", json=payload)
+            latencies.append(time.perf_counter() - t0)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        # untimed: loads the models and starts the micro-batch lanes
+        for payload in {p["technology"]: p for p in payloads}.values():
+            await client.post("/predict", json=payload)
+        start = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        return latencies, statuses, time.perf_counter() - start
+
+
+def run_load(
+    payloads: Sequence[Dict[str, Any]],
+    concurrency: int,
+    microbatch: bool = True,
+    cache: bool = False,
+) -> Dict[str, Any]:
+    """Sends ``payloads`` to an in-process ``/predict`` from ``concurrency`` concurrent clients.
+
+    The app is built by ``service.main.build_app`` as in production; ``microbatch`` and ``cache`` toggle the
+    micro-batcher and the prediction cache through their environment variables.  No socket is opened, so the
+    numbers cover routing, validation, scoring and serialisation but not HTTP parsing.
+    """
+    overrides = {
+        "MICROBATCH_ENABLED": "true" if microbatch else "false",
+        "PREDICTION_CACHE_MAX_ENTRIES": os.environ.get("PREDICTION_CACHE_MAX_ENTRIES", "10000") if cache else "0",
+        "WARMUP_ENABLED": "false",
+        "LOG_SAMPLE_RATE": "0",
+        "LOG_SLOW_MS": "0",
+    }
+    saved = {key: os.environ.get(key) for key in overrides}
+    os.environ.update(overrides)
+    try:
+        from service.main import build_app
+
+        app = build_app()
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+    latencies, statuses, wall = asyncio.run(_drive(app, payloads, concurrency))
+    name = f"load.predict.c{concurrency}" + ("" if microbatch else ".unbatched") + (".cached" if cache else "")
+    return summarize(name, latencies, 1, wall, statuses={str(k): v for k, v in sorted(statuses.items())})
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+from service.arrow_batch import encode_payloads, read_table, table_columns, validate_table, write_table
+from service.batch_features import BatchFeatureMapper
+from service.config import ServiceConfig
+from service.feature_mapping import build_feature_vector
+from service.location_lookup import load_location_lookup
+from service.model_store import ModelStore
+from service.predictor import SignalPredictorService
+
+from .payloads import sample
+from .report import summarize
+
+_STAGES = ("map_features", "map_columns", "model_store", "model_columns", "service", "service_arrow")
+
+
+def time_calls(fn: Callable[[], Any], min_calls: int, min_seconds: float, max_calls: int = 100_000) -> Tuple[List[float], float]:
+    """Calls ``fn`` once untimed, then until both ``min_calls`` and ``min_seconds`` are reached."""
+    fn()
+    latencies: List[float] = []
+    start = time.perf_counter()
+    while len(latencies) < max_calls:
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+        if len(latencies) >= min_calls and time.perf_counter() - start >= min_seconds:
+            break
+    return latencies, time.perf_counter() - start
+
+
+def available_technologies(config: ServiceConfig) -> Dict[str, str]:
+    """Technology -> model version for every artifact that loads; missing ones are left out."""
+    store = ModelStore(config.digital_model_path, config.fm_model_path, config.model_backend)
+    out = {}
+    for technology in ("digital", "fm"):
+        try:
+            out[technology] = store.get_version(technology)
+        except FileNotFoundError:
+            continue
+    return out
+
+
+def run_micro(
+    config: ServiceConfig,
+    payloads: Dict[str, List[Dict[str, Any]]],
+    batch_sizes: Sequence[int],
+    seed: int = 0,
+    min_calls: int = 5,
+    min_seconds: float = 1.0,
+) -> List[Dict[str, Any]]:
+    """Times feature mapping, ``ModelStore`` scoring and the full service path at each batch size.
+
+    The prediction cache is disabled so every call reaches the model.  Batch size 1 uses the single-row
+    entry points (``ModelStore.predict``, ``SignalPredictorService.predict``); larger sizes the batch ones.
+    ``map_columns`` / ``model_columns`` time the columnar path (``BatchFeatureMapper`` into
+    ``ModelStore.predict_columns``) at every size.  ``service_arrow`` is ``/predict/batch`` with an Arrow body
+    and ``features=false`` minus HTTP: decode, validate, ``predict_table`` and encode.
+    """
+    config = dataclasses.replace(config, cache_max_entries=0)
+    lookup = load_location_lookup(config.location_lookup_path)
+    mapper = BatchFeatureMapper(lookup)
+    store = ModelStore(config.digital_model_path, config.fm_model_path, config.model_backend)
+    service = SignalPredictorService(config)
+    available = available_technologies(config)
+    results: List[Dict[str, Any]] = []
+
+    for technology, rows in payloads.items():
+        for size in batch_sizes:
+            suffix = f"{technology}.batch{size}"
+            if technology not in available:
+                for stage in _STAGES:
+                    results.append({"name": f"micro.{stage}.{suffix}", "skipped": "model artifact missing"})
+                continue
+            batch = sample(rows, size, seed)
+            vectors = [build_feature_vector(payload, lookup) for payload in batch]
+            features = [vector.features for vector in vectors]
+            columns = mapper.map(batch).groups[technology].columns
+            stream = encode_payloads(batch)
+
+            def map_features():
+                for payload in batch:
+                    build_feature_vector(payload, lookup)
+
+            if size == 1:
+                def model_store():
+                    store.predict(vectors[0])
+
+                def full_service():
+                    service.predict(batch[0])
+            else:
+                def model_store():
+                    store.predict_batch(technology, features)
+
+                def full_service():
+                    service.predict_batch(batch)
+
+            def map_columns():
+                mapper.map(batch)
+
+            def model_columns():
+                store.predict_columns(technology, columns)
+
+            def service_arrow():
+                table = read_table(stream)
+                invalid = validate_table(table)
+                write_table(service.predict_table(*table_columns(table), invalid, features=False))
+
+            stages = (map_features, map_columns, model_store, model_columns, full_service, service_arrow)
+            for stage, fn in zip(_STAGES, stages):
+                latencies, wall = time_calls(fn, min_calls, min_seconds)
+                results.append(
+                    summarize(f"micro.{stage}.{suffix}", latencies, size, wall, model_version=available[technology])
+                )
+    return results
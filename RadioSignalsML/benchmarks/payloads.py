@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import math
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+_TECHNOLOGIES = {"digital": "DIGITAL_TV", "fm": "FM"}
+
+
+def _value(value: Any) -> Optional[Any]:
+    return None if pd.isna(value) else value
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(number) else number
+
+
+def load_payloads(excel_path: Path, cache_dir: Optional[str] = ".cache") -> Dict[str, List[Dict[str, Any]]]:
+    """Turns every usable measurement row of the workbook into a ``/predict`` request body, per technology.
+
+    Rows go through the training cleaner (and its Feather cache), so the payloads carry the same settlements,
+    programs and emitters the models were trained on.  The sheet has coordinates for a minority of rows; the
+    rest get the sheet median, as the backend would send some coordinate for every site.
+    """
+    from train_signal_models import load_cleaned  # training module; only the benchmarks need it here
+
+    data = load_cleaned(str(excel_path), cache_dir)
+    medians = {col: float(data[col].median()) for col in ("latitude", "longitude", "elevation_m")}
+    out: Dict[str, List[Dict[str, Any]]] = {tech: [] for tech in _TECHNOLOGIES}
+    for row in data.to_dict("records"):
+        tech = row.get("tech")
+        if tech not in _TECHNOLOGIES or _value(row.get("date")) is None:
+            continue
+        if tech == "digital" and _number(row.get("tv_channel")) is None:
+            continue
+        if tech == "fm" and _number(row.get("fm_freq_mhz")) is None:
+            continue
+        payload = {
+            "technology": _TECHNOLOGIES[tech],
+            "date": row["date"].isoformat(),
+            "population": _number(row.get("population")) or 0,
+            "households": _number(row.get("households")) or 0,
+            "registry_number": _value(row.get("place_id")),
+            "municipality": _value(row.get("municipality")),
+            "settlement": _value(row.get("settlement")),
+            "program_identifier": _value(row.get("program_id")),
+            "transmitter_location": _value(row.get("emitter")),
+        }
+        for col, median in medians.items():
+            number = _number(row.get(col))
+            payload[col] = median if number is None else number
+        if tech == "digital":
+            payload["channel_number"] = int(row["tv_channel"])
+        else:
+            payload["frequency_mhz"] = float(row["fm_freq_mhz"])
+        out[tech].append(payload)
+    return out
+
+
+def sample(payloads: List[Dict[str, Any]], n: int, seed: int) -> List[Dict[str, Any]]:
+    """``n`` payloads drawn with replacement; the same seed always yields the same list."""
+    if not payloads:
+        return []
+    index = np.random.default_rng(seed).integers(0, len(payloads), size=n)
+    return [dict(payloads[i]) for i in index]
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+
+def summarize(name: str, latencies_s: Sequence[float], rows_per_call: int, wall_s: float, **extra: Any) -> Dict[str, Any]:
+    """One result record: latency percentiles per call in milliseconds plus throughput over the wall time."""
+    ms = np.asarray(latencies_s, dtype=float) * 1000.0
+    calls = int(ms.size)
+    return {
+        "name": name,
+        "calls": calls,
+        "rows_per_call": rows_per_call,
+        "p50_ms": float(np.percentile(ms, 50)) if calls else None,
+        "p95_ms": float(np.percentile(ms, 95)) if calls else None,
+        "p99_ms": float(np.percentile(ms, 99)) if calls else None,
+        "mean_ms": float(ms.mean()) if calls else None,
+        "rows_per_sec": (calls * rows_per_call / wall_s) if wall_s > 0 else None,
+        **extra,
+    }
+
+
+def environment() -> Dict[str, Any]:
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "scikit_learn": sklearn.__version__,
+    }
+
+
+def write(path: Path, meta: Dict[str, Any], results: List[Dict[str, Any]]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"meta": meta, "results": results}, indent=2), encoding="utf-8")
+
+
+def read(path: Path) -> Dict[str, Any]:
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+# meta keys that make two reports' timings comparable; the timestamp, commit and seed may differ freely
+ENVIRONMENT_KEYS = ("python", "platform", "processor", "cpu_count", "numpy", "scikit_learn", "model_backend", "models")
+
+
+def environment_differences(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """The ENVIRONMENT_KEYS on which two reports' ``meta`` disagree, as "key: baseline -> current" lines."""
+    before, after = baseline.get("meta", {}), current.get("meta", {})
+    return [
+        f"{key}: {before.get(key)} -> {after.get(key)}" for key in ENVIRONMENT_KEYS if before.get(key) != after.get(key)
+    ]
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """Pairs results by name; a pair regressed when p50 or p95 grew, or rows/sec fell, by more than ``tolerance``."""
+    previous = {r["name"]: r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = previous.get(result["name"])
+        if before is None or result.get("skipped") or before.get("skipped"):
+            continue
+        changes = {}
+        for key in ("p50_ms", "p95_ms", "rows_per_sec"):
+            if before.get(key) and result.get(key) is not None:
+                changes[key] = result[key] / before[key] - 1.0
+        regressed = [
+            key for key, change in changes.items()
+            if (change < -tolerance if key == "rows_per_sec" else change > tolerance)
+        ]
+        rows.append({"name": result["name"], "changes": changes, "regressed": regressed})
+    return rows
+
+
+def format_results(results: List[Dict[str, Any]]) -> str:
+    lines = [f"{'benchmark':<44} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rows/s':>11}"]
+    for r in results:
+        if r.get("skipped"):
+            lines.append(f"{r['name']:<44} skipped: {r['skipped']}")
+            continue
+        lines.append(
+            f"{r['name']:<44} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['rows_per_sec']:>11.0f}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(rows: List[Dict[str, Any]]) -> str:
+    lines = [f"{'benchmark':<44} {'p50':>8} {'p95':>8} {'rows/s':>8}"]
+    for row in rows:
+        cells = [
+            f"{row['changes'][key] * 100:>+7.1f}%" if key in row["changes"] else f"{'-':>8}"
+            for key in ("p50_ms", "p95_ms", "rows_per_sec")
+        ]
+        flag = "  REGRESSED (" + ", ".join(row["regressed"]) + ")" if row["regressed"] else ""
+        lines.append(f"{row['name']:<44} {' '.join(cells)}{flag}")
+    return "\n".join(lines)
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from .report import summarize
+
+# modules building the app must not import: pandas/sklearn/joblib come with a pickled pipeline, scipy with the
+# settlement index's KD-tree, both loaded by warm-up or the first request that needs them; pyarrow with the
+# first Arrow batch
+HEAVY_MODULES = ("pandas", "sklearn", "joblib", "scipy", "pyarrow")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from service.main import app
+from service.startup import PROFILER
+print(json.dumps({
+    "wall_ms": (time.perf_counter() - start) * 1000.0,
+    "profile": PROFILER.report(),
+    "heavy_modules": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def _cold_start(env: Dict[str, str]) -> Dict[str, Any]:
+    root = Path(__file__).resolve().parent.parent
+    done = subprocess.run(
+        [sys.executable, "-c", _PROBE], cwd=root, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(done.stdout.strip().splitlines()[-1])
+
+
+def run_startup(runs: int = 5, env: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Imports ``service.main`` and builds ``app`` in ``runs`` fresh interpreters.
+
+    Each sample is the time from ``import service.main`` to a built app, as a new uvicorn worker pays it
+    (interpreter start-up excluded); the profile of the fastest run is kept for the report.
+    """
+    env = {**os.environ, **(env or {})}
+    samples: List[Dict[str, Any]] = [_cold_start(env) for _ in range(runs)]
+    walls = [s["wall_ms"] / 1000.0 for s in samples]
+    fastest = min(samples, key=lambda s: s["wall_ms"])
+    return summarize(
+        "startup/import_and_build",
+        walls,
+        1,
+        sum(walls),
+        best_ms=fastest["wall_ms"],
+        phases_ms=fastest["profile"]["phases_ms"],
+        slowest_packages_ms=dict(list(fastest["profile"]["packages_ms"].items())[:5]),
+        heavy_modules=sorted({m for s in samples for m in s["heavy_modules"]}),
+    )
+
+
+def check_budget(result: Dict[str, Any], budget_ms: float) -> List[str]:
+    """Reasons ``result`` fails the cold-start budget: a median over ``budget_ms`` or a heavy module imported."""
+    problems = []
+    if budget_ms > 0 and result["p50_ms"] > budget_ms:
+        problems.append(f"median cold start {result['p50_ms']:.0f} ms is over the {budget_ms:.0f} ms budget")
+    if result["heavy_modules"]:
+        problems.append("cold start imported " + ", ".join(result["heavy_modules"]))
+    return problems
+
+
+def format_startup(result: Dict[str, Any], budget_ms: float) -> str:
+    lines = [
+        f"cold start: median {result['p50_ms']:.1f} ms, best {result['best_ms']:.1f} ms over {result['calls']} runs"
+        + (f" (budget {budget_ms:.0f} ms)" if budget_ms > 0 else ""),
+        "phases: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in result["phases_ms"].items()),
+        "slowest packages: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in result["slowest_packages_ms"].items()),
+    ]
+    return "\n".join(lines)
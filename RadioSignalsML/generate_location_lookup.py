@@ -1,7 +1,10 @@
 ﻿import json
 from collections import Counter
 from pathlib import Path
-from train_signal_models import load_and_clean
+
+import pandas as pd
+
+from train_signal_models import load_cleaned
 
 
 def pick_mode(values):
@@ -12,8 +15,15 @@ def pick_mode(values):
     return max(counts.items(), key=lambda kv: (kv[1], kv[0]))[0]
 
 
+def pick_median(values):
+    numeric = pd.to_numeric(
+        values.astype(str).str.replace(',', '.').str.extract(r'(-?\d+(?:\.\d+)?)')[0], errors='coerce'
+    ).dropna()
+    return round(float(numeric.median()), 6) if not numeric.empty else None
+
+
 def build_lookup(excel_path: Path, out_path: Path) -> dict:
-    data = load_and_clean(str(excel_path))
+    data = load_cleaned(str(excel_path))
     mapping = {}
     for place_id, group in data.groupby('place_id'):
         if not isinstance(place_id, str) or not place_id.strip():
@@ -23,6 +33,12 @@ def build_lookup(excel_path: Path, out_path: Path) -> dict:
         mapping[str(place_id).strip()] = {
             'municipality': municipality,
             'settlement': settlement,
+            # representative site indexed for nearest-settlement resolution (grid scoring, coordinate-only payloads)
+            'latitude': pick_median(group['latitude']),
+            'longitude': pick_median(group['longitude']),
+            'elevation_m': pick_median(group['elevation_m']),
+            'population': pick_median(group['population']),
+            'households': pick_median(group['households']),
         }
     out_path.write_text(json.dumps(mapping, ensure_ascii=False, indent=2), encoding='utf-8')
     return mapping
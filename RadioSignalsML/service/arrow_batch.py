@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+import numpy as np
+
+from .compiled_model import InternedColumn
+
+# pyarrow is imported by the functions below, so the service only loads it for the first Arrow request
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# PredictionInput fields; other columns of an Arrow batch are ignored, as pydantic ignores unknown JSON keys
+INPUT_COLUMNS = (
+    "technology", "date", "latitude", "longitude", "elevation_m", "population", "households", "registry_number",
+    "municipality", "settlement", "program_identifier", "transmitter_location", "channel_number", "frequency_mhz",
+)
+_REQUIRED = ("technology", "date", "latitude", "longitude", "elevation_m")
+_NUMBERS = ("latitude", "longitude", "elevation_m", "population", "households", "channel_number", "frequency_mhz")
+_NOT_NULL = ("latitude", "longitude", "elevation_m", "population", "households")
+_TEXT = ("technology", "registry_number", "municipality", "settlement", "program_identifier", "transmitter_location")
+_MAX_LENGTH = {"program_identifier": 255, "transmitter_location": 255}
+# the message pydantic gives for each failure, so Arrow and JSON rows report the same errors
+_TECHNOLOGY_MESSAGE = "technology: Input should be 'DIGITAL_TV' or 'FM'"
+_DATE_MESSAGE = "date: Input should be a valid datetime"
+_NUMBER_MESSAGE = "{}: Input should be a valid number"
+_INTEGER_MESSAGE = "channel_number: Input should be a valid integer, got a number with a fractional part"
+_LENGTH_MESSAGE = "{}: String should have at most {} characters"
+_CHANNEL_MESSAGE = "channel_number: Value error, channel_number is required for DIGITAL_TV predictions"
+_FREQUENCY_MESSAGE = "frequency_mhz: Value error, frequency_mhz is required for FM predictions"
+
+
+class ArrowBatchError(ValueError):
+    """Raised when a body cannot be read as an Arrow stream of PredictionInput columns (a 422 for the request)."""
+
+
+def accepts_arrow(header: str | None) -> bool:
+    return bool(header) and ARROW_STREAM in header.lower()
+
+
+def read_table(body: bytes):
+    """Decodes an Arrow IPC stream and checks its column names and types against ``PredictionInput``."""
+    import pyarrow as pa
+
+    try:
+        table = pa.ipc.open_stream(body).read_all()
+    except (pa.ArrowInvalid, OSError) as exc:
+        raise ArrowBatchError(f"Body is not an Arrow IPC stream: {exc}") from None
+    missing = [name for name in _REQUIRED if name not in table.column_names]
+    if missing:
+        raise ArrowBatchError("Missing required columns: " + ", ".join(missing))
+    columns = {}
+    for name in table.column_names:
+        if name not in INPUT_COLUMNS:
+            continue
+        column, kind = table[name], table.schema.field(name).type
+        if pa.types.is_dictionary(kind):
+            column, kind = column.cast(kind.value_type), kind.value_type
+        if pa.types.is_null(kind):  # an all-null column carries no type; give it the one the field expects
+            kind = pa.float64() if name in _NUMBERS else pa.string()
+            column = column.cast(kind)
+        if name in _NUMBERS:
+            ok = pa.types.is_integer(kind) or pa.types.is_floating(kind)
+        elif name in _TEXT:
+            ok = pa.types.is_string(kind) or pa.types.is_large_string(kind)
+        else:
+            ok = pa.types.is_timestamp(kind) or pa.types.is_date(kind) or pa.types.is_string(kind)
+        if not ok:
+            raise ArrowBatchError(f"Column {name} has unsupported type {kind}")
+        columns[name] = column.combine_chunks()
+    return pa.table(columns)
+
+
+def validate_table(table) -> Dict[int, str]:
+    """What ``PredictionInput`` would reject, checked a column at a time: row index -> ``field: message; ...``."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    problems: Dict[int, List[str]] = {}
+
+    def flag(mask, message: str) -> None:
+        for i in np.flatnonzero(mask.fill_null(False).to_numpy(zero_copy_only=False)).tolist():
+            problems.setdefault(i, []).append(message)
+
+    technology = table["technology"]
+    digital = pc.equal(technology, "DIGITAL_TV").fill_null(False)
+    fm = pc.equal(technology, "FM").fill_null(False)
+    flag(pc.invert(pc.or_(digital, fm)), _TECHNOLOGY_MESSAGE)
+    flag(table["date"].is_null(), _DATE_MESSAGE)
+    for name in _NOT_NULL:
+        if name in table.column_names:
+            flag(table[name].is_null(), _NUMBER_MESSAGE.format(name))
+    for name, limit in _MAX_LENGTH.items():
+        if name in table.column_names:
+            flag(pc.greater(pc.utf8_length(table[name]), limit), _LENGTH_MESSAGE.format(name, limit))
+    channel = table["channel_number"] if "channel_number" in table.column_names else None
+    if channel is not None and pa.types.is_floating(channel.type):
+        flag(pc.not_equal(channel, pc.floor(channel)), _INTEGER_MESSAGE)
+    flag(digital if channel is None else pc.and_(digital, channel.is_null()), _CHANNEL_MESSAGE)
+    frequency = table["frequency_mhz"] if "frequency_mhz" in table.column_names else None
+    flag(fm if frequency is None else pc.and_(fm, frequency.is_null()), _FREQUENCY_MESSAGE)
+    return {i: "; ".join(messages) for i, messages in sorted(problems.items())}
+
+
+def table_columns(table) -> Tuple[Dict[str, Any], int]:
+    """The table as payload columns for ``BatchFeatureMapper.map_columns``, plus its row count.
+
+    Numeric columns without nulls become float64 arrays; every other column becomes a list with ``None`` for
+    nulls, built from its distinct values so each string or timestamp is converted to Python once.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    columns: Dict[str, Any] = {}
+    for name in table.column_names:
+        column = table[name].combine_chunks()
+        kind = column.type
+        if (pa.types.is_integer(kind) or pa.types.is_floating(kind)) and column.null_count == 0:
+            columns[name] = column.to_numpy(zero_copy_only=False).astype(np.float64)
+            continue
+        if pa.types.is_date(kind):
+            column = column.cast(pa.timestamp("s"))
+        encoded = pc.dictionary_encode(column)
+        values = np.empty(len(encoded.dictionary) + 1, dtype=object)
+        values[:-1] = encoded.dictionary.to_pylist()
+        values[-1] = None
+        codes = encoded.indices.fill_null(len(encoded.dictionary)).to_numpy(zero_copy_only=False)
+        columns[name] = values[codes].tolist()
+    return columns, table.num_rows
+
+
+def _arrow_column(values: Any):
+    import pyarrow as pa
+
+    if isinstance(values, InternedColumn):
+        codes = np.asarray(values.codes)
+        indices = pa.array(codes, mask=codes < 0, type=pa.int32())
+        return pa.DictionaryArray.from_arrays(indices, pa.array(values.vocabulary.tolist(), type=pa.string()))
+    values = np.asarray(values)
+    if values.dtype == object:
+        return pa.array(values, type=pa.string(), from_pandas=True)
+    return pa.array(values, from_pandas=True)  # NaN -> null
+
+
+def _stream(table) -> bytes:
+    import pyarrow as pa
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_payloads(payloads: Sequence[Mapping[str, Any]]) -> bytes:
+    """Arrow IPC stream of ``/predict`` payloads, one column per ``PredictionInput`` field any of them sets."""
+    import pyarrow as pa
+
+    names = [name for name in INPUT_COLUMNS if any(name in payload for payload in payloads)]
+    return _stream(pa.table({name: [payload.get(name) for payload in payloads] for name in names}))
+
+
+def write_table(result: Mapping[str, Any]) -> bytes:
+    """Serialises output columns (see ``SignalPredictorService.predict_table``) as an Arrow IPC stream.
+
+    Text columns become strings, categorical features dictionary arrays and NaN in float columns null.
+    """
+    import pyarrow as pa
+
+    return _stream(pa.table({name: _arrow_column(values) for name, values in result.items()}))
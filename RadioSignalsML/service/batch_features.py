@@ -0,0 +1,466 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .compiled_model import InternedColumn
+from .feature_mapping import (
+    FeatureMappingError,
+    _coerce_float,
+    _parse_date,
+    _normalize_registry_number,
+    _safe_text,
+)
+from .location_lookup import SettlementIndex
+
+# field -> payload keys tried in order, exactly as build_feature_vector chains them with ``or``
+_ALIASES: Dict[str, Tuple[str, ...]] = {
+    "technology": ("technology", "tech"),
+    "date": ("date", "measurement_date"),
+    "registry": ("registry_number", "settlement_registry_number", "registryNumber"),
+    "municipality": ("municipality",),
+    "settlement": ("settlement", "settlement_name"),
+    "latitude": ("latitude", "latitude_decimal", "lat"),
+    "longitude": ("longitude", "longitude_decimal", "lon"),
+    "elevation_m": ("elevation_m", "altitude_meters", "altitude"),
+    "population": ("population",),
+    "households": ("households",),
+    "program_id": ("program_identifier", "programId"),
+    "emitter": ("transmitter_location", "emitter"),
+    "tv_channel": ("tv_channel", "channel_number"),
+    "fm_freq_mhz": ("fm_freq_mhz", "frequency_mhz"),
+}
+_TECHNOLOGIES = {"digital_tv": "digital", "digital": "digital", "fm": "fm", "analogue_fm": "fm"}
+_NUMERIC = ("latitude", "longitude", "elevation_m", "year", "month", "population", "households")
+_CATEGORICAL = ("municipality", "settlement", "program_id", "emitter")
+_CHANNEL = {"digital": "tv_channel", "fm": "fm_freq_mhz"}
+_MISSING_NAMES = "Missing settlement or municipality information."
+_MAX_PLANS = 256
+
+# an alias chain reduced to the keys a schema actually has; ``last`` keeps the ``a or b or c`` result
+# (the last alias' value, possibly falsy) when none of them is truthy
+_Plan = Dict[str, Tuple[Tuple[str, ...], Optional[str]]]
+
+
+def _plan_for(keys: FrozenSet[str]) -> _Plan:
+    plan = {}
+    for field, aliases in _ALIASES.items():
+        present = tuple(a for a in aliases if a in keys)
+        plan[field] = (present, aliases[-1] if aliases[-1] in keys else None)
+    return plan
+
+
+def _pick(payload: Mapping[str, Any], chain: Tuple[Tuple[str, ...], Optional[str]]) -> Any:
+    present, last = chain
+    for key in present:
+        value = payload[key]
+        if value:
+            return value
+    return payload[last] if last is not None else None
+
+
+def _number(value: Any, default: Optional[float] = None) -> float:
+    kind = type(value)
+    if kind is float:
+        return value
+    if kind is int:
+        return float(value)
+    return _coerce_float(value, default)
+
+
+@dataclass(frozen=True)
+class ColumnBatch:
+    """Mapped rows of one technology: float64 arrays for numeric features, interned codes for categoricals.
+
+    ``positions`` are the rows' indices in the payload sequence passed to ``BatchFeatureMapper.map``.
+    """
+
+    technology: str
+    positions: np.ndarray
+    columns: Dict[str, Any]
+
+    def __len__(self) -> int:
+        return int(self.positions.shape[0])
+
+    def take(self, rows: np.ndarray) -> "ColumnBatch":
+        columns = {
+            name: InternedColumn(col.vocabulary, col.codes[rows]) if isinstance(col, InternedColumn) else col[rows]
+            for name, col in self.columns.items()
+        }
+        return ColumnBatch(self.technology, self.positions[rows], columns)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """The rows as the feature dicts ``build_feature_vector`` returns (same keys, order and types)."""
+        cols = self.columns
+        channel = _CHANNEL[self.technology]
+        values = [
+            cols[name].astype(np.int64).tolist() if name in ("year", "month") else cols[name].tolist()
+            for name in _NUMERIC
+        ]
+        values += [cols[name].vocabulary[cols[name].codes].tolist() for name in _CATEGORICAL]
+        values.append(cols[channel].tolist())
+        keys = (*_NUMERIC, *_CATEGORICAL, channel)
+        return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+@dataclass(frozen=True)
+class MappedBatch:
+    groups: Dict[str, ColumnBatch]
+    errors: Dict[int, FeatureMappingError]
+
+
+def _values(rows: Sequence[Mapping[str, Any]], chain: Tuple[Tuple[str, ...], Optional[str]]) -> List[Any]:
+    """One field of rows sharing a schema, as ``_pick`` would return it, in a single comprehension."""
+    present, last = chain
+    if not present:
+        return [None] * len(rows)
+    if len(present) == 1:
+        key = present[0]
+        return [p[key] for p in rows] if key == last else [p[key] or None for p in rows]
+    return [_pick(p, chain) for p in rows]
+
+
+# rows of a group are ordered by schema; a layout lists each schema's plan with its number of rows
+_Layout = List[Tuple[_Plan, int]]
+
+
+def _column(rows: List[Mapping[str, Any]], layout: _Layout, field: str) -> List[Any]:
+    if len(layout) == 1:
+        return _values(rows, layout[0][0][field])
+    out: List[Any] = []
+    start = 0
+    for plan, count in layout:
+        out += _values(rows[start : start + count], plan[field])
+        start += count
+    return out
+
+
+class _PayloadRows:
+    """One technology's rows as payload dicts, ordered by schema."""
+
+    def __init__(self, rows: List[Mapping[str, Any]], layout: _Layout):
+        self._rows = rows
+        self._layout = layout
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def field(self, name: str) -> List[Any]:
+        """The field through its alias chain, as ``build_feature_vector`` reads it."""
+        return _column(self._rows, self._layout, name)
+
+    def raw(self, key: str) -> List[Any]:
+        """``payload.get(key)`` per row."""
+        return [p.get(key) for p in self._rows]
+
+
+class _ColumnRows:
+    """Rows ``take`` of equal-length columns keyed like payload fields; one key set, so one alias plan."""
+
+    def __init__(self, columns: Mapping[str, List[Any]], plan: _Plan, take: List[int]):
+        self._columns = columns
+        self._plan = plan
+        self._take = take
+
+    def __len__(self) -> int:
+        return len(self._take)
+
+    @property
+    def positions(self) -> List[int]:
+        return self._take
+
+    def subset(self, members: List[int]) -> "_ColumnRows":
+        return _ColumnRows(self._columns, self._plan, [self._take[k] for k in members])
+
+    def raw(self, key: str) -> List[Any]:
+        column = self._columns.get(key)
+        if column is None:
+            return [None] * len(self._take)
+        return list(map(column.__getitem__, self._take))
+
+    def field(self, name: str) -> List[Any]:
+        present, last = self._plan[name]
+        if not present:
+            return [None] * len(self._take)
+        if len(present) == 1:
+            values = self.raw(present[0])
+            return values if present[0] == last else [v or None for v in values]
+        # like _pick: the first truthy alias, else the last alias' own value when the columns have it
+        out = []
+        for values in zip(*map(self.raw, present)):
+            out.append(next((v for v in values if v), values[-1] if last is not None else None))
+        return out
+
+
+def _convert(values: Sequence[Any], fn) -> Tuple[List[Any], Dict[int, FeatureMappingError]]:
+    """``fn`` applied once per distinct value, plus the rows whose value it rejected.
+
+    Columns mixing non-text types are keyed with the value's type so that 1, 1.0 and True stay apart.
+    """
+
+    def apply(value):
+        try:
+            return fn(value)
+        except FeatureMappingError as exc:
+            return exc.with_traceback(None)  # a kept traceback would pin this frame and its columns
+
+    typed = len(set(map(type, values)) - {str, type(None)}) > 1
+    keys = [(type(v), v) for v in values] if typed else values
+    try:
+        distinct = dict.fromkeys(keys)
+    except TypeError:  # unhashable values
+        out = [apply(v) for v in values]
+    else:
+        for key in distinct:
+            distinct[key] = apply(key[1] if typed else key)
+        out = list(map(distinct.__getitem__, keys))
+        if not any(isinstance(v, FeatureMappingError) for v in distinct.values()):
+            return out, {}
+    return out, {i: v for i, v in enumerate(out) if isinstance(v, FeatureMappingError)}
+
+
+def _numbers(values: Sequence[Any], default: Optional[float], errors: Dict[int, FeatureMappingError]) -> np.ndarray:
+    """float64 column; rows that fail conversion get NaN and their error (unless one is already recorded)."""
+    odd = [i for i, value in enumerate(values) if type(value) is not float and type(value) is not int]
+    if not odd:
+        return np.array(values, dtype=np.float64)
+    clean = list(values)
+    for i in odd:
+        clean[i] = 0.0
+    out = np.array(clean, dtype=np.float64)
+    for i in odd:
+        try:
+            out[i] = _number(values[i], default)
+        except FeatureMappingError as exc:
+            out[i] = np.nan
+            errors.setdefault(i, exc.with_traceback(None))
+    return out
+
+
+def _intern(values: Sequence[Any]) -> InternedColumn:
+    distinct = list(dict.fromkeys(values))
+    index = {value: code for code, value in enumerate(distinct)}
+    vocabulary = np.empty(len(distinct), dtype=object)
+    vocabulary[:] = distinct
+    return InternedColumn(vocabulary, np.fromiter(map(index.__getitem__, values), dtype=np.int32, count=len(values)))
+
+
+def _technology(value: Any) -> str:
+    technology = _TECHNOLOGIES.get(str(value or "").strip().lower())
+    if technology is None:
+        raise FeatureMappingError("Technology must be DIGITAL_TV or FM.")
+    return technology
+
+
+def _year_month(value: Any) -> Tuple[int, int]:
+    parsed = _parse_date(value)  # ``value`` already went through the date/measurement_date chain
+    return parsed.year, parsed.month
+
+
+# both answer ``field`` / ``raw`` with one value per row of a technology group
+_Rows = Union[_PayloadRows, _ColumnRows]
+
+
+class BatchFeatureMapper:
+    """Maps many payloads straight into per-technology column arrays.
+
+    Equivalent to calling ``build_feature_vector`` per row (same features, same ``FeatureMappingError`` per bad
+    row, in the same field order), but it works a column at a time: field aliases are resolved once per payload
+    key set, each field is gathered with one comprehension, dates, registry numbers and free text are converted
+    once per distinct value, all-numeric columns become arrays in one call, and categoricals are interned.
+    Rows that need their settlement from coordinates are resolved with one ``SettlementIndex`` query.
+    """
+
+    def __init__(self, lookup: Mapping[str, Mapping[str, Any]], index: Optional[SettlementIndex] = None):
+        self._lookup = lookup
+        self._index = index
+        self._plans: Dict[FrozenSet[str], _Plan] = {}
+
+    def _plan(self, keys: FrozenSet[str]) -> _Plan:
+        plan = self._plans.get(keys)
+        if plan is None:
+            if len(self._plans) >= _MAX_PLANS:  # clients sending ever-new key sets must not grow this forever
+                self._plans.clear()
+            plan = self._plans[keys] = _plan_for(keys)
+        return plan
+
+    def map_columns(self, columns: Mapping[str, Sequence[Any]], rows: Optional[Sequence[int]] = None) -> MappedBatch:
+        """``map`` for column-oriented input, e.g. a decoded Arrow batch.
+
+        ``columns`` maps payload keys to equal-length sequences (lists or arrays; ``None`` marks a missing value)
+        and every row has the same key set.  Only ``rows`` (default: all) are mapped; positions index the columns.
+        """
+        lists = {key: v.tolist() if isinstance(v, np.ndarray) else v for key, v in columns.items()}
+        n = len(next(iter(lists.values()))) if lists else 0
+        source = _ColumnRows(lists, self._plan(frozenset(lists)), list(range(n)) if rows is None else list(rows))
+        resolved, _ = _convert(source.field("technology"), _technology)
+        errors: Dict[int, FeatureMappingError] = {}
+        groups: Dict[str, ColumnBatch] = {}
+        for technology in dict.fromkeys(resolved):
+            members = [k for k, t in enumerate(resolved) if t is technology]
+            group = source.subset(members)
+            if isinstance(technology, FeatureMappingError):
+                errors.update(dict.fromkeys(group.positions, technology))
+                continue
+            batch = self._map_group(technology, group.positions, group, errors)
+            if batch is not None:
+                groups[technology] = batch
+        return MappedBatch(groups, errors)
+
+    def map(self, payloads: Sequence[Mapping[str, Any]]) -> MappedBatch:
+        key_sets = list(map(frozenset, payloads))
+        schemas: Dict[FrozenSet[str], List[int]] = {}
+        if len(set(key_sets)) == 1:
+            schemas[key_sets[0]] = list(range(len(payloads)))
+        else:
+            for position, keys in enumerate(key_sets):
+                schemas.setdefault(keys, []).append(position)
+
+        errors: Dict[int, FeatureMappingError] = {}
+        by_technology: Dict[str, List[Tuple[_Plan, List[int]]]] = {}
+        for keys, positions in schemas.items():
+            plan = self._plan(keys)
+            raw = _values([payloads[i] for i in positions], plan["technology"])
+            resolved, _ = _convert(raw, _technology)
+            for technology in dict.fromkeys(resolved):
+                members = [i for i, t in zip(positions, resolved) if t is technology]
+                if isinstance(technology, FeatureMappingError):
+                    errors.update(dict.fromkeys(members, technology))
+                else:
+                    by_technology.setdefault(technology, []).append((plan, members))
+
+        groups: Dict[str, ColumnBatch] = {}
+        for technology, segments in by_technology.items():
+            positions = [i for _, members in segments for i in members]
+            layout = [(plan, len(members)) for plan, members in segments]
+            rows = _PayloadRows([payloads[i] for i in positions], layout)
+            batch = self._map_group(technology, positions, rows, errors)
+            if batch is not None:
+                groups[technology] = batch
+        return MappedBatch(groups, errors)
+
+    def _map_group(
+        self,
+        technology: str,
+        positions: List[int],
+        rows: _Rows,
+        errors: Dict[int, FeatureMappingError],
+    ) -> Optional[ColumnBatch]:
+        n = len(rows)
+        # first error per row; fields are visited in build_feature_vector's order so the same one wins
+        first: Dict[int, FeatureMappingError] = {}
+
+        year_month, failed = _convert(rows.field("date"), _year_month)
+        for i, exc in failed.items():
+            first[i] = exc
+            year_month[i] = (0, 0)
+        year, month = np.array(year_month, dtype=np.float64).reshape(n, 2).T
+
+        names = self._names(rows)
+        coordinate_errors: Dict[int, FeatureMappingError] = {}
+        latitude = _numbers(rows.field("latitude"), None, coordinate_errors)
+        longitude = _numbers(rows.field("longitude"), None, coordinate_errors)
+        self._locate(names, latitude, longitude, coordinate_errors)
+        for i in [i for i, name in enumerate(names) if type(name) is not tuple]:
+            first.setdefault(i, names[i])
+            names[i] = ("", "")
+        for i, exc in coordinate_errors.items():
+            first.setdefault(i, exc)
+        municipality = [name[0] for name in names]
+        settlement = [name[1] for name in names]
+
+        elevation = _numbers(rows.field("elevation_m"), None, first)
+        population = _numbers(rows.field("population"), 0, first)
+        households = _numbers(rows.field("households"), 0, first)
+        program, _ = _convert(rows.field("program_id"), lambda v: _safe_text(v, "UNKNOWN"))
+        emitter, _ = _convert(rows.field("emitter"), lambda v: _safe_text(v, "UNKNOWN"))
+        channel_name = _CHANNEL[technology]
+        channel = _numbers(rows.field(channel_name), None, first)
+
+        for i, exc in first.items():
+            errors[positions[i]] = exc
+        if len(first) == n:
+            return None
+        keep = [i for i in range(n) if i not in first] if first else None
+        take = None if keep is None else np.asarray(keep, dtype=np.intp)
+
+        def rows_of(values):
+            if take is None:
+                return values
+            return values[take] if isinstance(values, np.ndarray) else [values[i] for i in keep]
+
+        columns: Dict[str, Any] = {
+            "latitude": rows_of(latitude),
+            "longitude": rows_of(longitude),
+            "elevation_m": rows_of(elevation),
+            "year": rows_of(year),
+            "month": rows_of(month),
+            "population": rows_of(population),
+            "households": rows_of(households),
+            "municipality": _intern(rows_of(municipality)),
+            "settlement": _intern(rows_of(settlement)),
+            "program_id": _intern(rows_of(program)),
+            "emitter": _intern(rows_of(emitter)),
+            channel_name: rows_of(channel),
+        }
+        return ColumnBatch(technology, rows_of(np.asarray(positions, dtype=np.intp)), columns)
+
+    def _names(self, rows: _Rows) -> List[Any]:
+        """(municipality, settlement) per row; ``None`` where they must come from coordinates, else the error."""
+        lookup = self._lookup
+        entries, _ = _convert(
+            rows.field("registry"),
+            lambda v: lookup.get(registry) if (registry := _normalize_registry_number(v)) else None,
+        )
+        given = list(zip(rows.raw("municipality"), rows.raw("settlement")))
+        if None not in entries:  # every row named by its registry number
+            return [
+                (entry.get("municipality") or muni or "", entry.get("settlement") or sett or "")
+                for entry, (muni, sett) in zip(entries, given)
+            ]
+        raw_muni = rows.field("municipality")
+        raw_sett = rows.field("settlement")
+        out: List[Any] = []
+        for (given_muni, given_sett), entry, muni, sett in zip(given, entries, raw_muni, raw_sett):
+            if entry is not None:
+                out.append(
+                    (entry.get("municipality") or given_muni or "", entry.get("settlement") or given_sett or "")
+                )
+                continue
+            muni = str(muni or "").strip()
+            sett = str(sett or "").strip()
+            if muni and sett:
+                out.append((muni, sett))
+            else:
+                out.append(None if self._index is not None else FeatureMappingError(_MISSING_NAMES))
+        return out
+
+    def _locate(
+        self,
+        names: List[Any],
+        latitude: np.ndarray,
+        longitude: np.ndarray,
+        coordinate_errors: Dict[int, FeatureMappingError],
+    ) -> None:
+        """Replaces the ``None`` names with the nearest settlement, or the missing-names error when there is
+        none in range or the row has no usable coordinates (which build_feature_vector reports first)."""
+        pending = [i for i, name in enumerate(names) if name is None]
+        if not pending:
+            return
+        located = (np.isfinite(latitude) & np.isfinite(longitude)).tolist()
+        usable = [i for i in pending if i not in coordinate_errors and located[i]]
+        missing = FeatureMappingError(_MISSING_NAMES)
+        for i in pending:
+            names[i] = missing
+        if not usable:
+            return
+        rows = np.asarray(usable, dtype=np.intp)
+        nearest = self._index.nearest(latitude[rows], longitude[rows], self._index.max_km)
+        hits = np.flatnonzero(nearest >= 0)
+        found = nearest[hits]
+        for k, municipality, settlement in zip(
+            hits.tolist(), self._index.municipality[found].tolist(), self._index.settlement[found].tolist()
+        ):
+            names[usable[k]] = (municipality, settlement)
@@ -0,0 +1,738 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import warnings
+from dataclasses import dataclass, replace
+from functools import cached_property, lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+COMPILED_SUFFIX = ".npz"
+# directory of raw .npy blocks + meta.json; loaded with mmap so worker processes share pages via the page cache
+MAPPED_SUFFIX = ".model"
+_ARRAY_FIELDS = (
+    "numeric_fill", "numeric_mean", "numeric_scale", "feature", "threshold", "left", "right", "value", "roots"
+)
+# how often (in traversal steps) rows that already sit in a leaf are dropped from the working set
+_COMPACT_EVERY = 4
+# cap on (trees x rows) traversed at once; bounds scratch memory for large batches and grids
+_MAX_TRAVERSAL_NODES = 1 << 20
+# batches at least this large are collapsed to rows with distinct split-interval signatures first
+_DEDUPE_MIN_ROWS = 4096
+# a single row is branched at every node in one pass, then walked one gather per level, up to this many nodes
+_SINGLE_ROW_MAX_NODES = 1 << 16
+# column values encoded once and broadcast to every row
+_SCALARS = (str, int, float, np.generic, type(None))
+# compacted artifacts keep leaf values as float32, so they match the pipeline to ~1e-5 dB rather than exactly
+COMPACT_TOLERANCE = 1e-4
+_NODE_FIELDS = ("feature", "threshold", "left", "right", "value", "roots")
+
+
+class ModelCompileError(ValueError):
+    """Raised when a fitted pipeline does not have the layout produced by train_signal_models."""
+
+
+def float32_thresholds(threshold: np.ndarray) -> np.ndarray:
+    """Largest float32 not above each threshold.
+
+    The tree input is float32, and for a float32 ``x`` the test ``x > t`` has the same outcome as ``x > f`` where
+    ``f`` is the largest float32 ``<= t``; plain rounding to nearest could move ``f`` above ``t`` and flip rows
+    that sit exactly on it.
+    """
+    threshold = np.asarray(threshold, dtype=np.float64)
+    out = threshold.astype(np.float32)
+    above = out > threshold
+    out[above] = np.nextafter(out[above], np.float32(-np.inf))
+    return out
+
+
+@dataclass(frozen=True)
+class CategoricalEncoding:
+    """One-hot layout of a single categorical column in the compiled feature matrix."""
+
+    column: str
+    fill: Any
+    index: Dict[Any, int]
+    unknown: int = -1
+
+
+@dataclass(frozen=True)
+class InternedColumn:
+    """Categorical column stored as a small vocabulary plus per-row integer codes."""
+
+    vocabulary: np.ndarray
+    codes: np.ndarray
+
+    def __len__(self) -> int:
+        return int(self.codes.shape[0])
+
+    @property
+    def ndim(self) -> int:
+        return 1
+
+    def materialize(self) -> np.ndarray:
+        return np.asarray(self.vocabulary, dtype=object)[self.codes]
+
+
+@dataclass(frozen=True)
+class TreeDistribution:
+    """Per-row spread of an ensemble's individual tree predictions.
+
+    ``mean`` is the ensemble's point prediction; ``values[k]`` holds the ``quantiles[k]`` quantile of the trees'
+    outputs (linear interpolation, as ``np.quantile``).  A single tree has zero spread.
+    """
+
+    mean: np.ndarray
+    std: np.ndarray
+    quantiles: Tuple[float, ...]
+    values: np.ndarray
+    trees: int
+
+    @classmethod
+    def from_trees(cls, per_tree: np.ndarray, quantiles: Sequence[float] = ()) -> "TreeDistribution":
+        """Statistics of an (n_trees, n_rows) array of per-tree predictions."""
+        per_tree = np.asarray(per_tree)
+        quantiles = tuple(float(q) for q in quantiles)
+        if quantiles:
+            # one sort of each column serves every quantile; several times faster than np.quantile on short columns
+            ordered = np.sort(per_tree, axis=0)
+            position = np.asarray(quantiles) * (per_tree.shape[0] - 1)
+            below = np.floor(position).astype(np.intp)
+            above = np.minimum(below + 1, per_tree.shape[0] - 1)
+            low = ordered[below].astype(np.float64)
+            values = low + (ordered[above] - low) * (position - below)[:, None]
+        else:
+            values = np.empty((0, per_tree.shape[1]), dtype=np.float64)
+        return cls(
+            mean=per_tree.mean(axis=0, dtype=np.float64),
+            std=per_tree.std(axis=0, dtype=np.float64),
+            quantiles=quantiles,
+            values=values,
+            trees=int(per_tree.shape[0]),
+        )
+
+    @classmethod
+    def concat(cls, parts: Sequence["TreeDistribution"]) -> "TreeDistribution":
+        first = parts[0]
+        if len(parts) == 1:
+            return first
+        return cls(
+            mean=np.concatenate([p.mean for p in parts]),
+            std=np.concatenate([p.std for p in parts]),
+            quantiles=first.quantiles,
+            values=np.concatenate([p.values for p in parts], axis=1),
+            trees=first.trees,
+        )
+
+    def __len__(self) -> int:
+        return int(self.mean.shape[0])
+
+    def take(self, index: np.ndarray) -> "TreeDistribution":
+        return replace(self, mean=self.mean[index], std=self.std[index], values=self.values[:, index])
+
+    def rows(self) -> List[Dict[str, Any]]:
+        """One JSON-ready ``{"mean", "std", "quantiles", "trees"}`` dict per row; quantile keys are ``f"{q:g}"``."""
+        keys = [f"{q:g}" for q in self.quantiles]
+        columns = self.values.tolist()
+        return [
+            {
+                "mean": mean,
+                "std": std,
+                "quantiles": {key: column[i] for key, column in zip(keys, columns)},
+                "trees": self.trees,
+            }
+            for i, (mean, std) in enumerate(zip(self.mean.tolist(), self.std.tolist()))
+        ]
+
+
+@dataclass
+class CompiledPipeline:
+    """Plain-array form of the preprocessing + tree ensemble pipeline.
+
+    Mirrors ``Pipeline.predict`` without importing scikit-learn: numeric columns are
+    median-imputed and standardised, categoricals are one-hot encoded through
+    category→column maps, and every tree is evaluated by vectorised node traversal.
+
+    Nodes are renumbered breadth-first so siblings are adjacent (``right == left + 1``);
+    one step is ``left[node] + (x[feature[node]] > threshold[node])``.  Leaves point to
+    themselves with an infinite threshold, so ``max_depth`` steps reach every leaf.
+    """
+
+    feature_names_in_: np.ndarray
+    numeric_columns: List[str]
+    numeric_fill: np.ndarray
+    numeric_mean: np.ndarray
+    numeric_scale: np.ndarray
+    categorical: List[CategoricalEncoding]
+    n_features: int
+    feature: np.ndarray
+    threshold: np.ndarray
+    left: np.ndarray
+    right: np.ndarray
+    value: np.ndarray
+    roots: np.ndarray
+    max_depth: int
+    # the .joblib this was compiled from (``source_signature``); None when compiled from an in-memory pipeline
+    source: Optional[Dict[str, Any]] = None
+
+    @property
+    def n_trees(self) -> int:
+        return int(self.roots.shape[0])
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the node arrays."""
+        return int(sum(getattr(self, name).nbytes for name in _NODE_FIELDS))
+
+    def compact(self) -> "CompiledPipeline":
+        """Copy with int32 node indices and float32 thresholds and leaf values, about half the bytes.
+
+        Every row still reaches the same leaves (see ``float32_thresholds``); only the leaf values are rounded.
+        """
+        if self.left.shape[0] >= np.iinfo(np.int32).max:
+            raise ModelCompileError("Too many nodes for int32 node indices.")
+        return replace(
+            self,
+            feature=self.feature.astype(np.int32),
+            threshold=float32_thresholds(self.threshold),
+            left=self.left.astype(np.int32),
+            right=self.right.astype(np.int32),
+            value=self.value.astype(np.float32),
+            roots=self.roots.astype(np.int32),
+        )
+
+    def subset(self, trees: Sequence[int]) -> "CompiledPipeline":
+        """The ensemble restricted to ``trees`` (positions in ``roots``), which then average in that order."""
+        ends = np.append(self.roots[1:], self.left.shape[0])
+        features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+        base = 0
+        for tree in trees:
+            start, stop = int(self.roots[tree]), int(ends[tree])
+            features.append(self.feature[start:stop])
+            thresholds.append(self.threshold[start:stop])
+            lefts.append(self.left[start:stop] - start + base)
+            rights.append(self.right[start:stop] - start + base)
+            values.append(self.value[start:stop])
+            roots.append(base)
+            base += stop - start
+        return replace(
+            self,
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts).astype(self.left.dtype),
+            right=np.concatenate(rights).astype(self.right.dtype),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=self.roots.dtype),
+        )
+
+    def _rows(self, frame: Mapping[str, Any]) -> int:
+        columns = (frame[name] for name in self.feature_names_in_)
+        sizes = [len(v) for v in columns if not isinstance(v, _SCALARS) and np.ndim(v) > 0]
+        return max(sizes) if sizes else 1
+
+    def _code(self, enc: CategoricalEncoding, value: Any) -> int:
+        return enc.index.get(enc.fill if value is None or value != value else value, enc.unknown)
+
+    def transform(self, frame: Mapping[str, Any]) -> np.ndarray:
+        """Encodes a column mapping (DataFrame or dict of sequences) into the float32 tree input.
+
+        Scalar columns are encoded once and broadcast to every row.
+        """
+        if all(isinstance(frame[name], _SCALARS) for name in self.feature_names_in_):
+            return self._transform_row(frame)
+        n_rows = self._rows(frame)
+        X = np.zeros((n_rows, self.n_features), dtype=np.float32)
+
+        if self.numeric_columns:
+            numeric = np.empty((n_rows, len(self.numeric_columns)), dtype=np.float64)
+            for j, name in enumerate(self.numeric_columns):
+                numeric[:, j] = np.asarray(frame[name], dtype=np.float64)
+            missing = np.isnan(numeric)
+            if missing.any():
+                numeric[missing] = np.broadcast_to(self.numeric_fill, numeric.shape)[missing]
+            X[:, : numeric.shape[1]] = (numeric - self.numeric_mean) / self.numeric_scale
+
+        rows = np.arange(n_rows)
+        for enc in self.categorical:
+            values = frame[enc.column]
+            if isinstance(values, InternedColumn):
+                lookup = np.fromiter((self._code(enc, v) for v in values.vocabulary), dtype=np.int64)
+                codes = lookup[values.codes]
+            elif np.ndim(values) == 0:
+                code = self._code(enc, values)
+                if code >= 0:
+                    X[:, code] = 1.0
+                continue
+            else:
+                codes = np.fromiter((self._code(enc, v) for v in values), dtype=np.int64, count=n_rows)
+            hit = codes >= 0
+            X[rows[hit], codes[hit]] = 1.0
+        return X
+
+    def _transform_row(self, row: Mapping[str, Any]) -> np.ndarray:
+        # transform() for a single row of scalars, without the per-column array conversions
+        X = np.zeros((1, self.n_features), dtype=np.float32)
+        if self.numeric_columns:
+            numeric = np.array([row[name] for name in self.numeric_columns], dtype=np.float64)
+            numeric = np.where(np.isnan(numeric), self.numeric_fill, numeric)
+            X[0, : numeric.shape[0]] = (numeric - self.numeric_mean) / self.numeric_scale
+        for enc in self.categorical:
+            code = self._code(enc, row[enc.column])
+            if code >= 0:
+                X[0, code] = 1.0
+        return X
+
+    def tree_predictions(self, X: np.ndarray) -> np.ndarray:
+        """Returns the (n_trees, n_rows) leaf values for an encoded batch."""
+        n_rows, n_trees = X.shape[0], self.n_trees
+        if n_rows == 1 and self.left.shape[0] <= _SINGLE_ROW_MAX_NODES:
+            # one vectorised compare over all nodes replaces the per-level gathers of feature and threshold
+            step = self.left + (X[0][self.feature] > self.threshold)
+            node = self.roots
+            for _ in range(self.max_depth):
+                node = step[node]
+            return self.value[node].reshape(n_trees, 1)
+        flat = X.ravel()
+        offsets = np.tile(np.arange(n_rows, dtype=np.intp) * X.shape[1], n_trees)
+        node = np.repeat(self.roots, n_rows)
+        leaves = node.copy()
+        active = np.arange(node.size)
+        for depth in range(self.max_depth):
+            step = self.left[node] + (flat[offsets + self.feature[node]] > self.threshold[node])
+            if depth % _COMPACT_EVERY == _COMPACT_EVERY - 1:
+                moving = step != node
+                leaves[active] = step
+                active, node, offsets = active[moving], step[moving], offsets[moving]
+                if not active.size:
+                    break
+            else:
+                node = step
+        leaves[active] = node
+        return self.value[leaves].reshape(n_trees, n_rows)
+
+    @cached_property
+    def split_points(self) -> Dict[int, np.ndarray]:
+        """Sorted distinct thresholds per input column that any tree splits on."""
+        internal = self.left != np.arange(self.left.shape[0])
+        features, thresholds = self.feature[internal], self.threshold[internal]
+        return {int(f): np.unique(thresholds[features == f]) for f in np.unique(features)}
+
+    def _signature(self, X: np.ndarray) -> np.ndarray:
+        # Rows falling in the same interval between consecutive thresholds of every
+        # split column take identical paths through every tree.
+        key = np.zeros(X.shape[0], dtype=np.int64)
+        for column, points in self.split_points.items():
+            bins = np.searchsorted(points, X[:, column].astype(np.float64), side="left")
+            radix = points.shape[0] + 1
+            if int(key.max()) >= (np.iinfo(np.int64).max // radix):
+                key = np.unique(key, return_inverse=True)[1].astype(np.int64)
+            key = key * radix + bins
+        return key
+
+    def predict_encoded(self, X: np.ndarray) -> np.ndarray:
+        if X.shape[0] >= _DEDUPE_MIN_ROWS:
+            _, first, inverse = np.unique(self._signature(X), return_index=True, return_inverse=True)
+            if first.shape[0] < X.shape[0]:
+                return self._predict_rows(X[first])[inverse.ravel()]
+        return self._predict_rows(X)
+
+    def _predict_rows(self, X: np.ndarray) -> np.ndarray:
+        chunk = max(1, _MAX_TRAVERSAL_NODES // self.n_trees)
+        if X.shape[0] <= chunk:
+            return self.tree_predictions(X).mean(axis=0, dtype=np.float64)
+        return np.concatenate(
+            [
+                self.tree_predictions(X[i : i + chunk]).mean(axis=0, dtype=np.float64)
+                for i in range(0, X.shape[0], chunk)
+            ]
+        )
+
+    def predict(self, frame: Mapping[str, Any]) -> np.ndarray:
+        return self.predict_encoded(self.transform(frame))
+
+    def distribution_encoded(self, X: np.ndarray, quantiles: Sequence[float] = ()) -> TreeDistribution:
+        """Mean, spread and ``quantiles`` of the trees' predictions from the same single traversal as
+        ``predict_encoded``; ``mean`` equals its result."""
+        if X.shape[0] >= _DEDUPE_MIN_ROWS:
+            _, first, inverse = np.unique(self._signature(X), return_index=True, return_inverse=True)
+            if first.shape[0] < X.shape[0]:
+                return self._distribution_rows(X[first], quantiles).take(inverse.ravel())
+        return self._distribution_rows(X, quantiles)
+
+    def _distribution_rows(self, X: np.ndarray, quantiles: Sequence[float]) -> TreeDistribution:
+        chunk = max(1, _MAX_TRAVERSAL_NODES // self.n_trees)
+        return TreeDistribution.concat(
+            [
+                TreeDistribution.from_trees(self.tree_predictions(X[i : i + chunk]), quantiles)
+                for i in range(0, max(X.shape[0], 1), chunk)
+            ]
+        )
+
+    def predict_distribution(self, frame: Mapping[str, Any], quantiles: Sequence[float] = ()) -> TreeDistribution:
+        return self.distribution_encoded(self.transform(frame), quantiles)
+
+    def _meta(self) -> Dict[str, Any]:
+        return {
+            "feature_names_in": [str(c) for c in self.feature_names_in_],
+            "numeric_columns": self.numeric_columns,
+            "categorical": [
+                {"column": enc.column, "fill": enc.fill, "index": list(enc.index.items()), "unknown": enc.unknown}
+                for enc in self.categorical
+            ],
+            "n_features": self.n_features,
+            "max_depth": self.max_depth,
+            "source": self.source,
+        }
+
+    @classmethod
+    def _from_parts(cls, meta: Dict[str, Any], arrays: Dict[str, np.ndarray]) -> "CompiledPipeline":
+        categorical = [
+            CategoricalEncoding(
+                column=item["column"],
+                fill=item["fill"],
+                index={key: int(col) for key, col in item["index"]},
+                unknown=int(item["unknown"]),
+            )
+            for item in meta["categorical"]
+        ]
+        return cls(
+            feature_names_in_=np.asarray(meta["feature_names_in"], dtype=object),
+            numeric_columns=list(meta["numeric_columns"]),
+            categorical=categorical,
+            n_features=int(meta["n_features"]),
+            max_depth=int(meta["max_depth"]),
+            source=meta.get("source"),
+            **arrays,
+        )
+
+    def save(self, path: Path, compress: bool = False) -> Path:
+        """Writes the single-file archive; ``compress`` deflates it (it is read into memory whole either way)."""
+        path = Path(path)
+        with path.open("wb") as fh:
+            (np.savez_compressed if compress else np.savez)(
+                fh,
+                meta=np.array(json.dumps(self._meta(), ensure_ascii=False)),
+                **{name: getattr(self, name) for name in _ARRAY_FIELDS},
+            )
+        return path
+
+    @classmethod
+    def load(cls, path: Path) -> "CompiledPipeline":
+        with np.load(Path(path), allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            arrays = {name: data[name] for name in data.files if name != "meta"}
+        return cls._from_parts(meta, arrays)
+
+    def save_mapped(self, path: Path) -> Path:
+        """Writes the directory format and swaps it in place of any existing one.
+
+        ``meta.json`` is written last, so its mtime/size identify a complete artifact.  Processes still mapping
+        the replaced directory keep their pages until they reload (the files are unlinked, not overwritten).
+        """
+        path = Path(path)
+        staging = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        for name in _ARRAY_FIELDS:
+            np.save(staging / f"{name}.npy", np.ascontiguousarray(getattr(self, name)), allow_pickle=False)
+        (staging / "meta.json").write_text(json.dumps(self._meta(), ensure_ascii=False), encoding="utf-8")
+        retired = path.with_name(f".{path.name}.old-{os.getpid()}")
+        if path.exists():
+            os.replace(path, retired)
+        os.replace(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+        return path
+
+    @classmethod
+    def load_mapped(cls, path: Path) -> "CompiledPipeline":
+        """Opens the directory format read-only; node arrays are memory-mapped, not copied."""
+        path = Path(path)
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+        arrays = {name: np.load(path / f"{name}.npy", mmap_mode="r", allow_pickle=False) for name in _ARRAY_FIELDS}
+        return cls._from_parts(meta, arrays)
+
+
+def load_compiled(path: Path) -> CompiledPipeline:
+    path = Path(path)
+    return CompiledPipeline.load_mapped(path) if path.suffix == MAPPED_SUFFIX else CompiledPipeline.load(path)
+
+
+@lru_cache(maxsize=64)
+def _sha256(path: str, mtime_ns: int, size: int) -> str:
+    # keyed on (mtime_ns, size) too, so a file is hashed again only after it changed
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_signature(model_path: Path) -> Dict[str, Any]:
+    """Identifies a pipeline file: name, size, mtime and SHA-256 (copies keep the hash, not the mtime)."""
+    model_path = Path(model_path)
+    stat = model_path.stat()
+    return {
+        "name": model_path.name,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "sha256": _sha256(str(model_path), stat.st_mtime_ns, stat.st_size),
+    }
+
+
+def compiled_source(path: Path) -> Optional[Dict[str, Any]]:
+    """The ``source`` recorded in a compiled artifact's metadata, read without loading its arrays."""
+    path = Path(path)
+    if path.suffix == MAPPED_SUFFIX:
+        meta = json.loads((path / "meta.json").read_text(encoding="utf-8"))
+    else:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+    return meta.get("source")
+
+
+def matches_source(path: Path, model_path: Path) -> bool:
+    """True when the compiled artifact at ``path`` was built from the pipeline now at ``model_path``.
+
+    With no pipeline file to compare against (a compiled-only deployment) any artifact matches; an artifact that
+    records no source cannot be checked and does not.
+    """
+    try:
+        stat = Path(model_path).stat()
+    except FileNotFoundError:
+        return True
+    source = compiled_source(path)
+    if not source or source.get("size") != stat.st_size:
+        return False
+    if source.get("mtime_ns") == stat.st_mtime_ns:
+        return True
+    return source.get("sha256") == _sha256(str(model_path), stat.st_mtime_ns, stat.st_size)
+
+
+def _step(pipeline, name: str):
+    steps = getattr(pipeline, "named_steps", None)
+    if steps is None or name not in steps:
+        raise ModelCompileError(f"Expected a '{name}' step in {type(pipeline).__name__}")
+    return steps[name]
+
+
+def _compile_numeric(transformer, columns: List[str]):
+    imputer = _step(transformer, "imputer")
+    scaler = _step(transformer, "scaler")
+    fill = np.asarray(imputer.statistics_, dtype=np.float64)
+    if np.isnan(fill).any():
+        raise ModelCompileError("Numeric imputer dropped an all-missing column; recompile is not supported.")
+    mean = np.asarray(scaler.mean_ if scaler.mean_ is not None else np.zeros(len(columns)), dtype=np.float64)
+    scale = np.asarray(scaler.scale_ if scaler.scale_ is not None else np.ones(len(columns)), dtype=np.float64)
+    return fill, mean, scale
+
+
+def _compile_categorical(transformer, columns: List[str], offset: int) -> Tuple[List[CategoricalEncoding], int]:
+    imputer = _step(transformer, "imputer")
+    encoder = _step(transformer, "onehot")
+    widths = list(getattr(encoder, "_n_features_outs", [len(c) for c in encoder.categories_]))
+    fills = list(imputer.statistics_)
+    probe = [cats[0] for cats in encoder.categories_]
+
+    def encoded_column(position: int, value: Any, start: int, width: int) -> int:
+        row = list(probe)
+        row[position] = value
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                out = encoder.transform(np.asarray([row], dtype=object))
+        except ValueError:
+            return -1
+        block = np.asarray(out.todense() if hasattr(out, "todense") else out)[0, start : start + width]
+        hits = np.flatnonzero(block)
+        return offset + start + int(hits[0]) if hits.size else -1
+
+    encodings: List[CategoricalEncoding] = []
+    start = 0
+    for position, (name, cats, width) in enumerate(zip(columns, encoder.categories_, widths)):
+        index = {cat: encoded_column(position, cat, start, width) for cat in cats.tolist()}
+        unknown = encoded_column(position, "\u0000unseen\u0000", start, width)
+        encodings.append(
+            CategoricalEncoding(column=name, fill=fills[position], index={k: v for k, v in index.items() if v >= 0}, unknown=unknown)
+        )
+        start += width
+    return encodings, start
+
+
+def _breadth_first(tree) -> np.ndarray:
+    order = [0]
+    for node in order:
+        if tree.children_left[node] != -1:
+            order.extend((int(tree.children_left[node]), int(tree.children_right[node])))
+    return np.asarray(order, dtype=np.intp)
+
+
+def _compile_trees(model):
+    estimators = getattr(model, "estimators_", None)
+    trees = [est.tree_ for est in estimators] if estimators is not None else [model.tree_]
+    if any(getattr(t, "n_outputs", 1) != 1 for t in trees):
+        raise ModelCompileError("Only single-output regressors can be compiled.")
+
+    features, thresholds, lefts, values, roots = [], [], [], [], []
+    base = 0
+    for tree in trees:
+        order = _breadth_first(tree)
+        position = np.empty(tree.node_count, dtype=np.intp)
+        position[order] = np.arange(order.size)
+        left = tree.children_left[order]
+        leaf = left == -1
+        features.append(np.where(leaf, 0, tree.feature[order]))
+        thresholds.append(np.where(leaf, np.inf, tree.threshold[order]))
+        lefts.append(np.where(leaf, np.arange(order.size), position[np.where(leaf, 0, left)]) + base)
+        values.append(tree.value.reshape(tree.node_count, -1)[order, 0])
+        roots.append(base)
+        base += order.size
+    left = np.concatenate(lefts).astype(np.intp)
+    is_leaf = left == np.arange(base)
+    return (
+        np.concatenate(features).astype(np.intp),
+        np.concatenate(thresholds).astype(np.float64),
+        left,
+        np.where(is_leaf, left, left + 1),
+        np.concatenate(values).astype(np.float64),
+        np.asarray(roots, dtype=np.intp),
+        max(int(t.max_depth) for t in trees),
+    )
+
+
+def compile_pipeline(pipeline, source: Optional[Path] = None) -> CompiledPipeline:
+    """Flattens a fitted ``Pipeline([("pre", ColumnTransformer), ("model", tree or forest)])``.
+
+    ``source`` is the .joblib the pipeline was saved to; its signature is recorded so a stale artifact is skipped.
+    """
+    pre = _step(pipeline, "pre")
+    model = _step(pipeline, "model")
+    if getattr(pre, "remainder", "drop") != "drop":
+        raise ModelCompileError("ColumnTransformer remainder columns are not supported.")
+
+    numeric_columns: List[str] = []
+    fill = mean = scale = np.empty(0)
+    categorical: List[CategoricalEncoding] = []
+    offset = 0
+    for name, transformer, columns in pre.transformers_:
+        if name == "remainder":
+            continue
+        columns = list(columns)
+        if name == "num":
+            if offset != 0:
+                raise ModelCompileError("Numeric block must come first in the ColumnTransformer.")
+            numeric_columns = columns
+            fill, mean, scale = _compile_numeric(transformer, columns)
+            offset += len(columns)
+        elif name == "cat":
+            categorical, width = _compile_categorical(transformer, columns, offset)
+            offset += width
+        else:
+            raise ModelCompileError(f"Unsupported transformer block: {name}")
+
+    n_features = int(getattr(model, "n_features_in_", offset))
+    if n_features != offset:
+        raise ModelCompileError(f"Preprocessor yields {offset} columns but model expects {n_features}.")
+
+    feature, threshold, left, right, value, roots, max_depth = _compile_trees(model)
+    return CompiledPipeline(
+        feature_names_in_=np.asarray(pipeline.feature_names_in_, dtype=object),
+        numeric_columns=numeric_columns,
+        numeric_fill=fill,
+        numeric_mean=mean,
+        numeric_scale=scale,
+        categorical=categorical,
+        n_features=n_features,
+        feature=feature,
+        threshold=threshold,
+        left=left,
+        right=right,
+        value=value,
+        roots=roots,
+        max_depth=max_depth,
+        source=source_signature(source) if source is not None else None,
+    )
+
+
+def compiled_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(COMPILED_SUFFIX)
+
+
+def mapped_path_for(model_path: Path) -> Path:
+    return Path(model_path).with_suffix(MAPPED_SUFFIX)
+
+
+def sample_frame(compiled: CompiledPipeline, n_rows: int = 256, seed: int = 0) -> Dict[str, Any]:
+    """Synthetic rows spanning the training vocabulary (plus unseen values) for equivalence checks."""
+    rng = np.random.default_rng(seed)
+    frame: Dict[str, Any] = {}
+    for j, name in enumerate(compiled.numeric_columns):
+        values = compiled.numeric_mean[j] + compiled.numeric_scale[j] * rng.standard_normal(n_rows)
+        values[rng.random(n_rows) < 0.05] = np.nan
+        frame[name] = values
+    for enc in compiled.categorical:
+        vocab = list(enc.index) + ["UNKNOWN"]
+        frame[enc.column] = np.asarray([vocab[i] for i in rng.integers(0, len(vocab), n_rows)], dtype=object)
+    return frame
+
+
+def max_abs_difference(pipeline, compiled: CompiledPipeline, frame: Optional[Dict[str, Any]] = None) -> float:
+    import pandas as pd
+
+    frame = frame if frame is not None else sample_frame(compiled)
+    columns = list(compiled.feature_names_in_)
+    expected = pipeline.predict(pd.DataFrame({c: frame[c] for c in columns}, columns=columns))
+    return float(np.max(np.abs(expected - compiled.predict(frame))))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    import joblib
+
+    ap = argparse.ArgumentParser(description="Compile joblib pipelines into sklearn-free .npz / .model artifacts.")
+    ap.add_argument("paths", nargs="+", type=Path, help="best_*_model.joblib files or directories containing them")
+    ap.add_argument("--tolerance", type=float, default=1e-6, help="Max allowed |sklearn - compiled| on synthetic rows")
+    ap.add_argument(
+        "--compact",
+        action="store_true",
+        help=f"int32/float32 node arrays and a compressed .npz (checked at max({COMPACT_TOLERANCE:g}, --tolerance))",
+    )
+    ap.add_argument(
+        "--format",
+        choices=("npz", "mapped", "both"),
+        default="both",
+        help="npz: single-file archive; mapped: <stem>.model/ directory of .npy blocks loaded with mmap",
+    )
+    args = ap.parse_args(argv)
+
+    sources: List[Path] = []
+    for path in args.paths:
+        sources.extend(sorted(path.glob("*.joblib")) if path.is_dir() else [path])
+    for source in sources:
+        pipeline = joblib.load(source)
+        compiled = compile_pipeline(pipeline, source)
+        tolerance = args.tolerance
+        if args.compact:
+            compiled = compiled.compact()
+            tolerance = max(tolerance, COMPACT_TOLERANCE)
+        diff = max_abs_difference(pipeline, compiled)
+        if diff > tolerance:
+            print(f"{source}: compiled output differs by {diff:.3g}; not written")
+            return 1
+        targets = []
+        if args.format in ("npz", "both"):
+            targets.append(compiled.save(compiled_path_for(source), compress=args.compact))
+        if args.format in ("mapped", "both"):
+            targets.append(compiled.save_mapped(mapped_path_for(source)))
+        written = ", ".join(str(t) for t in targets)
+        print(f"{source} -> {written} ({compiled.n_trees} trees, max |diff| {diff:.3g})")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -3,11 +3,27 @@ from __future__ import annotations
 import os
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Tuple
+
+# shared by ServiceConfig and ModelStore, so a store built outside the service checks reloads the same way
+CANARY_MAX_MEAN_ABS_DIFF_DB = 10.0
+
+
+def parse_quantiles(text: str) -> Tuple[float, ...]:
+    """Comma-separated quantiles such as ``"0.1,0.5,0.9"``; each must lie in [0, 1]."""
+    try:
+        quantiles = tuple(float(part) for part in text.split(",") if part.strip())
+    except ValueError:
+        quantiles = ()
+    if not quantiles or any(not 0.0 <= q <= 1.0 for q in quantiles):
+        raise ValueError(f"quantiles must be comma-separated numbers in [0, 1], got {text!r}")
+    return quantiles
 
 
 @dataclass
 class ServiceConfig:
     # DIGITAL_MODEL_PATH / FM_MODEL_PATH / LOCATION_LOOKUP_PATH allow overriding default artifact locations.
+    # The env var, default and meaning of every other field are listed in docs/service-overview.md.
     """Holds runtime configuration for the prediction service."""
 
     digital_model_path: Path
@@ -15,6 +31,27 @@ class ServiceConfig:
     location_lookup_path: Path
     host: str = "0.0.0.0"
     port: int = 8000
+    model_backend: str = "auto"
+    cache_max_entries: int = 10000
+    cache_ttl_seconds: float = 3600.0
+    cache_float_precision: int = 4
+    canary_size: int = 64
+    canary_max_mean_abs_diff: float = CANARY_MAX_MEAN_ABS_DIFF_DB
+    model_watch_interval_seconds: float = 0.0
+    admin_token: str = ""
+    warmup_enabled: bool = True
+    warmup_rows: int = 256
+    microbatch_enabled: bool = True
+    microbatch_window_ms: float = 2.0
+    microbatch_max_rows: int = 64
+    microbatch_max_queue: int = 1024
+    inference_workers: int = 1
+    settlement_max_distance_km: float = 25.0
+    log_sample_rate: float = 0.01
+    log_slow_ms: float = 250.0
+    startup_budget_ms: float = 2000.0
+    uncertainty_quantiles: Tuple[float, ...] = (0.1, 0.5, 0.9)
+    table_enabled: bool = True
 
     @classmethod
     def from_env(cls) -> "ServiceConfig":
@@ -24,4 +61,34 @@ class ServiceConfig:
         lookup = Path(os.getenv("LOCATION_LOOKUP_PATH", base_dir / "artifacts" / "location_lookup.json"))
         host = os.getenv("PREDICT_HOST", "0.0.0.0")
         port = int(os.getenv("PREDICT_PORT", "8000"))
-        return cls(digital_model_path=digital, fm_model_path=fm, location_lookup_path=lookup, host=host, port=port)
+        backend = os.getenv("MODEL_BACKEND", "auto").strip().lower()
+        if backend not in {"auto", "compiled", "sklearn"}:
+            raise ValueError(f"MODEL_BACKEND must be auto, compiled or sklearn, got {backend!r}")
+        return cls(
+            digital_model_path=digital,
+            fm_model_path=fm,
+            location_lookup_path=lookup,
+            host=host,
+            port=port,
+            model_backend=backend,
+            cache_max_entries=int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "10000")),
+            cache_ttl_seconds=float(os.getenv("PREDICTION_CACHE_TTL_SECONDS", "3600")),
+            cache_float_precision=int(os.getenv("PREDICTION_CACHE_FLOAT_PRECISION", "4")),
+            canary_size=int(os.getenv("CANARY_SIZE", "64")),
+            canary_max_mean_abs_diff=float(os.getenv("CANARY_MAX_MEAN_ABS_DIFF_DB", CANARY_MAX_MEAN_ABS_DIFF_DB)),
+            model_watch_interval_seconds=float(os.getenv("MODEL_WATCH_INTERVAL_SECONDS", "0")),
+            admin_token=os.getenv("ADMIN_TOKEN", ""),
+            warmup_enabled=os.getenv("WARMUP_ENABLED", "true").strip().lower() not in {"0", "false", "no"},
+            warmup_rows=int(os.getenv("WARMUP_ROWS", "256")),
+            microbatch_enabled=os.getenv("MICROBATCH_ENABLED", "true").strip().lower() not in {"0", "false", "no"},
+            microbatch_window_ms=float(os.getenv("MICROBATCH_WINDOW_MS", "2")),
+            microbatch_max_rows=int(os.getenv("MICROBATCH_MAX_ROWS", "64")),
+            microbatch_max_queue=int(os.getenv("MICROBATCH_MAX_QUEUE", "1024")),
+            inference_workers=int(os.getenv("INFERENCE_WORKERS", "1")),
+            settlement_max_distance_km=float(os.getenv("SETTLEMENT_MAX_DISTANCE_KM", "25")),
+            log_sample_rate=float(os.getenv("LOG_SAMPLE_RATE", "0.01")),
+            log_slow_ms=float(os.getenv("LOG_SLOW_MS", "250")),
+            startup_budget_ms=float(os.getenv("STARTUP_BUDGET_MS", "2000")),
+            uncertainty_quantiles=parse_quantiles(os.getenv("UNCERTAINTY_QUANTILES", "0.1,0.5,0.9")),
+            table_enabled=os.getenv("PREDICTION_TABLE_ENABLED", "true").strip().lower() not in {"0", "false", "no"},
+        )
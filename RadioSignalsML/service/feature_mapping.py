@@ -6,6 +6,8 @@ from typing import Any, Dict, Mapping, Optional
 
 import math
 
+from .location_lookup import SettlementIndex
+
 
 @dataclass(frozen=True)
 class FeatureVector:
@@ -32,26 +34,61 @@ def _normalize_registry_number(value: Any) -> Optional[str]:
     return text
 
 
-def _canonical_names(payload: Mapping[str, Any], lookup: Mapping[str, Mapping[str, Optional[str]]]) -> tuple[str, str]:
-    """Resolve location names using place registry to stay aligned with training vocabulary."""
+def _registry_entry(
+    payload: Mapping[str, Any], lookup: Mapping[str, Mapping[str, Optional[str]]]
+) -> Optional[Mapping[str, Optional[str]]]:
     registry = _normalize_registry_number(
         payload.get("registry_number")
         or payload.get("settlement_registry_number")
         or payload.get("registryNumber")
     )
-    if registry and registry in lookup:
-        entry = lookup[registry]
-        muni = entry.get("municipality") or payload.get("municipality") or ""
-        sett = entry.get("settlement") or payload.get("settlement") or ""
-        return muni, sett
+    return lookup.get(registry) if registry else None
+
 
+def _payload_names(payload: Mapping[str, Any]) -> tuple[str, str]:
     muni = str(payload.get("municipality") or "").strip()
     sett = str(payload.get("settlement") or payload.get("settlement_name") or "").strip()
-    if not muni or not sett:
-        raise FeatureMappingError("Missing settlement or municipality information.")
     return muni, sett
 
 
+def _coordinates(payload: Mapping[str, Any]) -> Optional[tuple[float, float]]:
+    try:
+        lat = _coerce_float(payload.get("latitude") or payload.get("latitude_decimal") or payload.get("lat"))
+        lon = _coerce_float(payload.get("longitude") or payload.get("longitude_decimal") or payload.get("lon"))
+    except FeatureMappingError:
+        return None
+    if not (math.isfinite(lat) and math.isfinite(lon)):
+        return None
+    return lat, lon
+
+
+def _canonical_names(
+    payload: Mapping[str, Any],
+    lookup: Mapping[str, Mapping[str, Optional[str]]],
+    index: Optional[SettlementIndex] = None,
+) -> tuple[str, str]:
+    """Resolve location names using place registry to stay aligned with training vocabulary.
+
+    Falls back to the caller's names, then to the settlement nearest the payload's coordinates (within
+    ``index.max_km``) when an index is given.
+    """
+    entry = _registry_entry(payload, lookup)
+    if entry is not None:
+        muni = entry.get("municipality") or payload.get("municipality") or ""
+        sett = entry.get("settlement") or payload.get("settlement") or ""
+        return muni, sett
+
+    muni, sett = _payload_names(payload)
+    if muni and sett:
+        return muni, sett
+    coordinates = _coordinates(payload) if index is not None else None
+    if coordinates is not None:
+        nearest = index.nearest_one(coordinates[0], coordinates[1], index.max_km)
+        if nearest >= 0:
+            return index.municipality[nearest], index.settlement[nearest]
+    raise FeatureMappingError("Missing settlement or municipality information.")
+
+
 def _coerce_float(value: Any, default: float | None = None) -> float:
     if value is None:
         if default is None:
@@ -75,19 +112,22 @@ def _safe_text(value: Any, fallback: str) -> str:
     return text or fallback
 
 
-def build_feature_vector(payload: Mapping[str, Any], lookup: Mapping[str, Mapping[str, Optional[str]]]) -> FeatureVector:
-    """Transforms raw prediction request into the schema the joblib pipeline expects."""
-
+def _technology(payload: Mapping[str, Any]) -> str:
     tech_raw = str(payload.get("technology") or payload.get("tech") or "").strip().lower()
     if tech_raw in {"digital_tv", "digital"}:
-        technology = "digital"
-    elif tech_raw in {"fm", "analogue_fm"}:
-        technology = "fm"
-    else:
-        raise FeatureMappingError("Technology must be DIGITAL_TV or FM.")
+        return "digital"
+    if tech_raw in {"fm", "analogue_fm"}:
+        return "fm"
+    raise FeatureMappingError("Technology must be DIGITAL_TV or FM.")
 
+
+def _measurement_date(payload: Mapping[str, Any]) -> datetime:
+    return _parse_date(payload.get("date") or payload.get("measurement_date"))
+
+
+def _parse_date(measurement_date: Any) -> datetime:
+    """The date value a payload resolved to: ISO text, a datetime or epoch milliseconds (0 included)."""
     try:
-        measurement_date = payload.get("date") or payload.get("measurement_date")
         if isinstance(measurement_date, (int, float)):
             # epoch milliseconds from JS Date
             measurement_date = datetime.utcfromtimestamp(float(measurement_date) / 1000.0)
@@ -99,11 +139,52 @@ def build_feature_vector(payload: Mapping[str, Any], lookup: Mapping[str, Mappin
             raise FeatureMappingError("date field is required")
     except Exception as exc:
         raise FeatureMappingError("Unable to parse prediction date.") from exc
+    return measurement_date
+
+
+def _channel_feature(payload: Mapping[str, Any], technology: str) -> Dict[str, float]:
+    if technology == "digital":
+        return {"tv_channel": _coerce_float(payload.get("tv_channel") or payload.get("channel_number"))}
+    return {"fm_freq_mhz": _coerce_float(payload.get("fm_freq_mhz") or payload.get("frequency_mhz"))}
+
+
+def _program_features(payload: Mapping[str, Any]) -> Dict[str, str]:
+    return {
+        "program_id": _safe_text(payload.get("program_identifier") or payload.get("programId"), "UNKNOWN"),
+        "emitter": _safe_text(payload.get("transmitter_location") or payload.get("emitter"), "UNKNOWN"),
+    }
+
+
+def build_emission_features(payload: Mapping[str, Any]) -> FeatureVector:
+    """Maps only the site-independent fields (date, program, emitter, channel/frequency).
+
+    Used when many sites share one emission, e.g. coverage grids.
+    """
+    technology = _technology(payload)
+    measurement_date = _measurement_date(payload)
+    features: Dict[str, Any] = {"year": measurement_date.year, "month": measurement_date.month}
+    features.update(_program_features(payload))
+    features.update(_channel_feature(payload, technology))
+    return FeatureVector(technology=technology, features=features)
+
+
+def build_feature_vector(
+    payload: Mapping[str, Any],
+    lookup: Mapping[str, Mapping[str, Optional[str]]],
+    index: Optional[SettlementIndex] = None,
+) -> FeatureVector:
+    """Transforms raw prediction request into the schema the joblib pipeline expects.
+
+    With an ``index``, a payload without registry number or names resolves to the nearest settlement.
+    """
+
+    technology = _technology(payload)
+    measurement_date = _measurement_date(payload)
 
     year = measurement_date.year
     month = measurement_date.month
 
-    muni, sett = _canonical_names(payload, lookup)
+    muni, sett = _canonical_names(payload, lookup, index)
 
     lat = _coerce_float(payload.get("latitude") or payload.get("latitude_decimal") or payload.get("lat"))
     lon = _coerce_float(payload.get("longitude") or payload.get("longitude_decimal") or payload.get("lon"))
@@ -112,9 +193,6 @@ def build_feature_vector(payload: Mapping[str, Any], lookup: Mapping[str, Mappin
     population = _coerce_float(payload.get("population"), default=0)
     households = _coerce_float(payload.get("households"), default=0)
 
-    program_id = _safe_text(payload.get("program_identifier") or payload.get("programId"), "UNKNOWN")
-    emitter = _safe_text(payload.get("transmitter_location") or payload.get("emitter"), "UNKNOWN")
-
     base = {
         "latitude": lat,
         "longitude": lon,
@@ -125,13 +203,8 @@ def build_feature_vector(payload: Mapping[str, Any], lookup: Mapping[str, Mappin
         "households": households,
         "municipality": muni,
         "settlement": sett,
-        "program_id": program_id,
-        "emitter": emitter,
     }
-
-    if technology == "digital":
-        base["tv_channel"] = _coerce_float(payload.get("tv_channel") or payload.get("channel_number"))
-    else:
-        base["fm_freq_mhz"] = _coerce_float(payload.get("fm_freq_mhz") or payload.get("frequency_mhz"))
+    base.update(_program_features(payload))
+    base.update(_channel_feature(payload, technology))
 
     return FeatureVector(technology=technology, features=base)
@@ -1,8 +1,19 @@
 ﻿from __future__ import annotations
 
 import json
+import math
+from dataclasses import dataclass
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, Mapping
+from typing import TYPE_CHECKING, Any, Dict, Mapping, Optional
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from scipy.spatial import cKDTree
+
+# length of one degree of latitude (mean Earth radius); converts km radii into index units
+_KM_PER_DEGREE = 111.195
 
 
 def load_location_lookup(path: Path) -> Mapping[str, Dict[str, str]]:
@@ -12,3 +23,90 @@ def load_location_lookup(path: Path) -> Mapping[str, Dict[str, str]]:
         data = json.load(fh)
     # normalise keys to plain strings so lookups from ints succeed
     return {str(k): v for k, v in data.items() if isinstance(v, dict)}
+
+
+@dataclass(frozen=True, eq=False)
+class SettlementIndex:
+    """Column arrays of the lookup settlements that carry a representative coordinate, plus a KD-tree over them.
+
+    Points are projected equirectangularly (longitude scaled by the cosine of the settlements' mean latitude),
+    which is accurate at the scale of one country and keeps queries in plain 2-D Euclidean space.  ``max_km``
+    bounds how far a payload's coordinates may be from a settlement to be resolved to it.
+    """
+
+    latitude: np.ndarray
+    longitude: np.ndarray
+    elevation_m: np.ndarray
+    population: np.ndarray
+    households: np.ndarray
+    municipality: np.ndarray
+    settlement: np.ndarray
+    registry: np.ndarray
+    scale: float
+    max_km: Optional[float] = None
+
+    @classmethod
+    def from_lookup(cls, lookup: Mapping[str, Mapping[str, Any]], max_km: Optional[float] = None) -> "SettlementIndex":
+        keys = [k for k, e in lookup.items() if e.get("latitude") is not None and e.get("longitude") is not None]
+        entries = [lookup[k] for k in keys]
+
+        def numeric(key: str) -> np.ndarray:
+            return np.asarray([np.nan if e.get(key) is None else e[key] for e in entries], dtype=np.float64)
+
+        latitude, longitude = numeric("latitude"), numeric("longitude")
+        scale = math.cos(math.radians(float(latitude.mean()))) if entries else 1.0
+        return cls(
+            latitude=latitude,
+            longitude=longitude,
+            elevation_m=numeric("elevation_m"),
+            population=numeric("population"),
+            households=numeric("households"),
+            municipality=np.asarray([e.get("municipality") or "" for e in entries], dtype=object),
+            settlement=np.asarray([e.get("settlement") or "" for e in entries], dtype=object),
+            registry=np.asarray(keys, dtype=object),
+            scale=scale,
+            max_km=max_km if max_km and max_km > 0 else None,
+        )
+
+    @cached_property
+    def tree(self) -> Optional[cKDTree]:
+        """KD-tree over the projected coordinates, built (and scipy imported) on first use; see ``warm_up``."""
+        if not len(self.latitude):
+            return None
+        from scipy.spatial import cKDTree
+
+        return cKDTree(np.column_stack([self.latitude, self.longitude * self.scale]))
+
+    def warm_up(self) -> int:
+        """Builds the KD-tree ahead of the first coordinate-only payload; returns the indexed settlements."""
+        return 0 if self.tree is None else len(self)
+
+    def __len__(self) -> int:
+        return int(self.latitude.shape[0])
+
+    def nearest(self, latitude: Any, longitude: Any, max_km: Optional[float] = None) -> np.ndarray:
+        """Index of the closest settlement per point, or -1 where none lies within ``max_km``.
+
+        Points with a NaN or infinite coordinate get -1 as well; cKDTree would reject the whole query.
+        """
+        latitude = np.atleast_1d(np.asarray(latitude, dtype=np.float64))
+        longitude = np.atleast_1d(np.asarray(longitude, dtype=np.float64))
+        index = np.full(latitude.shape[0], -1, dtype=np.intp)
+        finite = np.isfinite(latitude) & np.isfinite(longitude)
+        if self.tree is None or not finite.any():
+            return index
+        bound = max_km / _KM_PER_DEGREE if max_km else np.inf
+        points = np.column_stack([latitude[finite], longitude[finite] * self.scale])
+        _, found = self.tree.query(points, k=1, distance_upper_bound=bound)
+        found = np.asarray(found, dtype=np.intp)
+        found[found >= len(self)] = -1  # cKDTree reports "nothing within bound" as n
+        index[finite] = found
+        return index
+
+    def nearest_one(self, latitude: float, longitude: float, max_km: Optional[float] = None) -> int:
+        """Scalar form of ``nearest`` for single payloads; skips the array round trip."""
+        if self.tree is None or not (math.isfinite(latitude) and math.isfinite(longitude)):
+            return -1
+        bound = max_km / _KM_PER_DEGREE if max_km else np.inf
+        _, index = self.tree.query((latitude, longitude * self.scale), k=1, distance_upper_bound=bound)
+        return int(index) if index < len(self) else -1
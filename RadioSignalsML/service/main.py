@@ -1,40 +1,428 @@
 ﻿from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+from .startup import PROFILER
 
-from .config import ServiceConfig
+PROFILER.start_imports()  # first, so GET /startup times every import below and those build_app triggers
+
+import hmac
+import io
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Iterable
+
+import numpy as np
+from fastapi import FastAPI, Header, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse
+from pydantic import ValidationError
+
+from .arrow_batch import (
+    ARROW_STREAM,
+    ArrowBatchError,
+    accepts_arrow,
+    read_table,
+    table_columns,
+    validate_table,
+    write_table,
+)
+from .config import ServiceConfig, parse_quantiles
 from .feature_mapping import FeatureMappingError
+from .metrics import (
+    CONTENT_TYPE,
+    PREDICTION_ERRORS,
+    PREDICTIONS,
+    REGISTRY,
+    STAGE_SECONDS,
+    MetricsMiddleware,
+    Sample,
+    SampledRequestLog,
+    ms_since,
+    request_logger,
+)
+from .micro_batcher import MicroBatcher, QueueFullError
+from .model_store import ModelValidationError
 from .predictor import SignalPredictorService
-from .schemas import PredictionInput, PredictionResponse
+from .schemas import (
+    BatchPredictionItem,
+    BatchPredictionRequest,
+    BatchPredictionResponse,
+    GridPredictionRequest,
+    ModelReloadRequest,
+    ModelSwapResponse,
+    PredictionInput,
+    PredictionResponse,
+)
+
+
+def _validation_message(exc: ValidationError) -> str:
+    parts = []
+    for err in exc.errors():
+        field = ".".join(str(loc) for loc in err.get("loc", ())) or "payload"
+        parts.append(f"{field}: {err.get('msg')}")
+    return "; ".join(parts)
+
+
+# request schema spelling -> the technology keys used by the model store and the metrics
+_TECHNOLOGY_LABELS = {"DIGITAL_TV": "digital", "FM": "fm"}
+
+
+def _parse_body(schema, body: bytes):
+    # what FastAPI would do for a ``req: <schema>`` parameter, done by hand so validation can be timed and the
+    # body's content type chosen by the handler
+    try:
+        return schema.model_validate(json.loads(body))
+    except json.JSONDecodeError as exc:
+        raise RequestValidationError(
+            [{"type": "json_invalid", "loc": ("body", exc.pos), "msg": "JSON decode error", "input": {}}]
+        )
+    except ValidationError as exc:
+        raise RequestValidationError([{**err, "loc": ("body", *err.get("loc", ()))} for err in exc.errors()])
+
+
+def _requested_quantiles(uncertainty: bool, quantiles: str | None, default: tuple) -> tuple | None:
+    # ?quantiles= implies ?uncertainty=true; None means a plain point prediction
+    if quantiles is None:
+        return default if uncertainty else None
+    try:
+        return parse_quantiles(quantiles)
+    except ValueError as exc:
+        raise RequestValidationError(
+            [{"type": "value_error", "loc": ("query", "quantiles"), "msg": str(exc), "input": quantiles}]
+        )
 
 
 def build_app() -> FastAPI:
-    config = ServiceConfig.from_env()
-    predictor = SignalPredictorService(config)
+    PROFILER.mark("import")
+    with PROFILER.phase("config"):
+        config = ServiceConfig.from_env()
+    with PROFILER.phase("predictor"):
+        predictor = SignalPredictorService(config)
+    batcher = (
+        MicroBatcher(
+            predictor.predict_many,
+            window_ms=config.microbatch_window_ms,
+            max_rows=config.microbatch_max_rows,
+            max_queue=config.microbatch_max_queue,
+            workers=config.inference_workers,
+        )
+        if config.microbatch_enabled
+        else None
+    )
 
     app = FastAPI(
         title="Radio Signals Prediction API",
         version="1.0.0",
         summary="Inference endpoint for trained electric field models",
     )
+    app.add_middleware(
+        MetricsMiddleware,
+        paths=[
+            "/health", "/ready", "/startup", "/metrics", "/cache/stats", "/predict", "/predict/batch", "/predict/grid",
+            *(f"/admin/models/{tech}/{action}" for tech in ("digital", "fm") for action in ("reload", "rollback")),
+        ],
+    )
+    request_log = SampledRequestLog(request_logger(), config.log_sample_rate, config.log_slow_ms)
+
+    def service_samples() -> Iterable[Sample]:
+        # read at scrape time, so the request path never touches these
+        for technology, state in predictor.model_status().items():
+            active = state["active"]
+            loaded = int(active is not None)
+            yield "radio_model_loaded", "gauge", "1 when a model is active.", {"technology": technology}, loaded
+            if active is not None:
+                labels = {"technology": technology, "version": active["version"]}
+                load_seconds = active["load_ms"] / 1000.0
+                yield "radio_model_load_seconds", "gauge", "Load time of the active model.", labels, load_seconds
+                generation = active["generation"]
+                yield "radio_model_generation", "gauge", "Load generation of the active model.", labels, generation
+        yield "radio_ready", "gauge", "1 once warm-up finished.", {}, int(predictor.readiness()["ready"])
+        yield from PROFILER.samples()
+        cache = predictor.cache_stats()
+        yield "radio_cache_entries", "gauge", "Prediction cache entries.", {}, cache["entries"]
+        for field in ("hits", "misses", "evictions", "expirations", "invalidations"):
+            yield f"radio_cache_{field}_total", "counter", f"Prediction cache {field}.", {}, cache[field]
+        if batcher is not None:
+            stats = batcher.stats()
+            yield "radio_microbatch_pending_rows", "gauge", "Rows waiting for a micro-batch.", {}, stats["pending"]
+            yield "radio_microbatch_batches_total", "counter", "Micro-batches scored.", {}, stats["batches"]
+            yield "radio_microbatch_rows_total", "counter", "Rows scored through micro-batches.", {}, stats["rows"]
+            yield "radio_microbatch_rejected_total", "counter", "Requests rejected with 429.", {}, stats["rejected"]
+
+    def require_admin(token: str | None) -> None:
+        # fail closed: without a configured ADMIN_TOKEN the admin endpoints are off
+        if not config.admin_token:
+            raise HTTPException(status_code=403, detail="Admin endpoints are disabled; set ADMIN_TOKEN to enable them")
+        if token is None or not hmac.compare_digest(token.encode("utf-8"), config.admin_token.encode("utf-8")):
+            raise HTTPException(status_code=401, detail="Missing or invalid X-Admin-Token")
+
+    def check_technology(technology: str) -> None:
+        if technology not in ("digital", "fm"):
+            raise HTTPException(status_code=404, detail=f"Unknown technology: {technology}")
+
+    @app.on_event("startup")
+    def start_warm_up() -> None:
+        # in the background so /health answers liveness probes while models load; /ready gates traffic
+        if config.warmup_enabled:
+            threading.Thread(
+                target=predictor.warm_up, args=(config.warmup_rows,), name="model-warm-up", daemon=True
+            ).start()
+        else:
+            predictor.mark_ready()
+
+    @app.on_event("startup")
+    def start_artifact_watcher() -> None:
+        predictor.start_watcher(config.model_watch_interval_seconds)
+
+    @app.on_event("shutdown")
+    def stop_artifact_watcher() -> None:
+        predictor.stop_watcher()
+
+    @app.on_event("shutdown")
+    async def stop_micro_batcher() -> None:
+        if batcher is not None:
+            await batcher.close()
 
     @app.get("/health")
-    def health() -> dict[str, str]:
-        return {"status": "ok"}
+    def health() -> dict:
+        return {"status": "ok", "models": predictor.model_status()}
+
+    @app.get("/startup")
+    def startup() -> dict:
+        return PROFILER.report()
 
-    @app.post("/predict", response_model=PredictionResponse)
-    def predict(req: PredictionInput) -> PredictionResponse:
+    @app.get("/ready")
+    def ready() -> JSONResponse:
+        state = predictor.readiness()
+        status = "ready" if state["ready"] else "warming_up"
+        return JSONResponse({"status": status, "models": state["models"]}, status_code=200 if state["ready"] else 503)
+
+    @app.post("/admin/models/{technology}/reload", response_model=ModelSwapResponse)
+    def reload_model(
+        technology: str,
+        req: ModelReloadRequest | None = None,
+        x_admin_token: str | None = Header(None),
+    ) -> ModelSwapResponse:
+        # sync handler: runs in the threadpool, so loading never stalls the event loop or in-flight predictions
+        require_admin(x_admin_token)
+        check_technology(technology)
+        try:
+            return ModelSwapResponse(**predictor.reload_model(technology, req.artifact if req else None))
+        except FileNotFoundError as exc:
+            raise HTTPException(status_code=404, detail=str(exc))
+        except ModelValidationError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+
+    @app.post("/admin/models/{technology}/rollback", response_model=ModelSwapResponse)
+    def rollback_model(technology: str, x_admin_token: str | None = Header(None)) -> ModelSwapResponse:
+        require_admin(x_admin_token)
+        check_technology(technology)
+        try:
+            return ModelSwapResponse(**predictor.rollback_model(technology))
+        except LookupError as exc:
+            raise HTTPException(status_code=409, detail=str(exc))
+
+    @app.get("/cache/stats")
+    def cache_stats() -> dict:
+        return predictor.cache_stats()
+
+    @app.get("/metrics", response_class=Response)
+    def metrics() -> Response:
+        return Response(REGISTRY.render([service_samples]), media_type=CONTENT_TYPE)
+
+    @app.post(
+        "/predict",
+        response_model=PredictionResponse,
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "content": {"application/json": {"schema": PredictionInput.model_json_schema()}},
+            }
+        },
+    )
+    async def predict(request: Request, uncertainty: bool = False, quantiles: str | None = None) -> Response:
+        body = await request.body()
+        start = time.perf_counter()
+        req = _parse_body(PredictionInput, body)
+        levels = _requested_quantiles(uncertainty, quantiles, config.uncertainty_quantiles)
+        technology = _TECHNOLOGY_LABELS[req.technology]
+        validate_ms = STAGE_SECONDS.since(start, "validate", technology) * 1000.0
+        event = {"event": "predict", "technology": technology, "validate_ms": round(validate_ms, 3)}
+        # scoring never runs on the event loop: rows are coalesced per technology onto the inference executor
+        try:
+            infer_start = time.perf_counter()
+            if levels is not None:
+                # every tree's output is needed, so these skip the micro-batcher and the cache
+                payload = await run_in_threadpool(predictor.predict, req.model_dump(), levels)
+            elif batcher is None:
+                payload = await run_in_threadpool(predictor.predict, req.model_dump())
+            else:
+                payload = await batcher.submit(technology, req.model_dump())
+            event["infer_ms"] = round(ms_since(infer_start), 3)
+        except (FeatureMappingError, QueueFullError, FileNotFoundError) as exc:
+            reason = {FeatureMappingError: "mapping", QueueFullError: "queue_full"}.get(type(exc), "model_missing")
+            PREDICTION_ERRORS.inc("predict", technology, reason)
+            request_log.emit({**event, "status": "error", "reason": reason, "detail": str(exc)}, ms_since(start), True)
+            if isinstance(exc, FeatureMappingError):
+                raise HTTPException(status_code=400, detail=str(exc))
+            if isinstance(exc, QueueFullError):
+                raise HTTPException(status_code=429, detail=str(exc), headers={"Retry-After": "1"})
+            raise
+        serialize_start = time.perf_counter()
+        content = PredictionResponse(**payload).model_dump_json(exclude_none=True)
+        event["serialize_ms"] = round(STAGE_SECONDS.since(serialize_start, "serialize", technology) * 1000.0, 3)
+        PREDICTIONS.inc("predict", technology)
+        request_log.emit({**event, "status": "ok", "model_version": payload["model_version"]}, ms_since(start))
+        return Response(content, media_type="application/json")
+
+    def score_json(req: BatchPredictionRequest, levels: tuple | None, features: bool) -> BatchPredictionResponse:
+        start = time.perf_counter()
+        results: list[BatchPredictionItem | None] = [None] * len(req.items)
+        valid_positions: list[int] = []
+        valid_payloads: list[dict] = []
+        for index, item in enumerate(req.items):
+            item_start = time.perf_counter()
+            try:
+                parsed = PredictionInput.model_validate(item)
+            except ValidationError as exc:
+                results[index] = BatchPredictionItem(index=index, error=_validation_message(exc))
+                PREDICTION_ERRORS.inc("batch", "unknown", "validation")
+                continue
+            STAGE_SECONDS.since(item_start, "validate", _TECHNOLOGY_LABELS[parsed.technology])
+            valid_payloads.append(parsed.model_dump())
+            valid_positions.append(index)
+
+        outcomes = predictor.predict_batch(valid_payloads, levels)
+        for position, payload, outcome in zip(valid_positions, valid_payloads, outcomes):
+            outcome["index"] = position
+            if not features:
+                outcome.pop("features", None)
+            results[position] = BatchPredictionItem(**outcome)
+            if outcome.get("error") is None:
+                PREDICTIONS.inc("batch", outcome["technology"])
+            else:
+                PREDICTION_ERRORS.inc("batch", _TECHNOLOGY_LABELS[payload["technology"]], "mapping")
+
+        failed = sum(1 for item in results if item.error is not None)
+        request_log.emit(
+            {"event": "predict_batch", "rows": len(results), "failed": failed}, ms_since(start), failed == len(results)
+        )
+        return BatchPredictionResponse(results=results, succeeded=len(results) - failed, failed=failed)
+
+    def score_arrow(body: bytes, levels: tuple | None, features: bool) -> Response:
+        # validation, mapping and scoring a column at a time; no per-row objects on the way in or out
+        start = time.perf_counter()
+        try:
+            table = read_table(body)
+        except ArrowBatchError as exc:
+            raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(exc), "input": None}])
+        invalid = validate_table(table)
+        columns, n_rows = table_columns(table)
+        result = predictor.predict_table(columns, n_rows, invalid, levels, features)
+
+        scored = Counter(t for t in result["technology"].tolist() if t is not None)
+        for technology, count in scored.items():
+            PREDICTIONS.inc("batch", technology, amount=count)
+        if invalid:
+            PREDICTION_ERRORS.inc("batch", "unknown", "validation", amount=len(invalid))
+        requested = columns["technology"]
+        unmapped = Counter(
+            _TECHNOLOGY_LABELS[requested[i]]
+            for i, (technology, error) in enumerate(zip(result["technology"].tolist(), result["error"].tolist()))
+            if technology is None and error is not None and i not in invalid
+        )
+        for technology, count in unmapped.items():
+            PREDICTION_ERRORS.inc("batch", technology, "mapping", amount=count)
+
+        serialize_start = time.perf_counter()
+        content = write_table(result)
+        failed = n_rows - sum(scored.values())
+        event = {"event": "predict_batch", "format": "arrow", "rows": n_rows, "failed": failed}
+        event["serialize_ms"] = round(ms_since(serialize_start), 3)
+        request_log.emit(event, ms_since(start), failed == n_rows)
+        return Response(content, media_type=ARROW_STREAM)
+
+    @app.post(
+        "/predict/batch",
+        response_model=BatchPredictionResponse,
+        openapi_extra={
+            "requestBody": {
+                "required": True,
+                "content": {
+                    "application/json": {"schema": BatchPredictionRequest.model_json_schema()},
+                    ARROW_STREAM: {"schema": {"type": "string", "format": "binary"}},
+                },
+            }
+        },
+        responses={200: {"content": {ARROW_STREAM: {}}, "description": "Results in request order"}},
+    )
+    async def predict_batch(
+        request: Request, uncertainty: bool = False, quantiles: str | None = None, features: bool = True
+    ) -> BatchPredictionResponse | Response:
+        body = await request.body()
+        levels = _requested_quantiles(uncertainty, quantiles, config.uncertainty_quantiles)
+        # an Arrow IPC stream body is answered with an Arrow IPC stream of result columns
+        if accepts_arrow(request.headers.get("content-type")):
+            return await run_in_threadpool(score_arrow, body, levels, features)
+        req = _parse_body(BatchPredictionRequest, body)
+        return await run_in_threadpool(score_json, req, levels, features)
+
+    @app.post(
+        "/predict/grid",
+        response_class=Response,
+        responses={200: {"content": {"application/x-npy": {}}, "description": "float32 .npy raster (rows x cols)"}},
+    )
+    def predict_grid(req: GridPredictionRequest) -> Response:
+        start = time.perf_counter()
+        technology = _TECHNOLOGY_LABELS[req.technology]
         try:
-            payload = predictor.predict(req.dict())
-            print(payload)
-            return PredictionResponse(**payload)
-        except FeatureMappingError as exc:
-            raise HTTPException(status_code=400, detail=str(exc))
+            grid = predictor.predict_grid(req.model_dump())
+        except (FeatureMappingError, FileNotFoundError) as exc:
+            reason = "mapping" if isinstance(exc, FeatureMappingError) else "model_missing"
+            PREDICTION_ERRORS.inc("grid", technology, reason)
+            event = {"event": "predict_grid", "technology": technology, "reason": reason, "detail": str(exc)}
+            request_log.emit(event, ms_since(start), True)
+            raise HTTPException(status_code=400 if reason == "mapping" else 503, detail=str(exc))
+        PREDICTIONS.inc("grid", technology, amount=grid.values.size)
+        request_log.emit(
+            {"event": "predict_grid", "technology": technology, "cells": int(grid.values.size)}, ms_since(start)
+        )
+        buffer = io.BytesIO()
+        np.save(buffer, grid.values, allow_pickle=False)
+        return Response(
+            content=buffer.getvalue(),
+            media_type="application/x-npy",
+            headers={
+                "X-Grid-Shape": f"{grid.values.shape[0]},{grid.values.shape[1]}",
+                "X-Grid-Bounds": f"{grid.south},{grid.west},{grid.north},{grid.east}",
+                "X-Technology": grid.technology,
+                "X-Model-Version": grid.model_version,
+            },
+        )
 
+    if not PROFILER.finished:
+        PROFILER.mark("app")
+        PROFILER.budget_ms = config.startup_budget_ms
+        seconds = PROFILER.finish()
+        if config.startup_budget_ms > 0 and seconds * 1000.0 > config.startup_budget_ms:
+            logging.getLogger(__name__).warning(
+                "startup took %.0f ms, over STARTUP_BUDGET_MS=%.0f; see GET /startup",
+                seconds * 1000.0,
+                config.startup_budget_ms,
+            )
     return app
 
 
-app = build_app()
+def __getattr__(name: str):
+    # ``app`` is built on first access (uvicorn's "service.main:app"), so importing this module for build_app or
+    # its helpers loads no lookup, settlement index or model store
+    if name == "app":
+        app = globals()["app"] = build_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
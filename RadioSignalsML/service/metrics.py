@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import random
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _format_labels(names: Sequence[str], values: Sequence[Any], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str] = ()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}" for key, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *label_values: str, amount: float = 1.0) -> None:
+        self.inc(*label_values, amount=-amount)
+
+    def set(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            self._values[label_values] = value
+
+
+class Histogram(_Metric):
+    """Fixed-bucket histogram; ``observe`` is one bisect plus a few additions under a lock."""
+
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, documentation: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+    ):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                # per-bucket counts (last slot is +Inf), then sum and count
+                series = self._series[label_values] = [0.0] * (len(self.buckets) + 3)
+            series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def since(self, start: float, *label_values: str) -> float:
+        """Observes the seconds elapsed since a ``time.perf_counter()`` reading and returns them."""
+        elapsed = time.perf_counter() - start
+        self.observe(elapsed, *label_values)
+        return elapsed
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((key, list(values)) for key, values in self._series.items())
+        lines = self.header()
+        bounds = [_format_value(float(b)) for b in self.buckets] + ["+Inf"]
+        for key, values in series:
+            cumulative = 0.0
+            for bound, count in zip(bounds, values):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {int(cumulative)}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{labels} {int(values[-1])}")
+        return lines
+
+
+Sample = Tuple[str, str, str, Mapping[str, Any], float]  # name, kind, help, labels, value
+
+
+class Registry:
+    """Holds the process's metrics; ``collectors`` add values that are cheaper to read at scrape time."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], Iterable[Sample]]] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collector: Callable[[], Iterable[Sample]]) -> None:
+        self._collectors.append(collector)
+
+    def render(self, collectors: Iterable[Callable[[], Iterable[Sample]]] = ()) -> str:
+        """Text exposition of every metric, then of the registered and the given ``collectors``."""
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        seen = set()
+        for collector in [*self._collectors, *collectors]:
+            for name, kind, documentation, labels, value in collector():
+                if name not in seen:
+                    seen.add(name)
+                    lines.append(f"# HELP {name} {documentation}")
+                    lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name}{_format_labels(list(labels), list(labels.values()))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.register(
+    Histogram(
+        "radio_stage_seconds",
+        "Time spent per inference stage (validate, map_features, queue_wait, build_frame, model_predict, serialize).",
+        ("stage", "technology"),
+    )
+)
+REQUEST_SECONDS = REGISTRY.register(
+    Histogram("radio_http_request_seconds", "End-to-end HTTP handling time.", ("path", "method", "status"))
+)
+IN_FLIGHT = REGISTRY.register(Gauge("radio_http_requests_in_flight", "Requests currently being handled.", ("path",)))
+PREDICTIONS = REGISTRY.register(
+    Counter("radio_predictions_total", "Rows scored, by endpoint and technology.", ("endpoint", "technology"))
+)
+PREDICTION_ERRORS = REGISTRY.register(
+    Counter(
+        "radio_prediction_errors_total", "Rows rejected, by endpoint, technology and reason.",
+        ("endpoint", "technology", "reason"),
+    )
+)
+TABLE_LOOKUPS = REGISTRY.register(
+    Counter(
+        "radio_prediction_table_lookups_total", "Precomputed-table lookups, by technology and outcome (hit, miss).",
+        ("technology", "outcome"),
+    )
+)
+BATCH_ROWS = REGISTRY.register(
+    Histogram("radio_model_batch_rows", "Rows per model call.", ("technology",), buckets=BATCH_BUCKETS)
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording in-flight requests and end-to-end latency per route.
+
+    Only paths listed in ``paths`` get their own label (anything else is reported as ``other``), which keeps
+    label cardinality bounded when clients probe random URLs.
+    """
+
+    def __init__(self, app, paths: Iterable[str] = ()):
+        self.app = app
+        self.paths = frozenset(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        status = {"code": 500}
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        IN_FLIGHT.inc(path)
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            IN_FLIGHT.dec(path)
+            REQUEST_SECONDS.since(start, path, scope["method"], str(status["code"]))
+
+
+class SampledRequestLog:
+    """Writes one JSON line per request for a random ``sample_rate`` share of traffic.
+
+    Errors and requests slower than ``slow_ms`` are always written, so the interesting lines survive sampling.
+    """
+
+    def __init__(
+        self,
+        logger: logging.Logger,
+        sample_rate: float,
+        slow_ms: float,
+        rng: Callable[[], float] = random.random,
+    ):
+        self._logger = logger
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+        self._rng = rng
+
+    def emit(self, event: Dict[str, Any], total_ms: float, error: bool = False) -> None:
+        if error or (self.slow_ms > 0 and total_ms >= self.slow_ms) or self._rng() < self.sample_rate:
+            event["total_ms"] = round(total_ms, 3)
+            event["sampled"] = not error and not (self.slow_ms > 0 and total_ms >= self.slow_ms)
+            self._logger.info(json.dumps(event, separators=(",", ":"), default=str))
+
+
+def request_logger(name: str = "service.requests") -> logging.Logger:
+    """Returns a logger writing bare JSON lines to stderr (uvicorn leaves non-uvicorn loggers unconfigured)."""
+    logger = logging.getLogger(name)
+    if not logger.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+
+def ms_since(start: float) -> float:
+    return (time.perf_counter() - start) * 1000.0
+
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Sequence, Set, Tuple
+
+from .metrics import STAGE_SECONDS
+
+
+class QueueFullError(RuntimeError):
+    """Raised by ``MicroBatcher.submit`` when the number of queued rows reached ``max_queue``."""
+
+
+class MicroBatcher:
+    """Coalesces single-row requests into micro-batches scored on a dedicated executor.
+
+    Each lane (one per technology) waits up to ``window_ms`` after its first queued row, or until ``max_rows``
+    rows are waiting, and hands the batch to ``score`` in one call.  ``score`` receives the queued items and
+    returns one outcome per item; an outcome that is an ``Exception`` is raised to that item's caller.  If the
+    call itself raises, the batch's items are scored again one at a time, so one row that breaks the call fails
+    only its own request.  Each lane has up to ``workers`` batches in flight on the executor; while they are
+    being scored, new rows keep queueing, so batches grow with load instead of latency.
+    """
+
+    def __init__(
+        self,
+        score: Callable[[Sequence[Any]], List[Any]],
+        window_ms: float = 2.0,
+        max_rows: int = 64,
+        max_queue: int = 1024,
+        workers: int = 1,
+    ):
+        self._score = score
+        self._window = max(0.0, window_ms) / 1000.0
+        self._max_rows = max(1, max_rows)
+        self._max_queue = max(1, max_queue)
+        self._workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="inference")
+        self._lanes: Dict[str, Tuple[asyncio.Queue, asyncio.Task]] = {}
+        self._in_flight: Set[asyncio.Task] = set()
+        self._pending = 0
+        self.batches = 0
+        self.rows = 0
+        self.rejected = 0
+        self.largest_batch = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def submit(self, lane: str, item: Any) -> Any:
+        if self._pending >= self._max_queue:
+            self.rejected += 1
+            raise QueueFullError(f"Inference queue is full ({self._max_queue} rows waiting)")
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending += 1
+        self._lane(lane).put_nowait((item, future, time.perf_counter()))
+        outcome = await future
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    def _lane(self, name: str) -> asyncio.Queue:
+        # created lazily so queues and tasks belong to the server's running loop
+        if name not in self._lanes:
+            queue: asyncio.Queue = asyncio.Queue()
+            self._lanes[name] = (queue, asyncio.create_task(self._drain(name, queue), name=f"micro-batch-{name}"))
+        return self._lanes[name][0]
+
+    async def _drain(self, lane: str, queue: asyncio.Queue) -> None:
+        slots = asyncio.Semaphore(self._workers)
+        while True:
+            await slots.acquire()  # with one worker, the next batch is collected only once this one is scored
+            batch = [await queue.get()]
+            if self._window and queue.qsize() < self._max_rows - 1:
+                await asyncio.sleep(self._window)
+            while len(batch) < self._max_rows and not queue.empty():
+                batch.append(queue.get_nowait())
+            self._pending -= len(batch)
+            flushed = time.perf_counter()
+            for _, _, queued in batch:
+                STAGE_SECONDS.observe(flushed - queued, "queue_wait", lane)
+            self.batches += 1
+            self.rows += len(batch)
+            self.largest_batch = max(self.largest_batch, len(batch))
+            task = asyncio.create_task(self._run(batch, slots))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future, float]], slots: asyncio.Semaphore) -> None:
+        loop = asyncio.get_running_loop()
+        items = [item for item, _, _ in batch]
+        try:
+            try:
+                outcomes = await loop.run_in_executor(self._executor, self._score, items)
+            except Exception as exc:
+                if len(items) == 1:
+                    outcomes = [exc]
+                else:  # isolate the row(s) that broke the call instead of failing every caller with them
+                    outcomes = [await self._score_one(loop, item) for item in items]
+        finally:
+            slots.release()
+        for (_, future, _), outcome in zip(batch, outcomes):
+            if not future.done():  # the client may have gone away
+                future.set_result(outcome)
+
+    async def _score_one(self, loop: asyncio.AbstractEventLoop, item: Any) -> Any:
+        try:
+            return (await loop.run_in_executor(self._executor, self._score, [item]))[0]
+        except Exception as exc:
+            return exc
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending": self._pending,
+            "batches": self.batches,
+            "rows": self.rows,
+            "rejected": self.rejected,
+            "largest_batch": self.largest_batch,
+            "mean_batch_rows": (self.rows / self.batches) if self.batches else 0.0,
+        }
+
+    async def close(self) -> None:
+        tasks = [task for _, task in self._lanes.values()] + list(self._in_flight)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._lanes.clear()
+        self._executor.shutdown(wait=False)
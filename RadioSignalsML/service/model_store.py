@@ -1,55 +1,415 @@
 ﻿from __future__ import annotations
 
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Tuple
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
-import joblib
-import pandas as pd
+import numpy as np
 import warnings
-from sklearn.exceptions import InconsistentVersionWarning
 
+from .compiled_model import (
+    COMPILED_SUFFIX,
+    MAPPED_SUFFIX,
+    CompiledPipeline,
+    InternedColumn,
+    TreeDistribution,
+    compiled_path_for,
+    load_compiled,
+    mapped_path_for,
+    matches_source,
+)
+from .config import CANARY_MAX_MEAN_ABS_DIFF_DB
 from .feature_mapping import FeatureVector
+from .metrics import BATCH_ROWS, STAGE_SECONDS
 
-# Ignore sklearn persistence warnings when minor patch versions differ.
-warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
+
+def synthetic_rows(model, n_rows: int = 1) -> List[Dict[str, Any]]:
+    """Rows with every numeric feature missing and every categorical unseen; valid input for any artifact."""
+    if isinstance(model, CompiledPipeline):
+        categorical = {enc.column for enc in model.categorical}
+    else:
+        pre = model.steps[0][1]
+        categorical = {c for name, _, cols in getattr(pre, "transformers_", ()) if name == "cat" for c in cols}
+    columns = list(getattr(model, "feature_names_in_", ()))
+    row = {col: ("UNKNOWN" if col in categorical else np.nan) for col in columns}
+    return [dict(row) for _ in range(n_rows)]
+
+
+def _load_pipeline(model_path: Path):
+    # joblib/sklearn are only imported when a pickled pipeline is actually used.
+    import joblib
+    from sklearn.exceptions import InconsistentVersionWarning
+
+    # Ignore sklearn persistence warnings when minor patch versions differ.
+    warnings.filterwarnings("ignore", category=InconsistentVersionWarning)
+    return joblib.load(model_path)
+
+
+def _pipeline_distribution(pipeline, frame, quantiles: Sequence[float]) -> TreeDistribution:
+    """Per-tree spread of a fitted sklearn pipeline; estimators without ``estimators_`` count as a single tree."""
+    final = pipeline.steps[-1][1]
+    estimators = getattr(final, "estimators_", None)
+    if estimators is None:
+        return TreeDistribution.from_trees(np.asarray(pipeline.predict(frame), dtype=float)[None, :], quantiles)
+    X = pipeline[:-1].transform(frame)
+    # converted once, as the forest's own predict does, instead of re-validated by every tree
+    X = X.astype(np.float32).tocsr() if hasattr(X, "tocsr") else np.ascontiguousarray(X, dtype=np.float32)
+    per_tree = np.stack([tree.predict(X, check_input=False) for tree in estimators])
+    return TreeDistribution.from_trees(per_tree, quantiles)
+
+
+class ModelValidationError(RuntimeError):
+    """Raised when a candidate artifact fails the canary check and is not swapped in."""
+
+
+@dataclass(frozen=True)
+class LoadedModel:
+    """One resident artifact; swapped as a whole so readers never see a half-updated model."""
+
+    model: Any
+    version: str
+    generation: int
+    path: Path
+    signature: Tuple[int, int]  # (mtime_ns, size) of the file that was read
+    loaded_at: float
+    load_seconds: float
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "generation": self.generation,
+            "artifact": self.path.name,
+            "loaded_at": datetime.fromtimestamp(self.loaded_at, timezone.utc).isoformat(),
+            "load_ms": round(self.load_seconds * 1000.0, 1),
+        }
+
+
+def _signature(path: Path) -> Tuple[int, int]:
+    # a mapped artifact is identified by its meta.json, which save_mapped writes last
+    stat = (path / "meta.json").stat() if path.is_dir() else path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        return _signature(path)
+    except FileNotFoundError:
+        return None
+
+
+# (artifact a reload would read, its signature, signature of the configured .joblib); None for what is missing
+DiskState = Tuple[Optional[Path], Optional[Tuple[int, int]], Optional[Tuple[int, int]]]
 
 
 class ModelStore:
-    """Loads and caches the trained scikit-learn pipelines for prediction."""
+    """Loads and caches the trained pipelines (compiled arrays or scikit-learn) for prediction.
+
+    Each technology has an active ``LoadedModel`` and, after a reload, the previous one kept resident for
+    rollback.  Predictions read the active entry once per call, so a swap never blocks or splits a request.
+    """
 
-    def __init__(self, digital_path: Path, fm_path: Path):
+    def __init__(
+        self,
+        digital_path: Path,
+        fm_path: Path,
+        backend: str = "auto",
+        canary_size: int = 64,
+        canary_max_mean_abs_diff: float = CANARY_MAX_MEAN_ABS_DIFF_DB,
+    ):
         self._paths: Dict[str, Path] = {
             "digital": digital_path,
             "fm": fm_path,
         }
-        self._models: Dict[str, any] = {}
-        self._versions: Dict[str, str] = {}
+        self._backend = backend
+        self._active: Dict[str, LoadedModel] = {}
+        self._previous: Dict[str, LoadedModel] = {}
+        self._generations: Dict[str, int] = {}
+        # last seen state of each configured artifact; explicit sibling loads and rollbacks leave it alone
+        self._observed: Dict[str, DiskState] = {}
+        self._lock = threading.RLock()  # serialises loads and swaps; predictions never take it
+        self._canary: Dict[str, deque] = {tech: deque(maxlen=max(0, canary_size)) for tech in self._paths}
+        self._canary_max_mean_abs_diff = canary_max_mean_abs_diff
 
-    def _load(self, technology: str):
+    def _artifact_path(self, model_path: Path) -> Path:
+        # preference: memory-mapped directory (shared across workers), then .npz, then the pickled pipeline;
+        # a compiled artifact built from another .joblib than the one now at model_path is skipped
+        mapped_path, compiled_path = mapped_path_for(model_path), compiled_path_for(model_path)
+        if self._backend != "sklearn":
+            if (mapped_path / "meta.json").exists() and matches_source(mapped_path, model_path):
+                return mapped_path
+            if compiled_path.exists() and matches_source(compiled_path, model_path):
+                return compiled_path
+        if self._backend == "compiled":
+            raise FileNotFoundError(
+                f"Compiled model artifact missing or not built from {model_path.name}: {compiled_path}"
+            )
+        if not model_path.exists():
+            raise FileNotFoundError(f"Model artifact missing: {model_path}")
+        return model_path
+
+    def _read(self, technology: str, model_path: Path) -> LoadedModel:
+        artifact = self._artifact_path(model_path)
+        signature = _signature(artifact)
+        started = time.perf_counter()
+        if artifact.suffix in (COMPILED_SUFFIX, MAPPED_SUFFIX):
+            model = load_compiled(artifact)
+        else:
+            model = _load_pipeline(artifact)
+        with self._lock:
+            generation = self._generations.get(technology, 0) + 1
+            self._generations[technology] = generation
+            if model_path == self._paths[technology]:
+                self._observed[technology] = (artifact, signature, _file_signature(model_path))
+        return LoadedModel(
+            model=model,
+            version=model_path.stem,
+            generation=generation,
+            path=artifact,
+            signature=signature,
+            loaded_at=time.time(),
+            load_seconds=time.perf_counter() - started,
+        )
+
+    def _technology_path(self, technology: str) -> Path:
         if technology not in self._paths:
             raise KeyError(f"Unsupported technology: {technology}")
-        if technology not in self._models:
-            model_path = self._paths[technology]
-            if not model_path.exists():
-                raise FileNotFoundError(f"Model artifact missing: {model_path}")
-            self._models[technology] = joblib.load(model_path)
-            self._versions[technology] = model_path.stem
-        return self._models[technology]
+        return self._paths[technology]
 
-    def predict(self, vector: FeatureVector) -> Tuple[float, str]:
-        model = self._load(vector.technology)
-        row = dict(vector.features)
+    def _load(self, technology: str) -> LoadedModel:
+        entry = self._active.get(technology)
+        if entry is None:
+            model_path = self._technology_path(technology)
+            with self._lock:
+                entry = self._active.get(technology)
+                if entry is None:
+                    entry = self._active[technology] = self._read(technology, model_path)
+        return entry
+
+    def resolve_artifact(self, technology: str, name: Optional[str] = None) -> Path:
+        """The configured artifact, or a sibling file (e.g. a versioned ``best_fm_model-<stamp>.joblib``) by name."""
+        configured = self._technology_path(technology)
+        if not name:
+            return configured
+        candidate = configured.parent / Path(name).name
+        if candidate.suffix not in (".joblib", COMPILED_SUFFIX, MAPPED_SUFFIX):
+            raise FileNotFoundError(f"Not a model artifact: {name}")
+        return candidate.with_suffix(".joblib")
+
+    def validate(self, technology: str, candidate: LoadedModel) -> Dict[str, Any]:
+        """Scores the canary rows (recent requests, or synthetic rows when none were seen yet) with the candidate.
+
+        Rejects non-finite output and, when ``canary_max_mean_abs_diff`` > 0, a mean shift from the active model
+        larger than that many dBµV/m.
+        """
+        rows = list(self._canary[technology])
+        source = "recent"
+        if not rows:
+            rows, source = synthetic_rows(candidate.model), "synthetic"
+        try:
+            predicted = np.asarray(candidate.model.predict(self._frame(candidate.model, rows)), dtype=float)
+        except Exception as exc:
+            raise ModelValidationError(f"{candidate.path.name} failed on canary rows: {exc}") from exc
+        if not np.all(np.isfinite(predicted)):
+            raise ModelValidationError(f"{candidate.path.name} produced non-finite canary predictions")
+        report: Dict[str, Any] = {"rows": len(rows), "source": source, "mean_abs_diff": None, "max_abs_diff": None}
+        active = self._active.get(technology)
+        if active is not None:
+            current = np.asarray(active.model.predict(self._frame(active.model, rows)), dtype=float)
+            diff = np.abs(predicted - current)
+            report["mean_abs_diff"], report["max_abs_diff"] = float(diff.mean()), float(diff.max())
+            limit = self._canary_max_mean_abs_diff
+            if limit > 0 and report["mean_abs_diff"] > limit:
+                raise ModelValidationError(
+                    f"{candidate.path.name} shifts canary predictions by {report['mean_abs_diff']:.2f} dB on average "
+                    f"(limit {limit:.2f})"
+                )
+        return report
+
+    def reload(self, technology: str, artifact: Optional[Path] = None) -> Tuple[LoadedModel, Dict[str, Any]]:
+        """Loads and validates a new artifact, then swaps it in; the replaced model stays resident for rollback.
+
+        In-flight predictions keep the entry they already hold.  Raises ``ModelValidationError`` (nothing swapped)
+        when the candidate fails the canary check.
+        """
+        model_path = artifact or self._technology_path(technology)
+        with self._lock:
+            try:
+                candidate = self._read(technology, model_path)
+            except FileNotFoundError:
+                raise
+            except Exception as exc:
+                raise ModelValidationError(f"{model_path.stem} could not be loaded: {exc}") from exc
+            report = self.validate(technology, candidate)
+            previous = self._active.get(technology)
+            self._active[technology] = candidate
+            if previous is not None:
+                self._previous[technology] = previous
+        return candidate, report
+
+    def rollback(self, technology: str) -> LoadedModel:
+        """Swaps the previous model back in (the replaced one becomes the new rollback target)."""
+        self._technology_path(technology)
+        with self._lock:
+            previous = self._previous.get(technology)
+            if previous is None:
+                raise LookupError(f"No previous {technology} model to roll back to")
+            self._previous[technology] = self._active[technology]
+            self._active[technology] = previous
+        return previous
+
+    def disk_signature(self, technology: str) -> DiskState:
+        """The artifact a reload would read now and its (mtime_ns, size), plus the configured .joblib's.
+
+        Both are watched: a new .joblib next to an older compiled artifact changes which file is read.
+        """
+        model_path = self._technology_path(technology)
+        try:
+            artifact = self._artifact_path(model_path)
+            return artifact, _signature(artifact), _file_signature(model_path)
+        except FileNotFoundError:
+            return None, None, _file_signature(model_path)
+
+    def changed_on_disk(self, technology: str) -> bool:
+        """True when the configured artifact changed since it was last read; False if never read or all missing."""
+        observed, current = self._observed.get(technology), self.disk_signature(technology)
+        return observed is not None and any(current) and current != observed
+
+    def describe(self) -> Dict[str, Any]:
+        """Active and previous model per technology, without triggering any load."""
+        out: Dict[str, Any] = {}
+        for technology in self._paths:
+            active, previous = self._active.get(technology), self._previous.get(technology)
+            out[technology] = {
+                "active": active.describe() if active else None,
+                "previous": previous.describe() if previous else None,
+            }
+        return out
+
+    def warm_up(self, technology: str, n_rows: int = 256) -> Dict[str, Any]:
+        """Loads the active model and runs a single-row and an ``n_rows`` synthetic prediction through it.
+
+        Pays deserialisation and first-call costs up front; synthetic rows never enter the canary buffer.
+        """
+        entry = self._load(technology)
+        started = time.perf_counter()
+        for rows in (synthetic_rows(entry.model, 1), synthetic_rows(entry.model, max(1, n_rows))):
+            entry.model.predict(self._frame(entry.model, rows))
+        return {
+            "version": entry.version,
+            "load_ms": round(entry.load_seconds * 1000.0, 1),
+            "warmup_ms": round((time.perf_counter() - started) * 1000.0, 1),
+        }
+
+    def replay(self, technology: str, rows: Sequence[Mapping[str, Any]]) -> np.ndarray:
+        """Scores feature rows with the active model without recording them as traffic (no metrics, no canary)."""
+        entry = self._load(technology)
+        return np.asarray(entry.model.predict(self._frame(entry.model, rows)), dtype=float)
+
+    def model_token(self, technology: str) -> Tuple[str, int]:
+        """Identifies the loaded artifact: version plus how many times it has been (re)loaded."""
+        entry = self._load(technology)
+        return entry.version, entry.generation
+
+    @staticmethod
+    def _frame(model, rows: Sequence[Mapping[str, Any]]):
         expected = getattr(model, "feature_names_in_", None)
-        if expected is not None:
-            for col in expected:
-                if col not in row:
-                    row[col] = 0
-            payload = pd.DataFrame([[row[col] for col in expected]], columns=list(expected))
+        if isinstance(model, CompiledPipeline) and expected is not None:
+            # the compiled engine reads plain column sequences (scalars for one row); no DataFrame (nor pandas) needed
+            if len(rows) == 1:
+                return {col: rows[0].get(col, 0) for col in expected}
+            return {col: [row.get(col, 0) for row in rows] for col in expected}
+        import pandas as pd
+
+        if expected is None:
+            return pd.DataFrame(list(rows))
+        columns = list(expected)
+        return pd.DataFrame([[row.get(col, 0) for col in columns] for row in rows], columns=columns)
+
+    def predict(self, vector: FeatureVector) -> Tuple[float, str]:
+        values, version = self.predict_batch(vector.technology, [vector.features])
+        return float(values[0]), version
+
+    def predict_batch(self, technology: str, rows: Sequence[Mapping[str, Any]]) -> Tuple[np.ndarray, str]:
+        """Scores many feature rows of one technology with a single pipeline call."""
+        entry = self._load(technology)
+        if not rows:
+            return np.empty(0, dtype=float), entry.version
+        start = time.perf_counter()
+        frame = self._frame(entry.model, rows)
+        STAGE_SECONDS.since(start, "build_frame", technology)
+        start = time.perf_counter()
+        predictions = entry.model.predict(frame)
+        STAGE_SECONDS.since(start, "model_predict", technology)
+        BATCH_ROWS.observe(len(rows), technology)
+        canary = self._canary[technology]
+        if canary.maxlen:
+            canary.extend(rows[-canary.maxlen:])
+        return np.asarray(predictions, dtype=float), entry.version
+
+    def predict_columns(
+        self, technology: str, columns: Mapping[str, Any], canary_rows: Sequence[Mapping[str, Any]] = ()
+    ) -> Tuple[np.ndarray, str]:
+        """Scores column-oriented input; scalar columns are broadcast to every row.
+
+        Categorical columns may be passed as ``InternedColumn`` so each distinct value is encoded once.
+        ``canary_rows`` are the same rows as feature dicts, for callers whose rows are real traffic.
+        """
+        entry = self._load(technology)
+        frame = self._column_frame(technology, entry.model, columns)
+        start = time.perf_counter()
+        predictions = np.asarray(entry.model.predict(frame), dtype=float)
+        STAGE_SECONDS.since(start, "model_predict", technology)
+        self._observe(technology, len(predictions), canary_rows)
+        return predictions, entry.version
+
+    def predict_distribution(
+        self,
+        technology: str,
+        columns: Mapping[str, Any],
+        quantiles: Sequence[float] = (),
+        canary_rows: Sequence[Mapping[str, Any]] = (),
+    ) -> Tuple[TreeDistribution, str]:
+        """Like ``predict_columns``, but returns the mean, spread and ``quantiles`` of the individual trees.
+
+        Every tree is evaluated once; the mean is the point prediction ``predict_columns`` would return.
+        """
+        entry = self._load(technology)
+        frame = self._column_frame(technology, entry.model, columns)
+        start = time.perf_counter()
+        if isinstance(entry.model, CompiledPipeline):
+            distribution = entry.model.predict_distribution(frame, quantiles)
+        else:
+            distribution = _pipeline_distribution(entry.model, frame, quantiles)
+        STAGE_SECONDS.since(start, "model_predict", technology)
+        self._observe(technology, len(distribution), canary_rows)
+        return distribution, entry.version
+
+    @staticmethod
+    def _column_frame(technology: str, model, columns: Mapping[str, Any]):
+        expected = list(getattr(model, "feature_names_in_", columns.keys()))
+        start = time.perf_counter()
+        aligned = {col: columns.get(col, 0) for col in expected}
+        if isinstance(model, CompiledPipeline):
+            frame = aligned
         else:
-            payload = pd.DataFrame([row])
-        prediction = model.predict(payload)[0]
-        return float(prediction), self._versions[vector.technology]
+            import pandas as pd
+
+            frame = pd.DataFrame(
+                {col: v.materialize() if isinstance(v, InternedColumn) else v for col, v in aligned.items()},
+                columns=expected,
+            )
+        STAGE_SECONDS.since(start, "build_frame", technology)
+        return frame
+
+    def _observe(self, technology: str, n_rows: int, canary_rows: Sequence[Mapping[str, Any]]) -> None:
+        BATCH_ROWS.observe(n_rows, technology)
+        canary = self._canary[technology]
+        if canary.maxlen and canary_rows:
+            canary.extend(canary_rows[-canary.maxlen:])
 
     def get_version(self, technology: str) -> str:
-        self._load(technology)
-        return self._versions.get(technology, "unknown")
+        return self._load(technology).version
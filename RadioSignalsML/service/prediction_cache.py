@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+
+class PredictionCache:
+    """Bounded in-process LRU cache of predictions with per-entry TTL.
+
+    Keys are content-addressed: the technology, the model token (version plus load
+    generation, so a reloaded artifact never serves stale values) and the canonical
+    feature items with floats rounded to ``float_precision`` decimals.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        float_precision: int,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl_seconds = float(ttl_seconds)
+        self.float_precision = int(float_precision)
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def key(self, technology: str, features: Mapping[str, Any], model_token: Hashable) -> Hashable:
+        items = []
+        for name in sorted(features):
+            value = features[name]
+            if isinstance(value, float):
+                value = round(value, self.float_precision) + 0.0  # fold -0.0 into 0.0
+            items.append((name, value))
+        return technology, model_token, tuple(items)
+
+    def get(self, key: Hashable) -> Optional[float]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at and self._clock() >= expires_at:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, value: float) -> None:
+        if not self.enabled:
+            return
+        expires_at = self._clock() + self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, technology: Optional[str] = None) -> int:
+        """Drops every entry (or only those of one technology); returns how many were removed."""
+        with self._lock:
+            if technology is None:
+                stale = list(self._entries)
+            else:
+                stale = [key for key in self._entries if key[0] == technology]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "float_precision": self.float_precision,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
@@ -0,0 +1,295 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .batch_features import BatchFeatureMapper
+from .config import ServiceConfig
+from .location_lookup import SettlementIndex, load_location_lookup
+from .model_store import ModelStore
+
+# directory of keys.npy / values.npy + meta.json next to the model artifact it was scored with
+TABLE_SUFFIX = ".table"
+TABLE_FORMAT = 1
+# rows kept with their values, re-scored by the serving model before it trusts a table
+_PROBES = 16
+_TECHNOLOGIES = {"digital": "DIGITAL_TV", "fm": "FM"}
+# training column, /predict field and type of each technology's channel/frequency
+_CHANNELS = {"digital": ("tv_channel", "channel_number", int), "fm": ("fm_freq_mhz", "frequency_mhz", float)}
+
+
+def table_path_for(model_path: Path) -> Path:
+    model_path = Path(model_path)
+    return model_path.parent / f"{model_path.stem}{TABLE_SUFFIX}"
+
+
+def feature_key(technology: str, features: Mapping[str, Any], float_precision: int) -> Tuple[int, int]:
+    """128-bit hash of the canonical feature items, as two unsigned 64-bit halves; the first is never 0.
+
+    Numbers are rounded to ``float_precision`` decimals like prediction-cache keys, and ints and floats hash
+    alike, so a row hashes the same whether it was mapped from one payload or from a batch.
+    """
+    parts = [technology]
+    for name in sorted(features):
+        value = features[name]
+        if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+            value = round(float(value), float_precision) + 0.0  # fold -0.0 into 0.0
+        elif isinstance(value, str):
+            value = str(value)  # numpy string scalars repr differently
+        parts.append(f"{name}={value!r}")
+    digest = hashlib.blake2b("\x1f".join(parts).encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little") or 1, int.from_bytes(digest[8:], "little")
+
+
+class PredictionTable:
+    """Precomputed predictions of one model, keyed by ``feature_key`` in an open-addressing hash table.
+
+    ``keys`` holds the two key halves per slot (first half 0 = empty slot) and ``values`` the prediction; slots
+    are probed linearly from the key's low bits and the table is at most half full, so a lookup reads about two
+    slots whether or not the row is present.  Both arrays are memory-mapped when opened from disk.
+    """
+
+    def __init__(self, keys: np.ndarray, values: np.ndarray, meta: Mapping[str, Any]):
+        self.keys = keys
+        self.values = values
+        self.meta = dict(meta)
+        self.technology: str = self.meta["technology"]
+        self.model_version: str = self.meta["model_version"]
+        self.float_precision = int(self.meta["float_precision"])
+        self._mask = len(values) - 1
+
+    def __len__(self) -> int:
+        return int(self.meta["rows"])
+
+    def get(self, features: Mapping[str, Any]) -> Optional[float]:
+        high, low = feature_key(self.technology, features, self.float_precision)
+        keys, mask = self.keys, self._mask
+        slot = high & mask
+        while True:
+            stored = int(keys[slot, 0])
+            if stored == 0:
+                return None
+            if stored == high and int(keys[slot, 1]) == low:
+                return float(self.values[slot])
+            slot = (slot + 1) & mask
+
+    @property
+    def probes(self) -> List[Dict[str, Any]]:
+        return [probe["features"] for probe in self.meta["probes"]]
+
+    @property
+    def probe_values(self) -> np.ndarray:
+        return np.asarray([probe["value"] for probe in self.meta["probes"]], dtype=float)
+
+    @classmethod
+    def build(
+        cls,
+        technology: str,
+        rows: Sequence[Mapping[str, Any]],
+        values: Sequence[float],
+        float_precision: int,
+        **meta: Any,
+    ) -> "PredictionTable":
+        """Hashes ``rows`` (feature dicts) with their predictions; rows whose key repeats keep the first value."""
+        capacity = 8
+        while capacity < 2 * len(rows):
+            capacity *= 2
+        keys = np.zeros((capacity, 2), dtype=np.uint64)
+        slots = np.full(capacity, np.nan)
+        mask, stored = capacity - 1, 0
+        for features, value in zip(rows, values):
+            high, low = feature_key(technology, features, float_precision)
+            slot = high & mask
+            while keys[slot, 0] != 0 and (int(keys[slot, 0]), int(keys[slot, 1])) != (high, low):
+                slot = (slot + 1) & mask
+            if keys[slot, 0] == 0:
+                keys[slot] = (high, low)
+                slots[slot] = value
+                stored += 1
+        picks = np.unique(np.linspace(0, len(rows) - 1, min(_PROBES, len(rows))).astype(int)) if rows else []
+        probes = [{"features": dict(rows[i]), "value": float(values[i])} for i in picks]
+        meta.update(
+            format=TABLE_FORMAT,
+            technology=technology,
+            float_precision=int(float_precision),
+            rows=stored,
+            duplicates=len(rows) - stored,
+            capacity=capacity,
+            probes=probes,
+        )
+        return cls(keys, slots, meta)
+
+    def save(self, path: Path) -> Path:
+        """Writes the directory format and swaps it in place of any existing one; ``meta.json`` is written last."""
+        path = Path(path)
+        staging = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+        shutil.rmtree(staging, ignore_errors=True)
+        staging.mkdir(parents=True)
+        np.save(staging / "keys.npy", np.ascontiguousarray(self.keys), allow_pickle=False)
+        np.save(staging / "values.npy", np.ascontiguousarray(self.values), allow_pickle=False)
+        (staging / "meta.json").write_text(json.dumps(self.meta, ensure_ascii=False), encoding="utf-8")
+        retired = path.with_name(f".{path.name}.old-{os.getpid()}")
+        if path.exists():
+            os.replace(path, retired)
+        os.replace(staging, path)
+        shutil.rmtree(retired, ignore_errors=True)
+        return path
+
+    @classmethod
+    def open(cls, path: Path) -> Optional["PredictionTable"]:
+        """Maps a saved table read-only; ``None`` when there is none at ``path``."""
+        path = Path(path)
+        meta_path = path / "meta.json"
+        if not meta_path.exists():
+            return None
+        meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        if meta.get("format") != TABLE_FORMAT:
+            raise ValueError(f"{path.name} has table format {meta.get('format')}, expected {TABLE_FORMAT}")
+        keys = np.load(path / "keys.npy", mmap_mode="r", allow_pickle=False)
+        values = np.load(path / "values.npy", mmap_mode="r", allow_pickle=False)
+        return cls(keys, values, meta)
+
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "rows": len(self),
+            "model_version": self.model_version,
+            "year": self.meta.get("year"),
+            "month": self.meta.get("month"),
+            "built_at": self.meta.get("built_at"),
+        }
+
+
+def _text(value: Any) -> Optional[str]:
+    return None if value is None or value != value else str(value)
+
+
+def training_combinations(excel_path: Path, cache_dir: Optional[str] = ".cache") -> Dict[str, List[Dict[str, Any]]]:
+    """Distinct channel/frequency + program + emitter of the rows each model was trained on, as /predict fields."""
+    from train_signal_models import load_cleaned, prepare_subset  # training module; only this job needs it here
+
+    data = load_cleaned(str(excel_path), cache_dir)
+    out: Dict[str, List[Dict[str, Any]]] = {}
+    for technology, (column, field, kind) in _CHANNELS.items():
+        subset = prepare_subset(data, technology)[[column, "program_id", "emitter"]].drop_duplicates()
+        out[technology] = [
+            {field: kind(channel), "program_identifier": _text(program), "transmitter_location": _text(emitter)}
+            for channel, program, emitter in subset.itertuples(index=False)
+        ]
+    return out
+
+
+def settlement_payloads(
+    lookup: Mapping[str, Mapping[str, Any]],
+    technology: str,
+    combinations: Sequence[Mapping[str, Any]],
+    year: int,
+    month: int,
+) -> List[Dict[str, Any]]:
+    """A /predict body for every lookup settlement with a full site (coordinates and elevation) x combination."""
+    date = datetime(year, month, 1).isoformat()
+    payloads = []
+    for registry, entry in lookup.items():
+        if any(entry.get(name) is None for name in ("latitude", "longitude", "elevation_m")):
+            continue
+        site = {
+            "technology": _TECHNOLOGIES[technology],
+            "date": date,
+            "registry_number": registry,
+            "latitude": entry["latitude"],
+            "longitude": entry["longitude"],
+            "elevation_m": entry["elevation_m"],
+            "population": entry.get("population") or 0,
+            "households": entry.get("households") or 0,
+        }
+        payloads.extend({**site, **combination} for combination in combinations)
+    return payloads
+
+
+def materialize(
+    config: ServiceConfig,
+    combinations: Mapping[str, Sequence[Mapping[str, Any]]],
+    year: int,
+    month: int,
+) -> Dict[str, Any]:
+    """Scores every settlement x combination with the configured models and saves a table next to each artifact.
+
+    Rows are mapped and scored the way ``/predict/batch`` does it, on the backend the service is configured with,
+    so the table holds the values live inference would return.  A technology without a model is reported, not
+    built.
+    """
+    lookup = load_location_lookup(config.location_lookup_path)
+    mapper = BatchFeatureMapper(lookup, SettlementIndex.from_lookup(lookup, config.settlement_max_distance_km))
+    models = ModelStore(config.digital_model_path, config.fm_model_path, config.model_backend)
+    summary: Dict[str, Any] = {"year": year, "month": month}
+    for technology, combos in combinations.items():
+        started = time.perf_counter()
+        try:
+            version, _ = models.model_token(technology)
+        except FileNotFoundError as exc:
+            summary[technology] = {"error": str(exc)}
+            continue
+        payloads = settlement_payloads(lookup, technology, combos, year, month)
+        mapped = mapper.map(payloads)
+        batch = mapped.groups.get(technology)
+        rows = batch.rows() if batch is not None else []
+        values = models.predict_columns(technology, batch.columns)[0] if batch is not None else np.empty(0)
+        table = PredictionTable.build(
+            technology,
+            rows,
+            values.tolist(),
+            config.cache_float_precision,
+            model_version=version,
+            year=year,
+            month=month,
+            settlements=len(payloads) // len(combos) if combos else 0,
+            combinations=len(combos),
+            built_at=datetime.now(timezone.utc).isoformat(),
+        )
+        path = table.save(table_path_for(models.resolve_artifact(technology)))
+        summary[technology] = {
+            "path": str(path),
+            "model_version": version,
+            "settlements": table.meta["settlements"],
+            "combinations": len(combos),
+            "rows": len(table),
+            "duplicates": table.meta["duplicates"],
+            "unmapped": len(mapped.errors),
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    today = datetime.now(timezone.utc)
+    ap = argparse.ArgumentParser(
+        prog="python -m service.prediction_table",
+        description="Precompute predictions for every lookup settlement x trained channel/frequency, program and "
+        "emitter for one month, stored next to each model artifact for lookup by /predict.",
+    )
+    ap.add_argument("--data", type=Path, default=Path("signal_data.xlsx"), help="Workbook the models were trained on")
+    ap.add_argument("--cache-dir", type=str, default=".cache", help="Cleaned-data cache shared with training")
+    ap.add_argument("--year", type=int, default=today.year)
+    ap.add_argument("--month", type=int, default=today.month)
+    ap.add_argument("--technology", choices=sorted(_TECHNOLOGIES), action="append", help="Default: both")
+    args = ap.parse_args(argv)
+
+    combinations = training_combinations(args.data, args.cache_dir)
+    if args.technology:
+        combinations = {tech: combinations[tech] for tech in args.technology}
+    summary = materialize(ServiceConfig.from_env(), combinations, args.year, args.month)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0 if all("error" not in summary[tech] for tech in combinations) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,11 +1,61 @@
 ﻿from __future__ import annotations
 
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
 
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .batch_features import BatchFeatureMapper
+from .compiled_model import COMPACT_TOLERANCE, InternedColumn
 from .config import ServiceConfig
-from .feature_mapping import FeatureMappingError, FeatureVector, build_feature_vector
-from .location_lookup import load_location_lookup
-from .model_store import ModelStore
+from .feature_mapping import (
+    FeatureMappingError,
+    FeatureVector,
+    build_emission_features,
+    build_feature_vector,
+)
+from .location_lookup import SettlementIndex, load_location_lookup
+from .metrics import STAGE_SECONDS, TABLE_LOOKUPS
+from .model_store import ModelStore, ModelValidationError
+from .prediction_cache import PredictionCache
+from .prediction_table import PredictionTable, table_path_for
+
+
+logger = logging.getLogger(__name__)
+
+
+def uncertainty_columns(quantiles: Sequence[float]) -> List[str]:
+    """Output columns of columnar scoring with quantiles: the trees' standard deviation and one per quantile."""
+    return ["field_dbuv_m_std", *(f"field_dbuv_m_q{q:g}" for q in quantiles)]
+
+
+@dataclass(frozen=True)
+class CoverageGrid:
+    """Dense field-strength raster; row 0 is the northern edge, column 0 the western edge."""
+
+    technology: str
+    values: np.ndarray
+    south: float
+    west: float
+    north: float
+    east: float
+    model_version: str
+
+
+def _scatter_features(out: Dict[str, Any], columns: Mapping[str, Any], positions: np.ndarray, n_rows: int) -> None:
+    # numeric features into NaN-filled arrays; categoricals as (vocabulary list, codes) with -1 for absent rows,
+    # vocabularies of several technologies appended one after the other
+    for name, column in columns.items():
+        if isinstance(column, InternedColumn):
+            vocabulary, codes = out.setdefault(name, ([], np.full(n_rows, -1, dtype=np.int32)))
+            codes[positions] = column.codes + len(vocabulary)
+            vocabulary.extend(column.vocabulary.tolist())
+        else:
+            out.setdefault(name, np.full(n_rows, np.nan))[positions] = column
 
 
 class SignalPredictorService:
@@ -14,20 +64,364 @@ class SignalPredictorService:
     def __init__(self, config: ServiceConfig):
         self._config = config
         self._lookup = load_location_lookup(config.location_lookup_path)
-        self._models = ModelStore(config.digital_model_path, config.fm_model_path)
+        self._settlements = SettlementIndex.from_lookup(self._lookup, config.settlement_max_distance_km)
+        self._mapper = BatchFeatureMapper(self._lookup, self._settlements)
+        self._models = ModelStore(
+            config.digital_model_path,
+            config.fm_model_path,
+            config.model_backend,
+            canary_size=config.canary_size,
+            canary_max_mean_abs_diff=config.canary_max_mean_abs_diff,
+        )
+        self._readiness: Dict[str, Any] = {"ready": False, "models": {}}
+        self._watcher: Optional[threading.Thread] = None
+        self._watching = threading.Event()
+        self._cache = PredictionCache(
+            config.cache_max_entries, config.cache_ttl_seconds, config.cache_float_precision
+        )
+        # technology -> (model token, its precomputed table or None), refreshed when the model token changes
+        self._tables: Dict[str, Tuple[Tuple[str, int], Optional[PredictionTable]]] = {}
+        self._tables_lock = threading.Lock()
+
+    def predict(self, payload: Dict[str, Any], quantiles: Optional[Sequence[float]] = None) -> Dict[str, Any]:
+        """Scores one payload; with ``quantiles`` (possibly empty) the result also carries the trees' spread."""
+        if quantiles is not None:
+            outcome = self.predict_many([payload], quantiles)[0]
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+        start = time.perf_counter()
+        vector = build_feature_vector(payload, self._lookup, self._settlements)
+        STAGE_SECONDS.since(start, "map_features", vector.technology)
+        version, generation = self._models.model_token(vector.technology)
+        table = self._table(vector.technology, (version, generation))
+        if table is not None:
+            value = table.get(vector.features)
+            TABLE_LOOKUPS.inc(vector.technology, "miss" if value is None else "hit")
+            if value is not None:
+                return self._result(vector, value, version)
+        key = self._cache.key(vector.technology, vector.features, (version, generation))
+        value = self._cache.get(key)
+        if value is None:
+            value, version = self._models.predict(vector)
+            self._cache_if_current(vector.technology, (version, generation), key, value)
+        return self._result(vector, value, version)
+
+    def _table(self, technology: str, token: Tuple[str, int]) -> Optional[PredictionTable]:
+        """The precomputed table of the model ``token`` names; opened and checked once per loaded model."""
+        current = self._tables.get(technology)
+        if current is not None and current[0] == token:
+            return current[1]
+        if not self._config.table_enabled:
+            return None
+        with self._tables_lock:
+            current = self._tables.get(technology)
+            if current is None or current[0] != token:
+                current = self._tables[technology] = (token, self._open_table(technology, token[0]))
+        return current[1]
+
+    def _open_table(self, technology: str, version: str) -> Optional[PredictionTable]:
+        # a table is trusted only if the serving model reproduces the values it stored for its probe rows
+        path = table_path_for(self._models.resolve_artifact(technology, f"{version}.joblib"))
+        try:
+            table = PredictionTable.open(path)
+            if table is None:
+                return None
+            if table.model_version != version:
+                raise ValueError(f"built for model {table.model_version}")
+            drift = np.abs(self._models.replay(technology, table.probes) - table.probe_values)
+            if drift.size and float(drift.max()) > COMPACT_TOLERANCE:
+                raise ValueError(f"built with a different model (probe rows differ by up to {drift.max():.3g} dB)")
+        except (OSError, ValueError, KeyError) as exc:
+            logger.warning("ignoring prediction table %s: %s", path.name, exc)
+            return None
+        logger.info("serving %d precomputed %s predictions from %s", len(table), technology, path.name)
+        return table
+
+    def _cache_if_current(self, technology: str, token: Tuple[str, int], key: Any, value: float) -> None:
+        # a model swapped in mid-request must not have its output filed under the replaced model's token
+        if self._models.model_token(technology) == token:
+            self._cache.put(key, value)
+
+    def reload_model(self, technology: str, artifact: Optional[str] = None) -> Dict[str, Any]:
+        """Loads, canary-checks and swaps in an artifact (the configured one, or a sibling file by name).
+
+        Raises ``ModelValidationError`` and keeps serving the current model when the candidate is rejected.
+        """
+        previous = self._models.describe()[technology]["active"]
+        entry, canary = self._models.reload(technology, self._models.resolve_artifact(technology, artifact))
+        self._cache.invalidate(technology)
+        return {"technology": technology, "active": entry.describe(), "previous": previous, "canary": canary}
+
+    def rollback_model(self, technology: str) -> Dict[str, Any]:
+        """Swaps the previously active model back in; raises ``LookupError`` when there is none."""
+        replaced = self._models.describe()[technology]["active"]
+        entry = self._models.rollback(technology)
+        self._cache.invalidate(technology)
+        return {"technology": technology, "active": entry.describe(), "previous": replaced, "canary": None}
+
+    def warm_up(self, n_rows: int) -> Dict[str, Any]:
+        """Loads every model and runs synthetic predictions through it, then marks the service ready.
+
+        A technology whose artifact is missing or broken is reported as unavailable rather than blocking readiness.
+        """
+        models: Dict[str, Any] = {}
+        self._settlements.warm_up()
+        for technology in ("digital", "fm"):
+            try:
+                models[technology] = {"status": "ready", **self._models.warm_up(technology, n_rows)}
+                table = self._table(technology, self._models.model_token(technology))
+                models[technology]["table"] = None if table is None else table.describe()
+            except Exception as exc:
+                logger.warning("warm-up of %s model failed: %s", technology, exc)
+                models[technology] = {"status": "unavailable", "error": str(exc)}
+        self._readiness = {"ready": True, "models": models}
+        return self._readiness
+
+    def mark_ready(self) -> None:
+        self._readiness = {"ready": True, "models": self._readiness["models"]}
+
+    def readiness(self) -> Dict[str, Any]:
+        return self._readiness
+
+    def model_status(self) -> Dict[str, Any]:
+        return self._models.describe()
+
+    def start_watcher(self, interval_seconds: float) -> None:
+        """Polls the configured artifacts and hot-reloads a technology once its file has changed and settled."""
+        if interval_seconds <= 0 or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(
+            target=self._watch, args=(interval_seconds,), name="model-artifact-watcher", daemon=True
+        )
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._watching.set()
+
+    def _watch(self, interval_seconds: float) -> None:
+        pending: Dict[str, Any] = {}
+        while not self._watching.wait(interval_seconds):
+            for technology in ("digital", "fm"):
+                if not self._models.changed_on_disk(technology):
+                    pending.pop(technology, None)
+                    continue
+                # reload only when two polls agree, so a half-published artifact pair is never picked up
+                current = self._models.disk_signature(technology)
+                if pending.get(technology) != current:
+                    pending[technology] = current
+                    continue
+                pending.pop(technology, None)
+                try:
+                    outcome = self.reload_model(technology)
+                    logger.info("hot-reloaded %s model: %s", technology, outcome["active"])
+                except (ModelValidationError, FileNotFoundError) as exc:
+                    logger.warning("rejected new %s model: %s", technology, exc)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return self._cache.stats()
+
+    def predict_batch(
+        self, payloads: Sequence[Dict[str, Any]], quantiles: Optional[Sequence[float]] = None
+    ) -> List[Dict[str, Any]]:
+        """Scores mixed-technology payloads with one pipeline call per technology.
+
+        Results keep the input order; rows that cannot be mapped (or whose model
+        artifact is missing) carry an ``error`` message instead of a prediction.
+        """
+        return [
+            {"index": index, "error": str(outcome)} if isinstance(outcome, Exception) else {"index": index, **outcome}
+            for index, outcome in enumerate(self.predict_many(payloads, quantiles))
+        ]
+
+    def predict_many(
+        self, payloads: Sequence[Dict[str, Any]], quantiles: Optional[Sequence[float]] = None
+    ) -> List[Any]:
+        """Like ``predict_batch`` but each failed row carries its exception, so callers can map error types.
+
+        With ``quantiles`` every row also gets an ``uncertainty`` entry from the same single pass over the trees;
+        such rows need every tree's output, so they skip the precomputed table and the prediction cache.
+        """
+        results: List[Any] = [None] * len(payloads)
+        start = time.perf_counter()
+        # one columnar pass per technology; the model reads the column arrays, feature dicts are built only
+        # for cache keys and the response
+        mapped = self._mapper.map(payloads)
+        elapsed = time.perf_counter() - start
+        for index, exc in mapped.errors.items():
+            results[index] = exc
+
+        for technology, batch in mapped.groups.items():
+            STAGE_SECONDS.observe(elapsed, "map_features", technology)
+            positions = batch.positions.tolist()
+            try:
+                token = self._models.model_token(technology)
+            except FileNotFoundError as exc:
+                for index in positions:
+                    results[index] = exc
+                continue
+            vectors = [FeatureVector(technology, features) for features in batch.rows()]
+            if quantiles is not None:
+                distribution, version = self._models.predict_distribution(
+                    technology, batch.columns, quantiles, canary_rows=[vector.features for vector in vectors]
+                )
+                for index, vector, spread in zip(positions, vectors, distribution.rows()):
+                    results[index] = self._result(vector, spread["mean"], version, spread)
+                continue
+            table = self._table(technology, token)
+            misses: List[Tuple[int, Any]] = []
+            hits = 0
+            for k, (index, vector) in enumerate(zip(positions, vectors)):
+                value = table.get(vector.features) if table is not None else None
+                if value is not None:
+                    hits += 1
+                    results[index] = self._result(vector, value, token[0])
+                    continue
+                key = self._cache.key(technology, vector.features, token) if self._cache.enabled else None
+                value = self._cache.get(key) if key is not None else None
+                if value is None:
+                    misses.append((k, key))
+                else:
+                    results[index] = self._result(vector, value, token[0])
+            if table is not None:
+                TABLE_LOOKUPS.inc(technology, "hit", amount=hits)
+                TABLE_LOOKUPS.inc(technology, "miss", amount=len(vectors) - hits)
+            if not misses:
+                continue
+            scored = batch if len(misses) == len(batch) else batch.take(np.asarray([k for k, _ in misses]))
+            values, version = self._models.predict_columns(
+                technology, scored.columns, canary_rows=[vectors[k].features for k, _ in misses]
+            )
+            for (k, key), value in zip(misses, values.tolist()):
+                if key is not None:
+                    self._cache_if_current(technology, (version, token[1]), key, value)
+                results[positions[k]] = self._result(vectors[k], value, version)
+        return results
+
+    def predict_table(
+        self,
+        columns: Mapping[str, Sequence[Any]],
+        n_rows: int,
+        invalid: Optional[Mapping[int, str]] = None,
+        quantiles: Optional[Sequence[float]] = None,
+        features: bool = True,
+    ) -> Dict[str, Any]:
+        """Columnar ``predict_batch``: ``columns`` are payload fields, mapped with ``BatchFeatureMapper.map_columns``
+        and scored with one model call per technology.
+
+        Returns ``n_rows``-long output columns: ``technology``, ``field_dbuv_m``, ``model_version`` and ``error``;
+        with ``quantiles`` also ``uncertainty_columns(quantiles)``; with ``features`` one column per model feature
+        (categoricals as ``InternedColumn``, code -1 / NaN where a row has no value).  Rows in ``invalid`` are not
+        mapped and carry its message as their error.  No feature dicts are built, so the precomputed table, the
+        prediction cache and the canary buffer are bypassed.
+        """
+        invalid = invalid or {}
+        technology = np.full(n_rows, None, dtype=object)
+        value = np.full(n_rows, np.nan)
+        version = np.full(n_rows, None, dtype=object)
+        error = np.full(n_rows, None, dtype=object)
+        for index, message in invalid.items():
+            error[index] = message
+        spread = None if quantiles is None else np.full((len(quantiles) + 1, n_rows), np.nan)
+        echoed: Dict[str, Any] = {}
+
+        start = time.perf_counter()
+        mapped = self._mapper.map_columns(columns, [i for i in range(n_rows) if i not in invalid] if invalid else None)
+        elapsed = time.perf_counter() - start
+        for index, exc in mapped.errors.items():
+            error[index] = str(exc)
+        for name, batch in mapped.groups.items():
+            STAGE_SECONDS.observe(elapsed, "map_features", name)
+            positions = batch.positions
+            try:
+                if spread is None:
+                    values, model_version = self._models.predict_columns(name, batch.columns)
+                else:
+                    distribution, model_version = self._models.predict_distribution(name, batch.columns, quantiles)
+                    values = distribution.mean
+                    spread[0, positions] = distribution.std
+                    spread[1:, positions] = distribution.values
+            except FileNotFoundError as exc:
+                error[positions] = str(exc)
+                continue
+            technology[positions] = name
+            value[positions] = values
+            version[positions] = model_version
+            if features:
+                _scatter_features(echoed, batch.columns, positions, n_rows)
+
+        out: Dict[str, Any] = {
+            "technology": technology, "field_dbuv_m": value, "model_version": version, "error": error
+        }
+        if spread is not None:
+            out.update(zip(uncertainty_columns(quantiles), spread))
+        for name, column in echoed.items():
+            if isinstance(column, tuple):
+                column = InternedColumn(np.asarray(column[0], dtype=object), column[1])
+            out[name] = column
+        return out
+
+    def predict_grid(self, request: Mapping[str, Any]) -> CoverageGrid:
+        """Predicts field strength on a regular lat/lon grid around one emitter.
+
+        ``request`` carries the /predict fields for technology, date, program, emitter
+        and channel/frequency plus ``south``/``west``/``north``/``east`` and ``rows``/``cols``.
+        Those fixed columns are mapped once and broadcast; each cell takes its
+        municipality, settlement, population and households (and elevation, unless
+        ``elevation_m`` is given) from the nearest settlement in the location lookup.
+        """
+        if not len(self._settlements):
+            raise FeatureMappingError("Location lookup has no settlement coordinates; regenerate it.")
+        south, west = float(request["south"]), float(request["west"])
+        north, east = float(request["north"]), float(request["east"])
+        rows, cols = int(request["rows"]), int(request["cols"])
+
+        fixed = build_emission_features(request)
+        lat_axis = north - (np.arange(rows) + 0.5) * (north - south) / rows
+        lon_axis = west + (np.arange(cols) + 0.5) * (east - west) / cols
+        latitude = np.repeat(lat_axis, cols)
+        longitude = np.tile(lon_axis, rows)
+        nearest = self._settlements.nearest(latitude, longitude)
+
+        elevation: Optional[float] = request.get("elevation_m")
+        columns: Dict[str, Any] = dict(fixed.features)
+        columns.update(
+            latitude=latitude,
+            longitude=longitude,
+            elevation_m=self._settlements.elevation_m[nearest] if elevation is None else float(elevation),
+            population=self._settlements.population[nearest],
+            households=self._settlements.households[nearest],
+            municipality=InternedColumn(self._settlements.municipality, nearest),
+            settlement=InternedColumn(self._settlements.settlement, nearest),
+        )
+        values, version = self._models.predict_columns(fixed.technology, columns)
+        return CoverageGrid(
+            technology=fixed.technology,
+            values=values.astype(np.float32).reshape(rows, cols),
+            south=south,
+            west=west,
+            north=north,
+            east=east,
+            model_version=version,
+        )
 
-    def predict(self, payload: Dict[str, Any]) -> Dict[str, Any]:
-        vector = build_feature_vector(payload, self._lookup)
-        value, version = self._models.predict(vector)
-        return {
+    @staticmethod
+    def _result(
+        vector: FeatureVector, value: float, version: str, uncertainty: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        result = {
             "technology": vector.technology,
             "field_dbuv_m": value,
             "features": vector.features,
             "model_version": version,
         }
+        if uncertainty is not None:
+            result["uncertainty"] = uncertainty
+        return result
 
 
 __all__ = [
+    "CoverageGrid",
     "SignalPredictorService",
     "ServiceConfig",
     "FeatureMappingError",
@@ -1,9 +1,9 @@
 ﻿from __future__ import annotations
 
 from datetime import datetime
-from typing import Literal, Optional
+from typing import Any, Literal, Optional
 
-from pydantic import BaseModel, Field, validator
+from pydantic import BaseModel, Field, ValidationInfo, field_validator
 
 
 class PredictionInput(BaseModel):
@@ -21,22 +21,33 @@ class PredictionInput(BaseModel):
     settlement: Optional[str] = Field(None, description="Fallback settlement name when registry lookup missing")
     program_identifier: Optional[str] = Field(None, max_length=255)
     transmitter_location: Optional[str] = Field(None, max_length=255)
-    channel_number: Optional[int] = Field(None, description="Required when technology=DIGITAL_TV")
-    frequency_mhz: Optional[float] = Field(None, description="Required when technology=FM")
+    channel_number: Optional[int] = Field(
+        None, validate_default=True, description="Required when technology=DIGITAL_TV"
+    )
+    frequency_mhz: Optional[float] = Field(None, validate_default=True, description="Required when technology=FM")
 
-    @validator("channel_number", always=True)
-    def validate_channel(cls, value, values):
-        if values.get("technology") == "DIGITAL_TV" and value is None:
+    @field_validator("channel_number")
+    def validate_channel(cls, value, info: ValidationInfo):
+        if info.data.get("technology") == "DIGITAL_TV" and value is None:
             raise ValueError("channel_number is required for DIGITAL_TV predictions")
         return value
 
-    @validator("frequency_mhz", always=True)
-    def validate_frequency(cls, value, values):
-        if values.get("technology") == "FM" and value is None:
+    @field_validator("frequency_mhz")
+    def validate_frequency(cls, value, info: ValidationInfo):
+        if info.data.get("technology") == "FM" and value is None:
             raise ValueError("frequency_mhz is required for FM predictions")
         return value
 
 
+class PredictionUncertainty(BaseModel):
+    """Spread of the ensemble's individual tree predictions for one row, in dBµV/m."""
+
+    mean: float = Field(..., description="Mean over the trees; equals field_dbuv_m")
+    std: float = Field(..., description="Standard deviation over the trees (0 for a single-tree model)")
+    quantiles: dict[str, float] = Field(..., description="Tree quantiles keyed by the requested level, e.g. '0.1'")
+    trees: int = Field(..., description="Number of trees the statistics are computed over")
+
+
 class PredictionResponse(BaseModel):
     """Service response containing prediction in dBµV/m."""
 
@@ -44,3 +55,91 @@ class PredictionResponse(BaseModel):
     field_dbuv_m: float = Field(..., description="Predicted electric field strength")
     features: dict[str, float | str]
     model_version: str = Field(..., description="Semantic identifier for the loaded pipeline artifact")
+    uncertainty: Optional[PredictionUncertainty] = Field(None, description="Present when ?uncertainty=true")
+
+
+class BatchPredictionRequest(BaseModel):
+    """Body accepted by /predict/batch. Items are validated one by one so a bad row does not reject the batch."""
+
+    items: list[dict[str, Any]] = Field(..., description="PredictionInput payloads; DIGITAL_TV and FM rows may be mixed")
+
+
+class BatchPredictionItem(BaseModel):
+    """Outcome for one batch row; either a prediction or an error message."""
+
+    index: int = Field(..., description="Position of the row in the request items")
+    technology: Optional[Literal["digital", "fm"]] = None
+    field_dbuv_m: Optional[float] = None
+    features: Optional[dict[str, float | str]] = None
+    model_version: Optional[str] = None
+    uncertainty: Optional[PredictionUncertainty] = None
+    error: Optional[str] = Field(None, description="Validation or feature mapping failure for this row")
+
+
+class BatchPredictionResponse(BaseModel):
+    """Batch results in request order."""
+
+    results: list[BatchPredictionItem]
+    succeeded: int
+    failed: int
+
+
+class GridPredictionRequest(BaseModel):
+    """Body accepted by /predict/grid: one emitter/program scored over a lat/lon bounding box."""
+
+    technology: Literal["DIGITAL_TV", "FM"] = Field(..., description="Signal family to predict")
+    date: datetime = Field(..., description="Measurement date used to derive year/month features")
+    south: float = Field(..., ge=-90, le=90, description="Southern edge latitude (WGS84)")
+    west: float = Field(..., ge=-180, le=180, description="Western edge longitude (WGS84)")
+    north: float = Field(..., ge=-90, le=90, description="Northern edge latitude (WGS84)")
+    east: float = Field(..., ge=-180, le=180, description="Eastern edge longitude (WGS84)")
+    rows: int = Field(..., ge=1, le=2000, description="Grid cells along latitude")
+    cols: int = Field(..., ge=1, le=2000, description="Grid cells along longitude")
+    elevation_m: Optional[float] = Field(None, description="Fixed site altitude; defaults to nearest settlement altitude")
+    program_identifier: Optional[str] = Field(None, max_length=255)
+    transmitter_location: Optional[str] = Field(None, max_length=255)
+    channel_number: Optional[int] = Field(
+        None, validate_default=True, description="Required when technology=DIGITAL_TV"
+    )
+    frequency_mhz: Optional[float] = Field(None, validate_default=True, description="Required when technology=FM")
+
+    @field_validator("north")
+    def validate_north(cls, value, info: ValidationInfo):
+        if "south" in info.data and value <= info.data["south"]:
+            raise ValueError("north must be greater than south")
+        return value
+
+    @field_validator("east")
+    def validate_east(cls, value, info: ValidationInfo):
+        if "west" in info.data and value <= info.data["west"]:
+            raise ValueError("east must be greater than west")
+        return value
+
+    @field_validator("channel_number")
+    def validate_channel(cls, value, info: ValidationInfo):
+        if info.data.get("technology") == "DIGITAL_TV" and value is None:
+            raise ValueError("channel_number is required for DIGITAL_TV predictions")
+        return value
+
+    @field_validator("frequency_mhz")
+    def validate_frequency(cls, value, info: ValidationInfo):
+        if info.data.get("technology") == "FM" and value is None:
+            raise ValueError("frequency_mhz is required for FM predictions")
+        return value
+
+
+class ModelReloadRequest(BaseModel):
+    """Optional body for /admin/models/{technology}/reload."""
+
+    artifact: Optional[str] = Field(
+        None, description="File name of a sibling artifact (e.g. best_fm_model-<stamp>.joblib); defaults to the configured one"
+    )
+
+
+class ModelSwapResponse(BaseModel):
+    """Outcome of a reload or rollback: the model now serving and the one kept resident for rollback."""
+
+    technology: Literal["digital", "fm"]
+    active: dict[str, Any]
+    previous: Optional[dict[str, Any]] = None
+    canary: Optional[dict[str, Any]] = Field(None, description="Canary replay report; null for rollbacks")
@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .batch_features import BatchFeatureMapper
+from .config import ServiceConfig, parse_quantiles
+from .location_lookup import SettlementIndex, load_location_lookup
+from .model_store import ModelStore
+from .predictor import uncertainty_columns
+
+FORMATS = {".csv": "csv", ".parquet": "parquet", ".pq": "parquet", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+OUTPUT_COLUMNS = ("technology", "field_dbuv_m", "model_version", "error")
+
+
+def detect_format(path: Path, explicit: Optional[str] = None) -> str:
+    if explicit:
+        return explicit
+    try:
+        return FORMATS[path.suffix.lower()]
+    except KeyError:
+        raise ValueError(f"Cannot tell the format of {path}; pass --input-format / --output-format") from None
+
+
+def read_chunks(path: Path, fmt: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    """Yields ``chunk_rows``-row frames; at most one chunk of the input is held in memory."""
+    if fmt == "csv":
+        yield from pd.read_csv(path, chunksize=chunk_rows, dtype={"registry_number": str})
+    elif fmt == "ndjson":
+        yield from pd.read_json(path, lines=True, chunksize=chunk_rows, dtype={"registry_number": str})
+    elif fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+class ChunkWriter:
+    """Appends scored chunks to one output file in the chosen format."""
+
+    def __init__(self, path: Path, fmt: str):
+        self.path = path
+        self.fmt = fmt
+        self._parquet = None
+        self._started = False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.exists():
+            path.unlink()
+
+    def write(self, frame: pd.DataFrame) -> None:
+        if self.fmt == "csv":
+            frame.to_csv(self.path, mode="a", header=not self._started, index=False)
+        elif self.fmt == "ndjson":
+            with open(self.path, "a", encoding="utf-8") as fh:
+                frame.to_json(fh, orient="records", lines=True, force_ascii=False, date_format="iso")
+        else:
+            self._write_parquet(frame)
+        self._started = True
+
+    def _write_parquet(self, frame: pd.DataFrame) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # a column's inferred type can differ between chunks (ints gaining NaNs, all-null text);
+        # widen to float64 / string so every chunk matches the schema of the first
+        frame = frame.copy()
+        for col in frame.columns:
+            if pd.api.types.is_bool_dtype(frame[col]):
+                continue
+            if pd.api.types.is_numeric_dtype(frame[col]):
+                frame[col] = frame[col].astype("float64")
+            elif not pd.api.types.is_datetime64_any_dtype(frame[col]):
+                frame[col] = frame[col].astype("string")
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if self._parquet is None:
+            self._parquet = pq.ParquetWriter(self.path, table.schema)
+        self._parquet.write_table(table.cast(self._parquet.schema))
+
+    def close(self) -> None:
+        if self._parquet is not None:
+            self._parquet.close()
+        elif not self._started:
+            self.path.touch()
+
+
+class ChunkScorer:
+    """Maps a chunk's rows into feature columns and scores each technology's rows in one ``predict_columns`` call.
+
+    With ``quantiles`` each technology is scored through ``predict_distribution`` instead and the output gains
+    ``uncertainty_columns(quantiles)``.
+    """
+
+    def __init__(self, config: ServiceConfig, quantiles: Optional[Sequence[float]] = None):
+        self._quantiles = None if quantiles is None else tuple(quantiles)
+        lookup = load_location_lookup(config.location_lookup_path)
+        settlements = SettlementIndex.from_lookup(lookup, config.settlement_max_distance_km)
+        self._mapper = BatchFeatureMapper(lookup, settlements)
+        self._models = ModelStore(config.digital_model_path, config.fm_model_path, config.model_backend, canary_size=0)
+
+    def score(self, chunk: pd.DataFrame) -> pd.DataFrame:
+        n = len(chunk)
+        technology = np.full(n, None, dtype=object)
+        value = np.full(n, np.nan)
+        version = np.full(n, None, dtype=object)
+        error = np.full(n, None, dtype=object)
+        spread = None if self._quantiles is None else np.full((len(self._quantiles) + 1, n), np.nan)
+        # NaN cells become None so the mapper sees them as absent, as it would in a JSON payload
+        records = chunk.astype(object).where(chunk.notna(), None).to_dict("records")
+        mapped = self._mapper.map(records)
+        for index, exc in mapped.errors.items():
+            error[index] = str(exc)
+        for tech, batch in mapped.groups.items():
+            positions = batch.positions
+            technology[positions] = tech
+            try:
+                if spread is None:
+                    values, model_version = self._models.predict_columns(tech, batch.columns)
+                else:
+                    distribution, model_version = self._models.predict_distribution(
+                        tech, batch.columns, self._quantiles
+                    )
+                    values = distribution.mean
+                    spread[0, positions] = distribution.std
+                    spread[1:, positions] = distribution.values
+            except FileNotFoundError as exc:
+                error[positions] = str(exc)
+                continue
+            value[positions] = values
+            version[positions] = model_version
+        out = chunk.reset_index(drop=True).copy()
+        for name, column in zip(OUTPUT_COLUMNS, (technology, value, version, error)):
+            out[name] = column
+        if spread is not None:
+            for name, column in zip(uncertainty_columns(self._quantiles), spread):
+                out[name] = column
+        return out
+
+
+_worker_scorer: Optional[ChunkScorer] = None
+
+
+def _init_worker(config: ServiceConfig, quantiles: Optional[Sequence[float]]) -> None:
+    global _worker_scorer
+    _worker_scorer = ChunkScorer(config, quantiles)
+
+
+def _score_in_worker(chunk: pd.DataFrame) -> pd.DataFrame:
+    return _worker_scorer.score(chunk)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # KiB on Linux, bytes on macOS
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def score_file(
+    source: Path,
+    target: Path,
+    config: ServiceConfig,
+    chunk_rows: int = 10_000,
+    workers: int = 1,
+    input_format: Optional[str] = None,
+    output_format: Optional[str] = None,
+    quantiles: Optional[Sequence[float]] = None,
+) -> Dict[str, Any]:
+    """Streams ``source`` through the models into ``target`` and returns a throughput summary.
+
+    With ``workers > 1`` chunks are scored in worker processes (each with its own model store; the ``.model``
+    format shares the tree arrays between them) while this process reads and writes.  At most ``2 * workers``
+    chunks are in flight and results are written in input order, so memory stays bounded by the chunk size.
+    ``quantiles`` adds the trees' spread per row (see ``ChunkScorer``).
+    """
+    in_fmt = detect_format(source, input_format)
+    out_fmt = detect_format(target, output_format)
+    writer = ChunkWriter(target, out_fmt)
+    counts: Dict[str, int] = {}
+    rows = errors = chunks = 0
+    start = time.perf_counter()
+
+    def collect(scored: pd.DataFrame) -> None:
+        nonlocal rows, errors, chunks
+        writer.write(scored)
+        rows += len(scored)
+        errors += int(scored["error"].notna().sum())
+        chunks += 1
+        for tech, n in scored["technology"].dropna().value_counts().items():
+            counts[tech] = counts.get(tech, 0) + int(n)
+
+    try:
+        if workers <= 1:
+            scorer = ChunkScorer(config, quantiles)
+            for chunk in read_chunks(source, in_fmt, chunk_rows):
+                collect(scorer.score(chunk))
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config, quantiles))
+            with pool:
+                pending = []
+                for chunk in read_chunks(source, in_fmt, chunk_rows):
+                    pending.append(pool.submit(_score_in_worker, chunk))
+                    if len(pending) >= 2 * workers:
+                        collect(pending.pop(0).result())
+                for future in pending:
+                    collect(future.result())
+    finally:
+        writer.close()
+
+    seconds = time.perf_counter() - start
+    return {
+        "input": str(source),
+        "output": str(target),
+        "rows": rows,
+        "scored": rows - errors,
+        "errors": errors,
+        "by_technology": counts,
+        "chunks": chunks,
+        "chunk_rows": chunk_rows,
+        "workers": workers,
+        "quantiles": None if quantiles is None else list(quantiles),
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    ap = argparse.ArgumentParser(
+        prog="python -m service.score",
+        description="Score a CSV / Parquet / NDJSON file of /predict-shaped rows with the current models.",
+    )
+    ap.add_argument("input", type=Path, help="Rows with the /predict fields (technology, date, latitude, ...)")
+    ap.add_argument("output", type=Path, help="Input columns plus technology, field_dbuv_m, model_version, error")
+    ap.add_argument("--input-format", choices=sorted(set(FORMATS.values())), default=None)
+    ap.add_argument("--output-format", choices=sorted(set(FORMATS.values())), default=None)
+    ap.add_argument("--chunk-rows", type=int, default=10_000, help="Rows read, scored and written at a time")
+    ap.add_argument("--workers", type=int, default=1, help="Scoring processes (0 = one per core)")
+    ap.add_argument(
+        "--uncertainty", action="store_true", help="Add the trees' std and UNCERTAINTY_QUANTILES columns"
+    )
+    ap.add_argument(
+        "--quantiles", type=parse_quantiles, default=None, help="Comma-separated tree quantiles (implies --uncertainty)"
+    )
+    args = ap.parse_args(argv)
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    config = ServiceConfig.from_env()
+    quantiles = args.quantiles
+    if quantiles is None and args.uncertainty:
+        quantiles = config.uncertainty_quantiles
+    summary = score_file(
+        args.input,
+        args.output,
+        config,
+        chunk_rows=args.chunk_rows,
+        workers=workers,
+        input_format=args.input_format,
+        output_format=args.output_format,
+        quantiles=quantiles,
+    )
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
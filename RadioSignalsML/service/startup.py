@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .metrics import Sample
+
+
+class _TimedLoader:
+    """Wraps a module's loader so its ``exec_module`` is timed; every other attribute is the wrapped loader's."""
+
+    def __init__(self, loader: Any, profiler: "StartupProfiler"):
+        self._loader = loader
+        self._profiler = profiler
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module) -> None:
+        self._profiler._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._profiler._leave(module.__name__)
+            # the module keeps its real loader once it has run
+            module.__loader__ = self._loader
+            if getattr(module, "__spec__", None) is not None:
+                module.__spec__.loader = self._loader
+
+
+class _ImportFinder:
+    """First entry of ``sys.meta_path`` while imports are profiled: resolves specs through the finders after it."""
+
+    def __init__(self, profiler: "StartupProfiler"):
+        self._profiler = profiler
+
+    def find_spec(self, name, path=None, target=None):
+        if threading.get_ident() != self._profiler._thread:
+            return None  # one thread's imports nest cleanly; others fall through to the regular finders
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self._profiler)
+                return spec
+        return None
+
+
+class StartupProfiler:
+    """Import and initialization timings of one process start.
+
+    ``start_imports`` puts a finder in front of ``sys.meta_path`` that times every module executed afterwards
+    (inclusive of the imports it triggers, like ``python -X importtime``) until ``finish``; ``phase`` and ``mark``
+    time initialization steps.  Times count from the profiler's creation, i.e. the first import of
+    ``service.main``.  ``report`` is what ``GET /startup`` returns and ``samples`` feed ``/metrics``.
+    """
+
+    def __init__(self, budget_ms: float = 0.0):
+        self.budget_ms = budget_ms
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self._finder: Optional[_ImportFinder] = None
+        self._thread: Optional[int] = None
+        self._stack: List[List[float]] = []  # [start, seconds spent in nested imports] per module being executed
+        self._imports: Dict[str, Tuple[float, float]] = {}  # module -> (cumulative, self) seconds
+        self._phases: Dict[str, float] = {}
+
+    def start_imports(self) -> None:
+        if self._finder is None and self._finished is None:
+            self._finder = _ImportFinder(self)
+            self._thread = threading.get_ident()
+            sys.meta_path.insert(0, self._finder)
+
+    def _stop_imports(self) -> None:
+        if self._finder is not None:
+            try:
+                sys.meta_path.remove(self._finder)
+            except ValueError:
+                pass
+            self._finder = None
+
+    def _enter(self) -> None:
+        self._stack.append([time.perf_counter(), 0.0])
+
+    def _leave(self, name: str) -> None:
+        start, nested = self._stack.pop()
+        cumulative = time.perf_counter() - start
+        self._imports[name] = (cumulative, cumulative - nested)
+        if self._stack:
+            self._stack[-1][1] += cumulative
+
+    @property
+    def finished(self) -> bool:
+        return self._finished is not None
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Times the block as phase ``name``; a no-op once startup has finished."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self._finished is None:
+                self._phases[name] = self._phases.get(name, 0.0) + time.perf_counter() - start
+
+    def mark(self, name: str) -> None:
+        """Records the time not yet assigned to a phase, up to now, as phase ``name``."""
+        if self._finished is None:
+            self._phases[name] = time.perf_counter() - self._started - sum(self._phases.values())
+
+    def finish(self) -> float:
+        """Stops profiling imports and returns the startup time in seconds; later calls return the same value."""
+        if self._finished is None:
+            self._stop_imports()
+            self._finished = time.perf_counter()
+        return self._finished - self._started
+
+    @property
+    def total_seconds(self) -> float:
+        return (self._finished if self._finished is not None else time.perf_counter()) - self._started
+
+    def packages(self) -> Dict[str, float]:
+        """Self time of the profiled imports summed per top-level package, slowest first."""
+        out: Dict[str, float] = {}
+        for name, (_, own) in self._imports.items():
+            top = name.partition(".")[0]
+            out[top] = out.get(top, 0.0) + own
+        return dict(sorted(out.items(), key=lambda item: -item[1]))
+
+    def report(self, top: int = 15) -> Dict[str, Any]:
+        total_ms = self.total_seconds * 1000.0
+        slowest = sorted(self._imports.items(), key=lambda item: -item[1][0])[:top]
+        return {
+            "finished": self.finished,
+            "total_ms": round(total_ms, 1),
+            "budget_ms": self.budget_ms or None,
+            "within_budget": None if not self.budget_ms else total_ms <= self.budget_ms,
+            "phases_ms": {name: round(seconds * 1000.0, 1) for name, seconds in self._phases.items()},
+            "modules_imported": len(self._imports),
+            "packages_ms": {
+                name: round(seconds * 1000.0, 1) for name, seconds in list(self.packages().items())[:top]
+            },
+            "slowest_imports": [
+                {"module": name, "cumulative_ms": round(cum * 1000.0, 1), "self_ms": round(own * 1000.0, 1)}
+                for name, (cum, own) in slowest
+            ],
+        }
+
+    def samples(self, top: int = 10) -> Iterable[Sample]:
+        yield "radio_startup_seconds", "gauge", "First import of service.main to app built.", {}, self.total_seconds
+        for name, seconds in self._phases.items():
+            yield "radio_startup_phase_seconds", "gauge", "Startup time per phase.", {"phase": name}, seconds
+        for name, seconds in list(self.packages().items())[:top]:
+            labels = {"package": name}
+            yield "radio_startup_import_seconds", "gauge", "Import self time per top-level package.", labels, seconds
+
+
+# one per process; started by ``service.main`` before its own imports
+PROFILER = StartupProfiler()
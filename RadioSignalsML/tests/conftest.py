@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))  # service/, benchmarks/ and train_signal_models.py live at the project root
+
+
+@pytest.fixture
+def client(monkeypatch):
+    """TestClient over a freshly built app with the repository's artifacts; models load on first use."""
+    from fastapi.testclient import TestClient
+
+    from service.main import build_app
+
+    monkeypatch.setenv("WARMUP_ENABLED", "false")
+    monkeypatch.setenv("PREDICTION_CACHE_MAX_ENTRIES", "0")
+    with TestClient(build_app()) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def artifacts(tmp_path):
+    """A temp copy of the FM pipeline with its .npz and .model/ compiled from it; returns the .joblib path."""
+    from service import compiled_model
+    from service.config import ServiceConfig
+
+    model_path = tmp_path / "best_fm_model.joblib"
+    shutil.copyfile(ServiceConfig.from_env().fm_model_path, model_path)
+    assert compiled_model.main([str(model_path)]) == 0
+    return model_path
+
+
+@pytest.fixture(scope="session")
+def lookup():
+    """The repository's location lookup, loaded once for the session."""
+    from service.config import ServiceConfig
+    from service.location_lookup import load_location_lookup
+
+    return load_location_lookup(ServiceConfig.from_env().location_lookup_path)
+
+
+@pytest.fixture(scope="session")
+def index(lookup):
+    """A SettlementIndex over ``lookup`` with the service's default 25 km reach."""
+    from service.location_lookup import SettlementIndex
+
+    return SettlementIndex.from_lookup(lookup, 25.0)
+
+
+@pytest.fixture
+def fm_payload():
+    """A valid FM /predict body for a lookup settlement (registry number, names and site)."""
+    return {
+        "technology": "FM",
+        "date": "2024-05-01T00:00:00",
+        "latitude": 41.156111,
+        "longitude": 22.437722,
+        "elevation_m": 188.0,
+        "population": 136,
+        "households": 46,
+        "municipality": "ГЕВГЕЛИЈА",
+        "settlement": "Ново Коњско",
+        "program_identifier": "МРА 3",
+        "transmitter_location": "Црн Врв",
+        "frequency_mhz": 101.3,
+    }
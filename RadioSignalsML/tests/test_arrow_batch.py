@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+import pyarrow as pa
+import pytest
+
+from service.arrow_batch import ARROW_STREAM, encode_payloads
+
+
+def _rows(fm):
+    """Valid rows next to one row per PredictionInput rule and mapping failure, in mixed technology order."""
+    digital = {**fm, "technology": "DIGITAL_TV", "channel_number": 40}
+    digital.pop("frequency_mhz")
+    return [
+        fm,
+        {**fm, "technology": "AM"},
+        {**fm, "date": None},
+        {**fm, "latitude": None},
+        {**fm, "population": None, "households": None},
+        {**fm, "program_identifier": "x" * 256},
+        {**fm, "frequency_mhz": None},
+        {**digital, "channel_number": None},
+        {**digital, "channel_number": 40.5},
+        digital,  # no DIGITAL_TV artifact in this tree: a per-row model error
+        {**fm, "municipality": None, "settlement": None, "latitude": 10.0, "longitude": 10.0},  # nothing within reach
+        {**fm, "technology": "AM", "elevation_m": None},
+        {**fm, "frequency_mhz": 98.1, "transmitter_location": "Непознат"},
+        fm,
+    ]
+
+
+def _arrow_results(client, rows):
+    response = client.post("/predict/batch", content=encode_payloads(rows), headers={"content-type": ARROW_STREAM})
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == ARROW_STREAM
+    return pa.ipc.open_stream(response.content).read_all().to_pylist()
+
+
+def test_arrow_and_json_bodies_agree(client, fm_payload):
+    rows = _rows(fm_payload)
+    response = client.post("/predict/batch", json={"items": rows})
+    assert response.status_code == 200, response.text
+    as_json = response.json()["results"]
+    as_arrow = _arrow_results(client, rows)
+
+    assert len(as_json) == len(as_arrow) == len(rows)
+    for index, (left, right) in enumerate(zip(as_json, as_arrow)):
+        assert left["index"] == index
+        assert left.get("error") == right["error"], index
+        if left.get("error") is None:
+            assert right["field_dbuv_m"] == pytest.approx(left["field_dbuv_m"], abs=1e-9)
+            assert right["technology"] == left["technology"]
+            assert right["model_version"] == left["model_version"]
+    assert sum(item.get("error") is None for item in as_json) == response.json()["succeeded"] >= 3
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import math
+
+import pandas as pd
+import pytest
+
+from service.batch_features import BatchFeatureMapper
+from service.config import ServiceConfig
+from service.feature_mapping import FeatureMappingError, build_feature_vector
+from service.score import ChunkScorer
+
+_MISSING_NAMES = "Missing settlement or municipality information."
+
+
+def _unnamed(payload, **changes):
+    row = {k: v for k, v in payload.items() if k not in ("municipality", "settlement")}
+    row.update(changes)
+    return row
+
+
+def check_equivalence(payloads, lookup, index=None):
+    """Maps ``payloads`` row by row, with ``map`` and, as columns over the union of their keys (absent keys as
+    ``None``), with ``map_columns``; raises AssertionError on any difference in features or errors."""
+    mapper = BatchFeatureMapper(lookup, index)
+    keys = list(dict.fromkeys(key for payload in payloads for key in payload))
+    by_columns = mapper.map_columns({key: [payload.get(key) for payload in payloads] for key in keys})
+    for mapped in (mapper.map(payloads), by_columns):
+        rows = {}
+        for batch in mapped.groups.values():
+            for position, features in zip(batch.positions.tolist(), batch.rows()):
+                rows[position] = (batch.technology, features)
+        for position, payload in enumerate(payloads):
+            try:
+                vector = build_feature_vector(payload, lookup, index)
+            except FeatureMappingError as exc:
+                got = mapped.errors.get(position)
+                assert got is not None and str(got) == str(exc), (position, str(exc), got)
+                continue
+            assert position in rows, (position, mapped.errors.get(position))
+            technology, features = rows[position]
+            assert technology == vector.technology, (position, technology, vector.technology)
+            assert list(features) == list(vector.features), (position, list(features), list(vector.features))
+            for name, value in vector.features.items():
+                other = features[name]
+                same = other == value or (isinstance(value, float) and value != value and other != other)
+                assert same and type(other) is type(value), (position, name, value, other)
+    return {"rows": len(payloads), "mapped": len(rows), "errors": len(mapped.errors)}
+
+
+def test_non_finite_coordinates_are_per_row_errors(lookup, index, fm_payload):
+    payloads = [
+        fm_payload,
+        _unnamed(fm_payload, latitude=math.inf),
+        _unnamed(fm_payload, longitude=-math.inf),
+        _unnamed(fm_payload, latitude="inf"),
+        _unnamed(fm_payload),
+    ]
+    mapped = BatchFeatureMapper(lookup, index).map(payloads)
+    assert {i: str(exc) for i, exc in mapped.errors.items()} == {1: _MISSING_NAMES, 2: _MISSING_NAMES, 3: _MISSING_NAMES}
+    assert mapped.groups["fm"].positions.tolist() == [0, 4]
+    assert check_equivalence(payloads, lookup, index)["errors"] == 3
+
+
+@pytest.mark.parametrize(
+    "dates",
+    [
+        {"date": None, "measurement_date": 0},
+        {"date": None, "measurement_date": 0.0},
+        {"date": 0},
+        {"date": 0, "measurement_date": 40 * 86_400_000},
+    ],
+)
+def test_epoch_dates_match_build_feature_vector(lookup, index, fm_payload, dates):
+    check_equivalence([{**fm_payload, **dates}], lookup, index)  # raises AssertionError on a mismatch
+
+
+def test_predict_batch_keeps_valid_rows_next_to_infinite_coordinates(client, fm_payload):
+    body = {"items": [fm_payload, _unnamed(fm_payload, latitude="inf"), fm_payload]}
+    response = client.post("/predict/batch", json=body)
+    assert response.status_code == 200, response.text
+    items = response.json()["results"]
+    assert items[1]["error"] == _MISSING_NAMES
+    assert items[0]["field_dbuv_m"] == items[2]["field_dbuv_m"]
+    assert items[0].get("error") is None
+
+
+def test_chunk_scorer_reports_infinite_coordinates_per_row(fm_payload):
+    chunk = pd.DataFrame([fm_payload, _unnamed(fm_payload, latitude=math.inf)])
+    chunk.loc[1, ["municipality", "settlement"]] = None
+    scored = ChunkScorer(ServiceConfig.from_env()).score(chunk)
+    assert scored["error"].tolist() == [None, _MISSING_NAMES]
+    assert math.isfinite(scored["field_dbuv_m"].iloc[0])
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+import train_signal_models
+from train_signal_models import (
+    check_cleaning_equivalence,
+    load_and_clean_columnar,
+    load_and_clean_streaming,
+    load_cleaned,
+)
+
+WORKBOOK = Path(__file__).resolve().parent.parent / "signal_data.xlsx"  # every row, as --check-cleaning does
+
+
+@pytest.mark.parametrize("chunk_rows", [1000, 100_000])
+def test_rowwise_columnar_and_streaming_cleaning_agree(chunk_rows):
+    report = check_cleaning_equivalence(WORKBOOK, chunk_rows=chunk_rows)  # raises AssertionError on a mismatch
+    assert report["rows"] > 5000
+
+
+def test_streaming_all_sheets_matches_first_sheet():
+    columnar = load_and_clean_columnar(WORKBOOK)
+    streamed = load_and_clean_streaming(WORKBOOK, sheets="all", chunk_rows=1000)
+    assert set(streamed["sheet"]) == {"Sheet1"}  # the other sheets have no measurement header
+    pd.testing.assert_frame_equal(streamed.drop(columns="sheet"), columnar.reset_index(drop=True))
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_cache_hit_matches_fresh_clean(tmp_path, monkeypatch, stream):
+    fresh = load_cleaned(WORKBOOK, cache_dir=None, stream=stream)
+    written = load_cleaned(WORKBOOK, cache_dir=tmp_path, stream=stream)
+    assert len(list(tmp_path.glob("*.feather"))) == 1
+
+    def not_cached(*args, **kwargs):
+        raise AssertionError("cleaned again instead of reading the cache")
+
+    monkeypatch.setattr(train_signal_models, "load_and_clean_columnar", not_cached)
+    monkeypatch.setattr(train_signal_models, "load_and_clean_streaming", not_cached)
+    cached = load_cleaned(WORKBOOK, cache_dir=tmp_path, stream=stream)
+    pd.testing.assert_frame_equal(written, fresh)
+    pd.testing.assert_frame_equal(cached, fresh)  # dtypes, index, and None vs NaN in object columns
+    for column in fresh.columns[fresh.dtypes == object]:
+        assert [type(v) for v in cached[column]] == [type(v) for v in fresh[column]], column
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import joblib
+import numpy as np
+import pytest
+
+from service.compiled_model import compile_pipeline, sample_frame
+from service.config import ServiceConfig
+
+
+@pytest.fixture(scope="module")
+def compiled():
+    return compile_pipeline(joblib.load(ServiceConfig.from_env().fm_model_path))
+
+
+def _row(frame, i):
+    return {name: column[i].item() if isinstance(column[i], np.generic) else column[i] for name, column in frame.items()}
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_single_row_path_matches_batch(compiled, compact):
+    model = compiled.compact() if compact else compiled
+    frame = sample_frame(model, 64)
+    X = model.transform(frame)
+    per_tree = model.tree_predictions(X)
+    for i in range(64):
+        row = _row(frame, i)
+        single = model.transform(row)
+        assert np.array_equal(single, X[i : i + 1])
+        assert np.array_equal(model.tree_predictions(single), per_tree[:, i : i + 1])
+        assert model.predict(row)[0] == pytest.approx(model.predict({k: [v] for k, v in row.items()})[0], abs=1e-9)
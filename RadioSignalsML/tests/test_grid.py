@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import io
+
+import numpy as np
+import pytest
+
+
+@pytest.fixture
+def grid_request():
+    return {
+        "technology": "FM",
+        "date": "2024-05-01T00:00:00",
+        "south": 41.0,
+        "west": 22.2,
+        "north": 41.3,
+        "east": 22.6,
+        "rows": 3,
+        "cols": 4,
+        "program_identifier": "МРА 3",
+        "transmitter_location": "Црн Врв",
+        "frequency_mhz": 101.3,
+    }
+
+
+def test_grid_raster_shape_dtype_and_headers(client, grid_request):
+    response = client.post("/predict/grid", json=grid_request)
+    assert response.status_code == 200, response.text
+    assert response.headers["content-type"] == "application/x-npy"
+    values = np.load(io.BytesIO(response.content), allow_pickle=False)
+    assert values.shape == (3, 4)
+    assert values.dtype == np.float32
+    assert np.isfinite(values).all()
+    assert response.headers["X-Grid-Shape"] == "3,4"
+    assert response.headers["X-Grid-Bounds"] == "41.0,22.2,41.3,22.6"
+    assert response.headers["X-Technology"] == "fm"
+    assert response.headers["X-Model-Version"] == "best_fm_model"
+
+
+def test_grid_errors(client, grid_request):
+    missing = {**grid_request, "technology": "DIGITAL_TV", "channel_number": 40}
+    response = client.post("/predict/grid", json=missing)
+    assert response.status_code == 503
+    assert "best_digital_model" in response.json()["detail"]
+    assert client.post("/predict/grid", json={**grid_request, "north": 40.0}).status_code == 422
+    assert client.post("/predict/grid", json={**grid_request, "frequency_mhz": None}).status_code == 422
@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import math
+
+import numpy as np
+import pytest
+
+from service.feature_mapping import FeatureMappingError, build_feature_vector
+
+
+def test_nearest_skips_non_finite_points(index):
+    lat, lon = float(index.latitude[0]), float(index.longitude[0])
+    found = index.nearest([lat, math.inf, np.nan, lat], [lon, lon, lon, -math.inf], index.max_km)
+    assert found.tolist() == [0, -1, -1, -1]
+    assert index.nearest_one(math.inf, lon, index.max_km) == -1
+    assert index.nearest_one(lat, lon, index.max_km) == 0
+
+
+@pytest.mark.parametrize("latitude", ["inf", "-inf", "nan", float("inf")])
+def test_non_finite_coordinates_do_not_resolve(lookup, index, latitude):
+    payload = {"technology": "FM", "date": "2024-05-01", "latitude": latitude, "longitude": 22.4, "frequency_mhz": 99.0}
+    with pytest.raises(FeatureMappingError, match="Missing settlement"):
+        build_feature_vector(payload, lookup, index)
+
+
+@pytest.mark.parametrize("query", ["", "?uncertainty=true"])
+def test_predict_rejects_infinite_coordinates_with_400(client, fm_payload, query):
+    payload = {k: v for k, v in fm_payload.items() if k not in ("municipality", "settlement")}
+    payload["latitude"] = "inf"
+    response = client.post("/predict" + query, json=payload)
+    assert response.status_code == 400, response.text
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from service.micro_batcher import MicroBatcher
+
+
+def _run(batcher: MicroBatcher, items, lane: str = "fm"):
+    async def main():
+        try:
+            return await asyncio.gather(*(batcher.submit(lane, item) for item in items), return_exceptions=True)
+        finally:
+            await batcher.close()
+
+    return asyncio.run(main())
+
+
+def test_a_row_that_breaks_the_call_fails_only_its_own_request():
+    calls = []
+
+    def score(items):
+        calls.append(list(items))
+        if "bad" in items:
+            raise ValueError("x must be finite")
+        return [item.upper() for item in items]
+
+    outcomes = _run(MicroBatcher(score, window_ms=20, max_rows=8), ["a", "bad", "c"])
+    assert outcomes[0] == "A" and outcomes[2] == "C"
+    assert isinstance(outcomes[1], ValueError)
+    assert calls[0] == ["a", "bad", "c"]  # one coalesced call, then one call per row
+    assert sorted(calls[1:]) == [["a"], ["bad"], ["c"]]
+
+
+def test_single_row_failure_is_raised_to_its_caller():
+    def score(items):
+        raise RuntimeError("model missing")
+
+    (outcome,) = _run(MicroBatcher(score, window_ms=0), ["a"])
+    assert isinstance(outcome, RuntimeError)
+
+
+@pytest.mark.parametrize("workers, overlap", [(1, 1), (3, 3)])
+def test_workers_score_batches_of_one_lane_concurrently(workers, overlap):
+    lock = threading.Lock()
+    state = {"running": 0, "peak": 0}
+
+    def score(items):
+        with lock:
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+        time.sleep(0.05)
+        with lock:
+            state["running"] -= 1
+        return items
+
+    async def main(batcher):
+        async def later(i):
+            await asyncio.sleep(i * 0.005)  # each row arrives after the previous batch was handed off
+            return await batcher.submit("fm", i)
+
+        try:
+            return await asyncio.gather(*(later(i) for i in range(workers)))
+        finally:
+            await batcher.close()
+
+    assert asyncio.run(main(MicroBatcher(score, window_ms=0, max_rows=1, workers=workers))) == list(range(workers))
+    assert state["peak"] == overlap
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+import os
+import shutil
+import time
+from dataclasses import replace
+
+import joblib
+import pytest
+
+from service import compiled_model
+from service.config import ServiceConfig
+from service.model_store import ModelStore, ModelValidationError, synthetic_rows
+from service.predictor import SignalPredictorService
+
+
+def _store(model_path, backend="auto"):
+    return ModelStore(model_path.with_name("best_digital_model.joblib"), model_path, backend)
+
+
+def test_compiled_artifact_records_its_source(artifacts):
+    source = compiled_model.compiled_source(compiled_model.mapped_path_for(artifacts))
+    assert source == compiled_model.source_signature(artifacts)
+    assert compiled_model.compiled_source(compiled_model.compiled_path_for(artifacts)) == source
+
+
+def test_new_joblib_outranks_stale_compiled_artifact(artifacts):
+    store = _store(artifacts)
+    assert store._load("fm").path.suffix == compiled_model.MAPPED_SUFFIX
+    assert not store.changed_on_disk("fm")
+
+    joblib.dump(joblib.load(artifacts), artifacts, compress=1)  # a retrained model dropped in
+    assert store.changed_on_disk("fm")
+    assert store.disk_signature("fm")[0] == artifacts
+    entry, _ = store.reload("fm")
+    assert entry.path == artifacts
+    assert not store.changed_on_disk("fm")
+
+
+def test_copied_joblib_still_matches_by_hash(artifacts):
+    staged = artifacts.with_name("staged.joblib")
+    shutil.copyfile(artifacts, staged)
+    os.utime(staged, ns=(1, 1))
+    os.replace(staged, artifacts)
+    assert compiled_model.matches_source(compiled_model.mapped_path_for(artifacts), artifacts)
+    assert _store(artifacts)._load("fm").path.suffix == compiled_model.MAPPED_SUFFIX
+
+
+def test_unverifiable_or_stale_compiled_artifact(artifacts):
+    shutil.rmtree(compiled_model.mapped_path_for(artifacts))
+    npz = compiled_model.compiled_path_for(artifacts)
+    legacy = compiled_model.load_compiled(npz)
+    legacy.source = None
+    legacy.save(npz)
+    assert not compiled_model.matches_source(npz, artifacts)
+    assert _store(artifacts)._load("fm").path == artifacts
+    with pytest.raises(FileNotFoundError):
+        _store(artifacts, backend="compiled")._load("fm")
+    os.remove(artifacts)  # compiled-only deployment: nothing to compare against
+    assert _store(artifacts, backend="compiled")._load("fm").path == npz
+
+
+@pytest.fixture()
+def admin_client(artifacts, monkeypatch):
+    """The app serving the temp FM artifacts, with an admin token configured."""
+    from fastapi.testclient import TestClient
+
+    from service.main import build_app
+
+    monkeypatch.setenv("FM_MODEL_PATH", str(artifacts))
+    monkeypatch.setenv("DIGITAL_MODEL_PATH", str(artifacts.with_name("best_digital_model.joblib")))
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    monkeypatch.setenv("WARMUP_ENABLED", "false")
+    monkeypatch.setenv("PREDICTION_CACHE_MAX_ENTRIES", "0")
+    with TestClient(build_app()) as test_client:
+        yield test_client
+
+
+def _admin(client, action, token="s3cret", **body):
+    return client.post(f"/admin/models/fm/{action}", headers={"X-Admin-Token": token}, json=body or None)
+
+
+def _shifted(model_path, name, offset):
+    """A sibling artifact whose every prediction is ``offset`` dB higher."""
+    pipeline = joblib.load(model_path)
+    for tree in getattr(pipeline.named_steps["model"], "estimators_", [pipeline.named_steps["model"]]):
+        tree.tree_.value[:] += offset
+    joblib.dump(pipeline, model_path.with_name(name))
+    return name
+
+
+def test_admin_endpoints_fail_closed_without_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    for action in ("reload", "rollback"):
+        assert client.post(f"/admin/models/fm/{action}").status_code == 403
+        assert client.post(f"/admin/models/fm/{action}", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_admin_token_is_checked(admin_client):
+    assert admin_client.post("/admin/models/fm/reload").status_code == 401
+    assert _admin(admin_client, "reload", token="wrong").status_code == 401
+
+
+def test_reload_and_rollback(admin_client, artifacts, fm_payload):
+    before = admin_client.post("/predict", json=fm_payload).json()["field_dbuv_m"]
+    assert _admin(admin_client, "rollback").status_code == 409  # nothing to roll back to yet
+
+    shifted = _shifted(artifacts, "best_fm_model-shifted.joblib", 2.0)
+    response = _admin(admin_client, "reload", artifact=shifted)
+    assert response.status_code == 200, response.text
+    body = response.json()
+    assert body["active"]["version"] == "best_fm_model-shifted"
+    assert body["canary"]["mean_abs_diff"] == pytest.approx(2.0, abs=1e-3)
+    after = admin_client.post("/predict", json=fm_payload).json()["field_dbuv_m"]
+    assert after == pytest.approx(before + 2.0, abs=1e-3)
+
+    response = _admin(admin_client, "rollback")
+    assert response.status_code == 200
+    assert response.json()["active"]["version"] == "best_fm_model"
+    assert admin_client.post("/predict", json=fm_payload).json()["field_dbuv_m"] == pytest.approx(before)
+
+
+def test_canary_rejects_large_shift(admin_client, artifacts, fm_payload):
+    admin_client.post("/predict", json=fm_payload)
+    shifted = _shifted(artifacts, "best_fm_model-broken.joblib", 50.0)
+    response = _admin(admin_client, "reload", artifact=shifted)
+    assert response.status_code == 409
+    assert "shifts canary predictions" in response.json()["detail"]
+    assert admin_client.get("/health").json()["models"]["fm"]["active"]["version"] == "best_fm_model"
+    assert _admin(admin_client, "reload", artifact="missing.joblib").status_code == 404
+
+
+def test_direct_store_uses_service_canary_limit(artifacts):
+    store = _store(artifacts, backend="sklearn")
+    store.predict_batch("fm", synthetic_rows(store._load("fm").model, 4))
+    candidate = store._read("fm", artifacts.with_name(_shifted(artifacts, "best_fm_model-broken.joblib", 50.0)))
+    with pytest.raises(ModelValidationError):
+        store.validate("fm", candidate)
+
+
+def test_watcher_hot_reloads_new_artifact(artifacts):
+    config = replace(ServiceConfig.from_env(), fm_model_path=artifacts, cache_max_entries=0)
+    predictor = SignalPredictorService(config)
+    generation = predictor._models.model_token("fm")[1]
+    predictor.start_watcher(0.05)
+    try:
+        joblib.dump(joblib.load(artifacts), artifacts, compress=1)
+        deadline = time.monotonic() + 10
+        while predictor._models.model_token("fm")[1] == generation and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        predictor.stop_watcher()
+    active = predictor.model_status()["fm"]["active"]
+    assert active["generation"] > generation
+    assert active["artifact"] == artifacts.name
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import pytest
+
+
+def _digital(fm):
+    digital = {**fm, "technology": "DIGITAL_TV", "channel_number": 40}
+    digital.pop("frequency_mhz")
+    return digital
+
+
+def test_mixed_batch_keeps_request_order_and_per_row_errors(client, fm_payload):
+    digital = _digital(fm_payload)
+    other_fm = {**fm_payload, "frequency_mhz": 98.1}
+    items = [
+        digital,
+        fm_payload,
+        {**fm_payload, "frequency_mhz": None},
+        digital,
+        other_fm,
+        {**fm_payload, "technology": "AM"},
+        {**fm_payload, "municipality": None, "settlement": None, "latitude": 10.0, "longitude": 10.0},
+        fm_payload,
+    ]
+    response = client.post("/predict/batch", json={"items": items})
+    assert response.status_code == 200, response.text
+    body = response.json()
+    results = body["results"]
+
+    assert [item["index"] for item in results] == list(range(len(items)))
+    assert (body["succeeded"], body["failed"]) == (3, 5)
+    assert body["succeeded"] == sum(item.get("error") is None for item in results)
+
+    single = client.post("/predict", json=fm_payload).json()["field_dbuv_m"]
+    for position in (1, 7):
+        assert results[position]["technology"] == "fm"
+        assert results[position]["field_dbuv_m"] == pytest.approx(single, abs=1e-9)
+        assert results[position]["features"]["fm_freq_mhz"] == 101.3
+    assert results[4]["field_dbuv_m"] != results[1]["field_dbuv_m"]
+
+    for position in (0, 3):  # no DIGITAL_TV artifact in this tree
+        assert results[position]["field_dbuv_m"] is None
+        assert "best_digital_model" in results[position]["error"]
+    assert results[2]["error"] == "frequency_mhz: Value error, frequency_mhz is required for FM predictions"
+    assert results[5]["error"].startswith("technology: ")
+    assert results[6]["error"] and results[6]["field_dbuv_m"] is None
+
+
+def test_batch_without_features_and_all_rows_failing(client, fm_payload):
+    response = client.post("/predict/batch?features=false", json={"items": [fm_payload, _digital(fm_payload)]})
+    results = response.json()["results"]
+    assert "features" not in results[0] or results[0]["features"] is None
+    assert results[0]["field_dbuv_m"] is not None
+
+    response = client.post("/predict/batch", json={"items": [{"technology": "FM"}, {}]})
+    assert response.status_code == 200
+    assert (response.json()["succeeded"], response.json()["failed"]) == (0, 2)
+    assert client.post("/predict/batch", json={"items": []}).json() == {"results": [], "succeeded": 0, "failed": 0}
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import pytest
+
+from service.config import ServiceConfig
+from service.prediction_cache import PredictionCache
+from service.predictor import SignalPredictorService
+
+_TOKEN = ("best_fm_model", 1)
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _key(cache, technology="fm", token=_TOKEN, **features):
+    return cache.key(technology, {"latitude": 41.0, "program_id": "P1", **features}, token)
+
+
+def test_lru_evicts_least_recently_used():
+    cache = PredictionCache(2, 0, 4)
+    a, b, c = (_key(cache, latitude=value) for value in (41.0, 42.0, 43.0))
+    cache.put(a, 1.0)
+    cache.put(b, 2.0)
+    assert cache.get(a) == 1.0  # a is now the most recently used
+    cache.put(c, 3.0)
+    assert cache.get(b) is None
+    assert (cache.get(a), cache.get(c)) == (1.0, 3.0)
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["entries"] == 2
+
+
+def test_entries_expire_after_ttl():
+    clock = _Clock()
+    cache = PredictionCache(10, 60, 4, clock=clock)
+    key = _key(cache)
+    cache.put(key, 1.0)
+    clock.now += 59.9
+    assert cache.get(key) == 1.0
+    clock.now += 0.1
+    assert cache.get(key) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+    forever = PredictionCache(10, 0, 4, clock=clock)  # a zero TTL never expires
+    forever.put(key, 2.0)
+    clock.now += 1e9
+    assert forever.get(key) == 2.0
+
+
+def test_invalidate_by_technology():
+    cache = PredictionCache(10, 0, 4)
+    fm, other_fm, digital = _key(cache), _key(cache, latitude=42.0), _key(cache, technology="digital")
+    for key in (fm, other_fm, digital):
+        cache.put(key, 1.0)
+    assert cache.invalidate("fm") == 2
+    assert (cache.get(fm), cache.get(other_fm), cache.get(digital)) == (None, None, 1.0)
+    assert cache.invalidate() == 1
+    assert cache.stats()["invalidations"] == 3
+
+
+def test_key_depends_on_model_token_and_rounded_features():
+    cache = PredictionCache(10, 0, 4)
+    key = _key(cache)
+    assert _key(cache, token=("best_fm_model", 2)) != key  # same version, reloaded
+    assert _key(cache, token=("best_fm_model-shifted", 1)) != key
+    assert _key(cache, latitude=41.00001) == key
+    assert _key(cache, latitude=41.001) != key
+    assert cache.key("fm", {"latitude": -0.0}, _TOKEN) == cache.key("fm", {"latitude": 0.0}, _TOKEN)
+
+
+def test_disabled_cache_stores_nothing():
+    cache = PredictionCache(0, 60, 4)
+    key = _key(cache)
+    cache.put(key, 1.0)
+    assert cache.get(key) is None
+    assert cache.stats()["enabled"] is False
+    assert cache.stats()["misses"] == 0
+
+
+def test_reload_stops_serving_cached_values(artifacts, fm_payload):
+    config = replace(ServiceConfig.from_env(), fm_model_path=artifacts, cache_max_entries=100, table_enabled=False)
+    predictor = SignalPredictorService(config)
+    first = predictor.predict(fm_payload)["field_dbuv_m"]
+    assert predictor.predict(fm_payload)["field_dbuv_m"] == first
+    assert predictor.cache_stats()["hits"] == 1
+
+    token = predictor._models.model_token("fm")
+    predictor.reload_model("fm")
+    assert predictor._models.model_token("fm") != token
+    assert predictor.cache_stats()["entries"] == 0
+    assert predictor.predict(fm_payload)["field_dbuv_m"] == pytest.approx(first)
+    assert predictor.cache_stats()["hits"] == 1  # scored by the new model, not served from the cache
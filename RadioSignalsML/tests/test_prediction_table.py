@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from service import prediction_table
+from service.config import ServiceConfig
+from service.feature_mapping import build_feature_vector
+from service.model_store import synthetic_rows
+from service.prediction_table import PredictionTable, feature_key, table_path_for
+from service.predictor import SignalPredictorService
+
+_ROWS = [{"latitude": 41.0 + i / 100, "program_id": f"P{i % 3}", "fm_freq_mhz": 88 + i} for i in range(40)]
+
+
+def test_feature_key_is_stable_across_number_types():
+    row = {"fm_freq_mhz": 101, "latitude": 0.0, "program_id": "МРА 3"}
+    key = feature_key("fm", row, 4)
+    assert feature_key("fm", {**row, "fm_freq_mhz": 101.0}, 4) == key
+    assert feature_key("fm", {**row, "fm_freq_mhz": np.float32(101.0)}, 4) == key
+    assert feature_key("fm", {**row, "latitude": -0.0}, 4) == key
+    assert feature_key("fm", {**row, "latitude": 0.00001}, 4) == key  # rounded at the cache precision
+    assert feature_key("fm", {**row, "program_id": np.str_("МРА 3")}, 4) == key
+    assert feature_key("fm", dict(reversed(list(row.items()))), 4) == key
+    assert feature_key("fm", {**row, "latitude": 0.001}, 4) != key
+    assert feature_key("digital", row, 4) != key
+    assert key[0] != 0
+
+
+def test_build_save_open_round_trip(tmp_path):
+    values = [float(i) for i in range(len(_ROWS))]
+    stored = values + [-1.0] * 5
+    built = PredictionTable.build("fm", _ROWS + _ROWS[:5], stored, 4, model_version="best_fm_model")
+    assert (len(built), built.meta["duplicates"]) == (len(_ROWS), 5)  # repeated rows keep their first value
+    opened = PredictionTable.open(built.save(tmp_path / "t.table"))
+    assert isinstance(opened.keys, np.memmap)
+    assert opened.model_version == "best_fm_model"
+    assert [opened.get(row) for row in _ROWS] == values
+    assert opened.get({**_ROWS[0], "latitude": 50.0}) is None
+    assert opened.probe_values.tolist() == [stored[i] for i in np.unique(np.linspace(0, 44, 16).astype(int))]
+    assert PredictionTable.open(tmp_path / "absent.table") is None
+
+
+def test_linear_probing_resolves_collisions(monkeypatch):
+    real = prediction_table.feature_key
+
+    def colliding(technology, features, precision):
+        high, low = real(technology, features, precision)
+        return (high & ~0xFFFF) | 3, low  # every row starts probing at slot 3
+
+    monkeypatch.setattr(prediction_table, "feature_key", colliding)
+    table = PredictionTable.build("fm", _ROWS, list(range(len(_ROWS))), 4, model_version="m")
+    assert [table.get(row) for row in _ROWS] == list(range(len(_ROWS)))
+    assert table.get({**_ROWS[0], "latitude": 50.0}) is None  # walks the whole run, then hits an empty slot
+    occupied = np.flatnonzero(table.keys[:, 0])
+    assert occupied.tolist() == list(range(3, 3 + len(_ROWS)))
+
+
+@pytest.fixture()
+def predictor(artifacts):
+    config = replace(ServiceConfig.from_env(), fm_model_path=artifacts, cache_max_entries=0, table_enabled=True)
+    return SignalPredictorService(config)
+
+
+def _save_table(predictor, artifacts, rows, values, **meta):
+    meta.setdefault("model_version", "best_fm_model")
+    PredictionTable.build("fm", rows, values, 4, **meta).save(table_path_for(artifacts))
+
+
+def test_table_answers_predict_when_probes_agree(predictor, artifacts, fm_payload, monkeypatch):
+    rows = synthetic_rows(predictor._models._load("fm").model, 1)
+    rows.append(build_feature_vector(fm_payload, predictor._lookup, predictor._settlements).features)
+    values = predictor._models.replay("fm", rows)
+    _save_table(predictor, artifacts, rows, values.tolist())
+
+    def live(vector):
+        raise AssertionError("scored live instead of from the table")
+
+    monkeypatch.setattr(predictor._models, "predict", live)
+    assert predictor.predict(fm_payload)["field_dbuv_m"] == values[-1]
+
+
+@pytest.mark.parametrize("stale", ["model_version", "probes"])
+def test_table_ignored_when_built_for_another_model(predictor, artifacts, stale):
+    rows = synthetic_rows(predictor._models._load("fm").model, 1)
+    values = predictor._models.replay("fm", rows)
+    _save_table(predictor, artifacts, rows, values.tolist())
+    assert predictor._open_table("fm", "best_fm_model") is not None
+    if stale == "model_version":
+        _save_table(predictor, artifacts, rows, values.tolist(), model_version="best_fm_model-20240101T000000")
+    else:
+        _save_table(predictor, artifacts, rows, (values + 1.0).tolist())
+    assert predictor._open_table("fm", "best_fm_model") is None
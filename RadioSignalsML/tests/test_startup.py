@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from benchmarks.startup import HEAVY_MODULES, check_budget, run_startup
+from service.config import ServiceConfig
+
+
+def test_cold_start_within_budget_and_without_heavy_modules():
+    # same check as `python -m benchmarks startup`: median of fresh interpreters against STARTUP_BUDGET_MS
+    result = run_startup(runs=3)
+    assert not check_budget(result, ServiceConfig.from_env().startup_budget_ms)
+    assert not set(result["heavy_modules"]) & set(HEAVY_MODULES)
+
+
+def test_check_budget_flags_slow_starts_and_heavy_imports():
+    result = {"p50_ms": 2500.0, "heavy_modules": ["sklearn"]}
+    problems = check_budget(result, 2000.0)
+    assert len(problems) == 2 and "over the 2000 ms budget" in problems[0] and "sklearn" in problems[1]
+    assert check_budget({"p50_ms": 2500.0, "heavy_modules": []}, 0.0) == []
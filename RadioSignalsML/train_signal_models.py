@@ -1,4 +1,4 @@
-import os, re, json, math, argparse, warnings
+import os, re, copy, json, math, time, shutil, argparse, hashlib, tempfile, warnings
 from pathlib import Path
 import numpy as np
 import pandas as pd
@@ -87,7 +87,6 @@ def extract_channel_or_freq(chfreq_val):
 
 
 def load_and_clean(excel_path):
-    xls = pd.ExcelFile(excel_path)
     raw = pd.read_excel(excel_path, sheet_name=0)
     df = rebuild_dataframe(raw)
 
@@ -157,6 +156,334 @@ def load_and_clean(excel_path):
     return data
 
 
+# Columnar cleaning: same output frame as load_and_clean, built with column-wide string ops instead of row loops.
+def normalize_column(col):
+    text = col.astype(str).str.replace("\u200b", "", regex=False).str.strip()
+    return text.where(col.notna(), col)
+
+
+def rebuild_dataframe_columnar(df, needed=None):
+    # Same header reconstruction as rebuild_dataframe (including .loc's expansion of duplicate labels);
+    # only `needed` columns are normalized here, the coordinate block is normalized by parse_dms_block
+    header_row = df.iloc[0].astype(str).tolist()
+    df2 = df.iloc[1:].reset_index(drop=True)
+    df2.columns = header_row
+    df2 = df2.loc[:, [c for c in df2.columns if isinstance(c, str) and c.strip() != ""]]
+    df2.columns = [normalize_text(c) for c in df2.columns]
+    for i, c in enumerate(df2.columns):
+        if needed is None or c in needed:
+            df2.isetitem(i, normalize_column(df2.iloc[:, i]))
+    return df2
+
+
+def parse_dms_block(block):
+    # Vectorized parse_dms_block_row: first "N"/"E" token per row, then the next three numeric tokens after each
+    n = len(block)
+    tokens = [normalize_column(block.iloc[:, j]).fillna("").astype(str).str.strip()
+              .str.replace("Е", "E", regex=False).str.replace("е", "e", regex=False) for j in range(block.shape[1])]
+    if not tokens: return np.full(n, np.nan), np.full(n, np.nan)
+    tok = np.column_stack([t.to_numpy(dtype=object) for t in tokens])
+    dotted = [t.str.replace(",", ".", regex=False) for t in tokens]
+    is_num = np.column_stack([d.str.match(r"^-?\d+(\.\d+)?$").to_numpy(dtype=bool) for d in dotted])
+    vals = np.column_stack([pd.to_numeric(d.where(m), errors="coerce").to_numpy(dtype=float)
+                            for d, m in zip(dotted, is_num.T)])
+    pos = np.arange(tok.shape[1])
+
+    def after(marker):
+        hit = tok == marker
+        found = hit.any(axis=1)
+        first = np.where(found, hit.argmax(axis=1), tok.shape[1])
+        cand = is_num & (pos[None, :] > first[:, None])
+        rank = np.cumsum(cand, axis=1)
+        parts = [np.where(cand & (rank == k), vals, 0.0).sum(axis=1) for k in (1, 2, 3)]
+        ok = found & (rank[:, -1] >= 3)
+        return parts, ok
+
+    (nd, nm, ns), n_ok = after("N")
+    (ed, em, es), e_ok = after("E")
+    ok = n_ok & e_ok
+    lat = np.where(ok, nd + nm / 60 + ns / 3600, np.nan)
+    lon = np.where(ok, ed + em / 60 + es / 3600, np.nan)
+    return lat, lon
+
+
+def parse_dates(col):
+    s = col.astype(str).str.strip().str.replace(".", "/", regex=False).str.replace(",", "/", regex=False) \
+        .str.replace("-", "/", regex=False)
+    out = pd.Series(pd.NaT, index=col.index, dtype="datetime64[ns]")
+    todo = col.notna()
+    for fmt in ("%d/%m/%Y", "%d/%m/%y", "%Y/%m/%d", "%d/%m/%Y %H:%M:%S"):
+        if not todo.any(): break
+        parsed = pd.to_datetime(s[todo], format=fmt, errors="coerce")
+        out[parsed.index] = parsed
+        todo &= out.isna()
+    if todo.any():
+        out[todo] = pd.to_datetime(s[todo], errors="coerce", dayfirst=True, format="mixed")
+    return out
+
+
+def parse_field_strengths(col):
+    s = col.astype(str).str.strip().str.replace(",", ".", regex=False)
+    val = pd.to_numeric(s.str.extract(r"(\d+(?:\.\d+)?)")[0], errors="coerce").to_numpy(dtype=float)
+    val = np.where(s.str.contains("<", regex=False).to_numpy(dtype=bool), np.maximum(0.0, val - 0.1), val)
+    return pd.Series(np.where(col.notna().to_numpy(), val, np.nan), index=col.index)
+
+
+def _text_lower(col):
+    # str(x or "").lower(): None -> "", NaN stays "nan"
+    return col.astype(str).where(~col.map(lambda v: v is None or v == ""), "").str.lower()
+
+
+def detect_techs(settlement_raw, chfreq, program):
+    st, s, p = _text_lower(settlement_raw), _text_lower(chfreq), _text_lower(program)
+    num = pd.to_numeric(s.str.extract(r"(-?\d+(?:[.,]\d+)?)")[0].str.replace(",", ".", regex=False),
+                        errors="coerce").to_numpy(dtype=float)
+    has = ~np.isnan(num)
+    is_int = has & (np.mod(num, 1) == 0)
+    conds = [s.str.contains("дигитал", regex=False).to_numpy(dtype=bool),
+             (st.str.contains("ф.м", regex=False) | st.str.contains("фм", regex=False)).to_numpy(dtype=bool),
+             (p.str.contains("мра", regex=False) | p.str.contains("радио", regex=False)).to_numpy(dtype=bool),
+             is_int & (num >= 21) & (num <= 65),
+             has & (num >= 87.0) & (num <= 107.9),
+             has & (num >= 65.0) & (num < 70.0),
+             p.str.contains("мтв", regex=False).to_numpy(dtype=bool)]
+    tech = np.select(conds, ["digital", "fm", "fm", "digital", "fm", "fm", "digital"], default=None)
+
+    digital_tag = conds[0]
+    tv = np.where(digital_tag, np.trunc(num), np.where(is_int & (num >= 21) & (num <= 65), num, np.nan))
+    fm_band = has & ~(is_int & (num >= 21) & (num <= 65)) & (((num >= 87.0) & (num <= 107.9)) | ((num >= 65.0) & (num < 70.0)))
+    fm = np.where(~digital_tag & fm_band, num, np.nan)
+    return tech, tv, fm
+
+
+def load_and_clean_columnar(excel_path):
+    raw = pd.read_excel(excel_path, sheet_name=0)
+    return clean_raw_sheet(raw)
+
+
+SHEET_HEADERS = ["Општина", "Населено место", "Матичен број", "Население", "Домаќинства", "Дата", "Потесна локација",
+                 "Надм.височина(м)", "Канал-Фрекв.", "Програма-Идентиф.", "Објект од каде се емитира",
+                 "Ел.поле(dBµV/m)", "Ел.поле(dBμV/m)"]  # the last two are spellings of the same column
+
+
+def clean_raw_sheet(raw):
+    headers = SHEET_HEADERS
+    df = rebuild_dataframe_columnar(raw, set(headers))
+
+    cols = df.columns.tolist()
+    coord_slice = (cols.index("Координати"), cols.index("Надм.височина(м)")) if (
+            "Координати" in cols and "Надм.височина(м)" in cols) else None
+    target_hdr = "Ел.поле(dBµV/m)" if "Ел.поле(dBµV/m)" in df.columns else "Ел.поле(dBμV/m)"
+    cores = headers[:11] + [target_hdr]
+    rename = {cores[0]: "municipality", cores[1]: "settlement_raw", cores[2]: "place_id", cores[3]: "population",
+              cores[4]: "households", cores[5]: "date", cores[6]: "sublocation", cores[7]: "elevation_m",
+              cores[8]: "ch_freq_raw", cores[9]: "program_id", cores[10]: "emitter", cores[11]: "field_dbuv_m"}
+    data = df[cores].rename(columns=rename).copy()
+
+    if coord_slice is None:
+        lat = lon = np.full(len(df), np.nan)
+    else:
+        lat, lon = parse_dms_block(df.iloc[:, coord_slice[0]:coord_slice[1]])
+    data["latitude"], data["longitude"] = lat, lon
+
+    data["date"] = parse_dates(data["date"])
+    data["field_dbuv_m"] = parse_field_strengths(data["field_dbuv_m"])
+    data["elevation_m"] = pd.to_numeric(
+        data["elevation_m"].astype(str).str.replace(",", ".").str.extract(r"([\-]?\d+(\.\d+)?)")[0], errors="coerce")
+    data["settlement"] = (
+        data["settlement_raw"].astype(str).str.replace(r"\*\*", "", regex=True).str.replace(r"\(.*?\)", "",
+                                                                                            regex=True).str.strip())
+    data["tech"], data["tv_channel"], data["fm_freq_mhz"] = detect_techs(
+        data["settlement_raw"], data["ch_freq_raw"], data["program_id"])
+
+    data["year"], data["month"] = data["date"].dt.year, data["date"].dt.month
+    data = data[data["field_dbuv_m"].notna()].copy()
+    return data
+
+
+# Streaming ingestion: openpyxl read-only rows are cleaned by clean_raw_sheet in fixed-size chunks, so only one
+# chunk of raw cells is in memory at a time instead of the whole sheet plus its copies.
+STREAM_CHUNK_ROWS = 5000
+# clean_raw_sheet costs ~0.1 s per call whatever the chunk size, so smaller chunks are raised to this
+MIN_STREAM_CHUNK_ROWS = 1000
+# strings pd.read_excel reads as NaN by default (its parser's na_values)
+EXCEL_NA_VALUES = frozenset({
+    "", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN", "<NA>", "N/A", "NA",
+    "NULL", "NaN", "None", "n/a", "nan", "null"})
+
+
+def _excel_cells(row, width, na):
+    # pd.read_excel's cell conversion: integral numbers become int; empty, NA-like and error cells become NaN
+    out = [np.nan if v is None or (v.__class__ is str and v in na) else
+           (int(v) if v.__class__ is float and v.is_integer() else v) for v in row]
+    return out + [np.nan] * (width - len(out))
+
+
+def open_workbook(excel_path):
+    from openpyxl import load_workbook
+    return load_workbook(excel_path, read_only=True, data_only=True, keep_links=False)
+
+
+def is_measurement_header(header):
+    """True when a sheet's header row has every column clean_raw_sheet selects."""
+    found = {normalize_text(v) for v in header if isinstance(v, str)}
+    return set(SHEET_HEADERS[:11]) <= found and bool(found & set(SHEET_HEADERS[11:]))
+
+
+def iter_sheet_chunks(excel_path, sheet=0, chunk_rows=STREAM_CHUNK_ROWS, measurement_only=False):
+    """Yields (offset, raw) per `chunk_rows` (at least MIN_STREAM_CHUNK_ROWS) measurement rows of one sheet.
+
+    `raw` starts with the sheet's header row, the layout clean_raw_sheet gets from pd.read_excel, and `offset` is
+    the position of its first measurement row, so chunk indexes line up with the whole-sheet frame.
+    `measurement_only` yields nothing for a sheet whose header row is not a measurement header."""
+    from openpyxl.cell.cell import ERROR_CODES
+    na = EXCEL_NA_VALUES | set(ERROR_CODES)
+    chunk_rows = max(int(chunk_rows), MIN_STREAM_CHUNK_ROWS)
+    wb = open_workbook(excel_path)
+    try:
+        ws = wb.worksheets[sheet] if isinstance(sheet, int) else wb[sheet]
+        width = ws.max_column or 0
+        rows = ws.iter_rows(values_only=True)
+        next(rows, None)  # first row: read_excel's column names, replaced by the header row below
+        header = next(rows, None)
+        if header is None or (measurement_only and not is_measurement_header(header)): return
+        header = _excel_cells(header, width, na)
+        chunk, offset = [], 0
+        for row in rows:
+            chunk.append(_excel_cells(row, width, na))
+            if len(chunk) == chunk_rows:
+                yield offset, pd.DataFrame([header] + chunk, dtype=object)
+                offset, chunk = offset + len(chunk), []
+        if chunk or not offset:
+            yield offset, pd.DataFrame([header] + chunk, dtype=object)
+    finally:
+        wb.close()
+
+
+def clean_sheet_streaming(excel_path, sheet=0, chunk_rows=STREAM_CHUNK_ROWS, measurement_only=False):
+    """Same frame as clean_raw_sheet(pd.read_excel(excel_path, sheet_name=sheet)), cleaned chunk by chunk;
+    None for a sheet `measurement_only` skips."""
+    parts = []
+    for offset, raw in iter_sheet_chunks(excel_path, sheet, chunk_rows, measurement_only):
+        part = clean_raw_sheet(raw)
+        part.index = part.index + offset
+        if len(part) or not parts:
+            parts.append(part)
+    if not parts:
+        return None
+    parts = [p for p in parts if len(p)] or parts[:1]
+    return pd.concat(parts) if len(parts) > 1 else parts[0]
+
+
+def load_and_clean_streaming(excel_path, sheets=None, workers=1, chunk_rows=STREAM_CHUNK_ROWS):
+    """Cleaned frame read with openpyxl in read-only mode, `chunk_rows` rows at a time.
+
+    `sheets=None` cleans the first sheet: the frame load_and_clean_columnar returns.  `sheets="all"` (or a list
+    of names) cleans every measurement sheet, skipping sheets without the measurement header, in up to `workers`
+    processes, and concatenates them in workbook order with a `sheet` column and a fresh index."""
+    if sheets is None:
+        return clean_sheet_streaming(excel_path, 0, chunk_rows)
+    if sheets == "all":
+        wb = open_workbook(excel_path)
+        sheets = list(wb.sheetnames)
+        wb.close()
+    jobs = [(excel_path, sheet, chunk_rows, True) for sheet in sheets]
+    if workers > 1 and len(sheets) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=min(workers, len(sheets))) as pool:
+            frames = list(pool.map(clean_sheet_streaming, *zip(*jobs)))
+    else:
+        frames = [clean_sheet_streaming(*job) for job in jobs]
+    frames = [f.assign(sheet=name) for name, f in zip(sheets, frames) if f is not None]
+    if not frames:
+        raise ValueError(f"No sheet of {excel_path} has the measurement header ({', '.join(SHEET_HEADERS[:11])}, ...)")
+    return pd.concat(frames, ignore_index=True)
+
+
+# Cleaned-frame cache: Feather file keyed by the workbook bytes and CLEANING_VERSION.  Reads memory-map the file
+# rather than buffer it, but to_pandas() still copies: the string columns become Python objects either way.
+CLEANING_VERSION = "1"  # bump whenever clean_raw_sheet / load_and_clean change their output
+DEFAULT_CACHE_DIR = ".cache"
+
+
+def ensure_cache_dir(path):
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    (path / ".gitignore").write_text("*\n", encoding="utf-8")
+    return path
+
+
+def cleaned_cache_path(excel_path, cache_dir=DEFAULT_CACHE_DIR, sheets=None):
+    digest = hashlib.sha256()
+    with open(excel_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    digest.update(f"cleaning-v{CLEANING_VERSION}".encode())
+    if sheets is not None:  # the first sheet keeps its original key
+        digest.update(f"sheets-{json.dumps(sheets, ensure_ascii=False)}".encode())
+    return Path(cache_dir) / f"cleaned_{Path(excel_path).stem}_{digest.hexdigest()[:16]}.feather"
+
+
+def write_cleaned_cache(data, path):
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    # Arrow has a single null; remember whether each object column used None or NaN so reads round-trip exactly
+    nulls = {c: ("none" if all(v is None for v in data[c][data[c].isna()]) else "nan")
+             for c in data.columns if data[c].dtype == object and data[c].isna().any()}
+    table = pa.Table.from_pandas(data, preserve_index=True)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"radiosignals.nulls": json.dumps(nulls).encode()})
+    ensure_cache_dir(path.parent)
+    tmp = path.with_suffix(".tmp")
+    feather.write_feather(table, tmp, compression="uncompressed")  # uncompressed so reads can memory-map
+    os.replace(tmp, path)
+
+
+def read_cleaned_cache(path):
+    import pyarrow.feather as feather
+    table = feather.read_table(path, memory_map=True)
+    data = table.to_pandas()
+    nulls = json.loads((table.schema.metadata or {}).get(b"radiosignals.nulls", b"{}"))
+    for c, kind in nulls.items():
+        if kind == "nan":
+            data[c] = data[c].where(data[c].notna(), np.nan)
+    return data
+
+
+def load_cleaned(excel_path, cache_dir=DEFAULT_CACHE_DIR, rebuild=False, stream=False, sheets=None, workers=1,
+                 chunk_rows=STREAM_CHUNK_ROWS):
+    """Cleaned training frame; reuses the Feather cache for this workbook unless `rebuild` or `cache_dir` is None.
+    `stream` (implied by `sheets`) cleans with load_and_clean_streaming instead of one pd.read_excel."""
+    def clean():
+        if stream or sheets is not None:
+            return load_and_clean_streaming(excel_path, sheets, workers, chunk_rows)
+        return load_and_clean_columnar(excel_path)
+
+    if cache_dir is None:
+        return clean()
+    path = cleaned_cache_path(excel_path, cache_dir, sheets)
+    if path.exists() and not rebuild:
+        return read_cleaned_cache(path)
+    data = clean()
+    write_cleaned_cache(data, path)
+    return data
+
+
+def check_cleaning_equivalence(excel_path, chunk_rows=STREAM_CHUNK_ROWS):
+    """Compares load_and_clean_columnar and load_and_clean_streaming against the row-wise load_and_clean;
+    raises AssertionError on mismatch."""
+    t0 = time.perf_counter()
+    rowwise = load_and_clean(excel_path)
+    t1 = time.perf_counter()
+    columnar = load_and_clean_columnar(excel_path)
+    t2 = time.perf_counter()
+    streaming = load_and_clean_streaming(excel_path, chunk_rows=chunk_rows)
+    t3 = time.perf_counter()
+    pd.testing.assert_frame_equal(rowwise, columnar, check_dtype=False)
+    pd.testing.assert_frame_equal(columnar, streaming)
+    return {"rows": int(len(columnar)), "rowwise_seconds": t1 - t0, "columnar_seconds": t2 - t1,
+            "streaming_seconds": t3 - t2}
+
+
 def prepare_subset(data, tech):
     if tech == "digital":
         s = data[(data["tech"] == "digital") & (data["tv_channel"].notna())].copy()
@@ -170,16 +497,24 @@ def prepare_subset(data, tech):
 
 
 # Modeling
+from sklearn.base import clone
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
 from sklearn.impute import SimpleImputer
 from sklearn.preprocessing import OneHotEncoder, StandardScaler
 from sklearn.tree import DecisionTreeRegressor
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import RandomizedSearchCV, GroupKFold, GroupShuffleSplit, cross_validate
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401  (registers HalvingRandomSearchCV)
+from sklearn.model_selection import (RandomizedSearchCV, HalvingRandomSearchCV, GroupKFold, GroupShuffleSplit,
+                                     cross_validate)
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import joblib
 
+from service.compiled_model import compile_pipeline, compiled_path_for, mapped_path_for
+
+JOBLIB_COMPRESS = 3  # zlib level for .joblib artifacts
+MIN_PRUNED_TREES = 25
+
 
 def build_preprocessor(numeric, categorical, rare_threshold=10):
     num = Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
@@ -188,7 +523,33 @@ def build_preprocessor(numeric, categorical, rare_threshold=10):
     return ColumnTransformer([("num", num, numeric), ("cat", cat, categorical)])
 
 
-def train(subset, tech, out_dir, random_iter=15):
+def technology_memory(memory, tech):
+    """`memory` narrowed to a `tech` subfolder: technologies never share a fit (different rows), and
+    pipeline_cache_report then counts only this technology's fits while the other trains in parallel."""
+    if memory is None:
+        return None
+    return joblib.Memory(ensure_cache_dir(Path(memory.location) / tech), verbose=0)
+
+
+def pipeline_cache_report(memory, since, requested):
+    """Summarises preprocessor fits computed vs. reused from a Pipeline(memory=...) cache since `since` (epoch s);
+    `memory` must be the technology's own (technology_memory), so only its fits are counted."""
+    durations, fresh = [], []
+    for meta in Path(memory.location).glob("**/_fit_transform_one/*/metadata.json"):
+        info = json.loads(meta.read_text(encoding="utf-8"))
+        durations.append(float(info.get("duration", 0.0)))
+        if info.get("time", 0) >= since:
+            fresh.append(durations[-1])
+    computed = len(fresh)
+    # reused fits are priced at what computing them cost (fits from earlier runs when nothing was computed now)
+    mean_fit = float(np.mean(fresh or durations)) if durations else 0.0
+    reused = max(0, requested - computed)
+    return {"preprocessor_fits_requested": requested, "preprocessor_fits_computed": computed,
+            "preprocessor_fits_reused": reused, "mean_fit_seconds": mean_fit,
+            "estimated_seconds_saved": reused * mean_fit}
+
+
+def feature_frame(subset, tech):
     target = "field_dbuv_m"
     num = ["latitude", "longitude", "elevation_m", "year", "month", "population", "households"] + (
         ["tv_channel"] if tech == "digital" else ["fm_freq_mhz"])
@@ -200,11 +561,163 @@ def train(subset, tech, out_dir, random_iter=15):
     X = subset[num + cat].copy();
     y = subset[target].astype(float).values;
     groups = subset["group_key"].astype(str).values
+    return X, y, groups, num, cat
+
+
+# Row fingerprints: identity of a cleaned measurement, persisted per technology so incremental runs ingest only new rows
+FINGERPRINT_COLUMNS = ["municipality", "settlement_raw", "place_id", "date", "sublocation", "elevation_m", "ch_freq_raw",
+                       "program_id", "emitter", "field_dbuv_m", "latitude", "longitude"]
+
+
+def row_fingerprints(subset):
+    hashed = pd.util.hash_pandas_object(subset[FINGERPRINT_COLUMNS].astype(str), index=False)
+    return np.array([f"{h:016x}" for h in hashed.to_numpy()], dtype=object)
+
+
+def fingerprints_path(out_dir, tech):
+    return Path(out_dir) / f"seen_rows_{tech}.json"
+
+
+def load_fingerprints(out_dir, tech):
+    """(rows fitted, rows held out of the last update and not fitted yet), or None before fingerprinting."""
+    path = fingerprints_path(out_dir, tech)
+    if not path.exists():
+        return None
+    recorded = json.loads(path.read_text(encoding="utf-8"))
+    return set(recorded["fingerprints"]), set(recorded.get("holdout", ()))
+
+
+def save_fingerprints(out_dir, tech, fingerprints, version, holdout=()):
+    path = fingerprints_path(out_dir, tech)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": version, "fingerprints": sorted(set(fingerprints)),
+                               "holdout": sorted(set(holdout))}), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def regression_metrics(y_true, y_pred):
+    return {"rmse": float(math.sqrt(mean_squared_error(y_true, y_pred))),
+            "mae": float(mean_absolute_error(y_true, y_pred)),
+            "r2": float(r2_score(y_true, y_pred)) if len(y_true) > 1 else None, "n_test": int(len(y_true))}
+
+
+def save_artifacts(pipeline, model_path):
+    """Writes a compressed .joblib plus compact (int32/float32 node arrays) .npz and .model/; returns the latter."""
+    joblib.dump(pipeline, model_path, compress=JOBLIB_COMPRESS)
+    compiled = compile_pipeline(pipeline, model_path).compact()
+    compiled.save(compiled_path_for(model_path), compress=True)
+    compiled.save_mapped(mapped_path_for(model_path))
+    return compiled
+
+
+def artifact_sizes(model_path):
+    mapped = mapped_path_for(model_path)
+    return {"joblib": model_path.stat().st_size, "npz": compiled_path_for(model_path).stat().st_size,
+            "model_dir": sum(p.stat().st_size for p in mapped.iterdir())}
+
+
+def uncompacted_sizes(pipeline):
+    """Artifact sizes without compaction: plain joblib and float64/intp node arrays, as written before."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "model.joblib"
+        joblib.dump(pipeline, path)
+        compiled = compile_pipeline(pipeline)
+        compiled.save(compiled_path_for(path))
+        compiled.save_mapped(mapped_path_for(path))
+        return artifact_sizes(path)
+
+
+def greedy_tree_subset(per_tree, y, tolerance, min_trees=MIN_PRUNED_TREES):
+    """Forward selection over an ensemble's (n_trees, n_rows) outputs: adds the tree that lowers RMSE on `y` most
+    until RMSE is within `tolerance` (a fraction) of the full ensemble's.  Greedy, so the subset is small rather
+    than provably smallest; `min_trees` keeps a few-row holdout from being matched by a handful of trees.
+    Returns (tree indices in pick order, full RMSE, subset RMSE)."""
+    full = float(np.sqrt(np.mean((per_tree.mean(axis=0) - y) ** 2)))
+    total, chosen = np.zeros(per_tree.shape[1]), []
+    remaining = np.ones(per_tree.shape[0], dtype=bool)
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        rmse = np.sqrt((((total + per_tree[candidates]) / (len(chosen) + 1) - y) ** 2).mean(axis=1))
+        pick = int(candidates[np.argmin(rmse)])
+        chosen.append(pick)
+        total += per_tree[pick]
+        remaining[pick] = False
+        if len(chosen) >= min_trees and rmse.min() <= full * (1 + tolerance):
+            return chosen, full, float(rmse.min())
+    return chosen, full, full
+
+
+def prune_forest(pipeline, X_select, y_select, tolerance):
+    """Keeps only the trees greedy_tree_subset picks on the selection rows; None for single trees."""
+    forest = pipeline.named_steps["model"]
+    if not isinstance(forest, RandomForestRegressor) or not len(X_select):
+        return None
+    compiled = compile_pipeline(pipeline)  # per-tree outputs in estimators_ order
+    per_tree = compiled.tree_predictions(compiled.transform(X_select))
+    chosen, full, kept = greedy_tree_subset(per_tree, y_select, tolerance)
+    before = len(forest.estimators_)
+    forest.estimators_ = [forest.estimators_[i] for i in sorted(chosen)]
+    forest.n_estimators = len(forest.estimators_)
+    return {"trees_before": before, "trees_after": forest.n_estimators, "tolerance": tolerance,
+            "selection_rows": int(len(X_select)), "selection_rmse_full": full, "selection_rmse_kept": kept}
+
+
+def split_holdout(te, groups):
+    """Halves the holdout by group: trees are picked on one half and the compaction report scores the other."""
+    if len(np.unique(groups[te])) < 2:
+        return te, te
+    a, b = next(GroupShuffleSplit(n_splits=1, test_size=0.5, random_state=42).split(te, groups=groups[te]))
+    return te[a], te[b]
+
+
+def best_ms(fn, repeats=20):
+    best = math.inf
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return round(best * 1000, 3)
+
+
+def compaction_report(tech, full, compact, X_check, y_check, sizes_before, sizes_after, pruning):
+    """Size, accuracy and compiled-latency comparison of the full and the saved (compact) model."""
+    full_compiled, compact_compiled = compile_pipeline(full), compile_pipeline(compact).compact()
+    report = {"tech": tech, "pruning": pruning, "size_bytes": {"before": sizes_before, "after": sizes_after},
+              "node_array_bytes": {"before": full_compiled.nbytes, "after": compact_compiled.nbytes},
+              "trees": {"before": full_compiled.n_trees, "after": compact_compiled.n_trees}}
+    if len(X_check):
+        expected = compact.predict(X_check)
+        report["holdout"] = {"rows": int(len(X_check)), "full": regression_metrics(y_check, full.predict(X_check)),
+                             "compact": regression_metrics(y_check, expected)}
+        report["max_abs_diff_compiled_db"] = float(np.max(np.abs(compact_compiled.predict(X_check) - expected)))
+        report["latency_ms"] = {
+            f"batch{n}": {"before": best_ms(lambda: full_compiled.predict(X_check.iloc[:n])),
+                          "after": best_ms(lambda: compact_compiled.predict(X_check.iloc[:n]))}
+            for n in sorted({1, len(X_check)})}
+    return report
+
+
+def train(subset, tech, out_dir, random_iter=15, memory=None, search_mode="random", halving_factor=3, cores=-1,
+          prune_tolerance=None):
+    # `cores` is this technology's whole budget: spent on parallel candidates/folds, never nested inside a forest
+    timings = {}
+    stage_start = time.perf_counter()
+
+    def stage(name):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[name] = round(now - stage_start, 3)
+        stage_start = now
+
+    memory = technology_memory(memory, tech)
+    fingerprints = row_fingerprints(subset)
+    X, y, groups, num, cat = feature_frame(subset, tech)
     gkf = GroupKFold(n_splits=5 if len(np.unique(groups)) >= 5 else max(2, len(np.unique(groups))))
     pre = build_preprocessor(num, cat, 10)
+    stage("prepare")
 
     dt = DecisionTreeRegressor(random_state=42)
-    rf = RandomForestRegressor(random_state=42, n_estimators=300, n_jobs=-1)
+    rf = RandomForestRegressor(random_state=42, n_estimators=300, n_jobs=1)
 
     dt_params = {"model__max_depth": list(range(3, 26)), "model__min_samples_split": [2, 5, 10, 15],
                  "model__min_samples_leaf": [1, 2, 4, 8], "model__max_features": ["sqrt", "log2", 0.6, 0.8, None]}
@@ -212,22 +725,51 @@ def train(subset, tech, out_dir, random_iter=15):
                  "model__min_samples_split": [2, 5, 10], "model__min_samples_leaf": [1, 2, 4],
                  "model__max_features": ["sqrt", "log2", 0.5, None], "model__bootstrap": [True]}
 
-    def fit_search(model, params, iters):
-        pipe = Pipeline([("pre", pre), ("model", model)])
-        search = RandomizedSearchCV(pipe, params, n_iter=iters, cv=gkf.split(X, y, groups=groups), n_jobs=-1,
-                                    scoring="neg_root_mean_squared_error", random_state=42, verbose=0)
-        search.fit(X, y)
+    # Pipeline(memory=...) fits `pre` once per training split and reuses the encoded matrix for every candidate
+    # of both searches, cross_validate and later runs on the same data; the requested-fit count feeds the report
+    started, requested = time.time(), 1  # +1: holdout refit
+    search_info = {"mode": search_mode}
+    n_splits = gkf.get_n_splits(X, y, groups)
+
+    def make_search(pipe, params, iters):
+        if search_mode == "random":
+            return RandomizedSearchCV(pipe, params, n_iter=iters, cv=gkf, n_jobs=cores,
+                                      scoring="neg_root_mean_squared_error", random_state=42, verbose=0)
+        # successive halving over 3 rounds: each round costs roughly `iters` full-resource fits, so the search
+        # samples factor**2 / 3 times as many candidates and keeps the best 1/factor after each cheap round
+        rounds = 3
+        n_candidates = max(iters, iters * halving_factor ** (rounds - 1) // rounds)
+        if "model__n_estimators" in params:  # forests: trees are the resource, up to the largest grid value
+            params = {k: v for k, v in params.items() if k != "model__n_estimators"}
+            resource, max_res = "model__n_estimators", max(rf_params["model__n_estimators"])
+        else:  # single trees: training rows are the resource
+            resource, max_res = "n_samples", "auto"
+        return HalvingRandomSearchCV(pipe, params, n_candidates=n_candidates, factor=halving_factor,
+                                     resource=resource, min_resources="exhaust", max_resources=max_res, cv=gkf,
+                                     n_jobs=cores, scoring="neg_root_mean_squared_error", random_state=42, verbose=0)
+
+    def fit_search(model, params, iters, key):
+        nonlocal requested
+        pipe = Pipeline([("pre", pre), ("model", model)], memory=memory)
+        search = make_search(pipe, params, iters)
+        search.fit(X, y, groups=groups)
+        stage(f"{key}_search")
+        # candidates x folds (all halving rounds), best_estimator_ refit, cross_validate
+        requested += len(search.cv_results_["params"]) * n_splits + 1 + n_splits
+        search_info[type(model).__name__] = {"candidates": int(len(search.cv_results_["params"])),
+                                             "iterations": int(getattr(search, "n_iterations_", 1))}
         best = search.best_estimator_
         cv = cross_validate(best, X, y, cv=gkf.split(X, y, groups=groups),
                             scoring={"rmse": "neg_root_mean_squared_error", "mae": "neg_mean_absolute_error",
-                                     "r2": "r2"}, n_jobs=-1)
+                                     "r2": "r2"}, n_jobs=cores)
+        stage(f"{key}_cv")
         return best, {"cv_rmse_mean": float(np.mean(-cv["test_rmse"])), "cv_rmse_std": float(np.std(-cv["test_rmse"])),
                       "cv_mae_mean": float(np.mean(-cv["test_mae"])), "cv_mae_std": float(np.std(cv["test_mae"])),
                       "cv_r2_mean": float(np.mean(cv["test_r2"])), "cv_r2_std": float(np.std(cv["test_r2"])),
                       "best_params": search.best_params_}
 
-    best_dt, m_dt = fit_search(dt, dt_params, random_iter)
-    best_rf, m_rf = fit_search(rf, rf_params, random_iter)
+    best_dt, m_dt = fit_search(dt, dt_params, random_iter, "dt")
+    best_rf, m_rf = fit_search(rf, rf_params, random_iter, "rf")
 
     winner_name, winner = ("RandomForest", best_rf) if m_rf["cv_rmse_mean"] <= m_dt["cv_rmse_mean"] else (
     "DecisionTree", best_dt)
@@ -235,37 +777,269 @@ def train(subset, tech, out_dir, random_iter=15):
 
     gss = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
     tr, te = next(gss.split(X, y, groups=groups))
+    if winner_name == "RandomForest":  # a lone fit: let the forest itself use the whole budget
+        winner.set_params(model__n_jobs=cores)
     winner.fit(X.iloc[tr], y[tr]);
     yp = winner.predict(X.iloc[te])
-    holdout = {"rmse": float(math.sqrt(mean_squared_error(y[te], yp))), "mae": float(mean_absolute_error(y[te], yp)),
-               "r2": float(r2_score(y[te], yp)), "n_test": int(len(te))}
+    holdout = regression_metrics(y[te], yp)
+
+    cache_report = pipeline_cache_report(memory, started, requested) if memory is not None else None
+    winner.set_params(memory=None)  # artifacts must not reference the local cache folder
+    if winner_name == "RandomForest":
+        winner.set_params(model__n_jobs=-1)  # same inference setting the artifact always had
+    stage("holdout")
+
+    # compaction: optionally drop trees (picked on half the holdout groups, reported on the other half)
+    full, check, pruning = copy.deepcopy(winner), te, None
+    if prune_tolerance is not None:
+        select, check = split_holdout(te, groups)
+        pruning = prune_forest(winner, X.iloc[select], y[select], prune_tolerance)
+    sizes_before = uncompacted_sizes(full)
+    stage("compact")
 
     out_dir.mkdir(parents=True, exist_ok=True)
     model_path = out_dir / f"best_{tech}_model.joblib"
-    joblib.dump(winner, model_path)
+    # sklearn-free inference artifacts used by the service (MODEL_BACKEND=auto|compiled) are written alongside
+    save_artifacts(winner, model_path)
+    save_fingerprints(out_dir, tech, fingerprints, model_path.stem)
+    stage("save")
+    report = compaction_report(tech, full, winner, X.iloc[check], y[check], sizes_before, artifact_sizes(model_path),
+                               pruning)
+    (out_dir / f"compaction_{tech}.json").write_text(json.dumps(report, ensure_ascii=False, indent=2),
+                                                      encoding="utf-8")
+    stage("compaction_report")
 
     metrics = {"tech": tech, "winner": winner_name, "winner_cv": winner_metrics, "dt_cv": m_dt, "rf_cv": m_rf,
                "holdout": holdout, "rows": int(len(subset)), "groups": int(len(np.unique(groups))),
-               "features": {"numeric": num, "categorical": cat}}
+               "features": {"numeric": num, "categorical": cat}, "pipeline_cache": cache_report,
+               "search": search_info, "cores": cores, "compaction": pruning, "timings_seconds": timings}
     with open(out_dir / f"metrics_{tech}.json", "w", encoding="utf-8") as f:
         json.dump(metrics, f, ensure_ascii=False, indent=2)
     return metrics, str(model_path)
 
 
+def vocabulary_changed(pre, X_new, X_fit, cat):
+    """True when new rows bring a category that a refit encoder would give its own one-hot column.
+
+    Rarer newcomers fall into the infrequent/unknown bucket either way, so they do not change the encoding.
+    """
+    encoder = pre.named_transformers_["cat"].named_steps["onehot"]
+    min_frequency = encoder.min_frequency or 1
+    if isinstance(min_frequency, float):
+        min_frequency = math.ceil(min_frequency * len(X_fit))
+    infrequent = encoder.infrequent_categories_ if encoder.min_frequency else [None] * len(cat)
+    for c, known, rare in zip(cat, encoder.categories_, infrequent):
+        columns = set(known) - set(rare if rare is not None else ())
+        counts = X_fit[c].value_counts()
+        if any(counts.get(v, 0) >= min_frequency for v in set(X_new[c].dropna()) - columns):
+            return True
+    return False
+
+
+def publish(versioned, canonical):
+    # copy + rename so a reader of the canonical path never sees a half-written file
+    tmp = canonical.with_name(canonical.stem + ".tmp" + canonical.suffix)
+    shutil.copyfile(versioned, tmp)
+    os.replace(tmp, canonical)
+
+
+def update(subset, tech, out_dir, cores=-1, extra_trees=None):
+    """Refreshes best_{tech}_model.joblib with rows not seen before instead of re-running the search.
+
+    RandomForest winners grow warm-start trees on the new rows (as many as the new rows' share of the data, or
+    `extra_trees`); the preprocessor and model are refit with the same hyperparameters only when the categorical
+    vocabulary changed, or when the winner is a DecisionTree.  Holdout metrics come from new groups held out of
+    the update and are reported for the previous and the updated model; they are recorded as held out, not as
+    seen, so the next update trains on them (and never holds them out twice).  Returns (metrics, path) or None
+    when there is nothing to do.
+    """
+    timings = {}
+    stage_start = time.perf_counter()
+
+    def stage(name):
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[name] = round(now - stage_start, 3)
+        stage_start = now
+
+    out_dir = Path(out_dir)
+    model_path = out_dir / f"best_{tech}_model.joblib"
+    if not model_path.exists():
+        print(f"[{tech}] no {model_path} to update; run a full training first")
+        return None
+    fingerprints = row_fingerprints(subset)
+    recorded = load_fingerprints(out_dir, tech)
+    if recorded is None:  # artifact predates fingerprinting: treat every current row as already ingested
+        save_fingerprints(out_dir, tech, fingerprints, model_path.stem)
+        print(f"[{tech}] recorded {len(set(fingerprints))} rows as the baseline for incremental updates")
+        return None
+    seen, held_out = recorded
+    fresh = ~pd.Series(fingerprints).isin(seen).to_numpy()
+    if not fresh.any():
+        print(f"[{tech}] no new rows")
+        return None
+
+    X_all, y_all, groups_all, num, cat = feature_frame(subset, tech)
+    X_new, y_new, groups_new = X_all[fresh], y_all[fresh], groups_all[fresh]
+    # groups with rows held out of the previous update are trained on now; the holdout comes from the others
+    carried = pd.Series(fingerprints[fresh]).isin(held_out).to_numpy()
+    eligible = np.flatnonzero(~np.isin(groups_new, groups_new[carried]))
+    tr, te = np.arange(len(X_new)), np.arange(0)
+    if len(np.unique(groups_new[eligible])) >= 2:
+        gss = GroupShuffleSplit(n_splits=1, test_size=0.2, random_state=42)
+        te = eligible[next(gss.split(eligible, groups=groups_new[eligible]))[1]]
+        tr = np.setdiff1d(tr, te)
+    previous = joblib.load(model_path)
+    pre, model = previous.named_steps["pre"], previous.named_steps["model"]
+    holdout_before = regression_metrics(y_new[te], previous.predict(X_new.iloc[te])) if len(te) else None
+    stage("prepare")
+
+    keep = np.ones(len(X_all), dtype=bool)
+    keep[np.flatnonzero(fresh)[te]] = False  # new holdout groups stay out of every fit
+    if isinstance(model, RandomForestRegressor) and not vocabulary_changed(pre, X_new.iloc[tr], X_all[keep], cat):
+        n_seen = max(1, len(seen))
+        added = extra_trees or max(1, math.ceil(model.n_estimators * len(tr) / n_seen))
+        updated = copy.deepcopy(previous)
+        forest = updated.named_steps["model"]
+        forest.set_params(warm_start=True, n_estimators=forest.n_estimators + added, n_jobs=cores)
+        forest.fit(updated.named_steps["pre"].transform(X_new.iloc[tr]), y_new[tr])
+        forest.set_params(warm_start=False, n_jobs=-1)
+        strategy = {"strategy": "warm_start", "trees_added": int(added), "n_estimators": int(forest.n_estimators)}
+    else:
+        updated = clone(previous)
+        if isinstance(model, RandomForestRegressor):
+            updated.set_params(model__n_jobs=cores)
+        updated.fit(X_all[keep], y_all[keep])
+        if isinstance(model, RandomForestRegressor):
+            updated.set_params(model__n_jobs=-1)
+        strategy = {"strategy": "refit", "reason": "vocabulary_changed" if isinstance(model, RandomForestRegressor)
+                    else "decision_tree"}
+    stage("fit")
+    holdout = regression_metrics(y_new[te], updated.predict(X_new.iloc[te])) if len(te) else None
+
+    version = f"{model_path.stem}-{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}"
+    versioned = model_path.with_name(version + model_path.suffix)
+    compiled = save_artifacts(updated, versioned)
+    publish(versioned, model_path)
+    publish(compiled_path_for(versioned), compiled_path_for(model_path))
+    compiled.save_mapped(mapped_path_for(model_path))  # builds aside, then renames over the served directory
+    save_fingerprints(out_dir, tech, fingerprints[keep], version, holdout=fingerprints[~keep])
+    stage("save")
+
+    metrics_path = out_dir / f"metrics_{tech}.json"
+    metrics = json.loads(metrics_path.read_text(encoding="utf-8")) if metrics_path.exists() else {"tech": tech}
+    metrics.update({"holdout": holdout, "rows": int(len(subset)), "groups": int(len(np.unique(groups_all))),
+                    "version": version, "cores": cores, "timings_seconds": timings,
+                    "incremental": {"previous_version": metrics.get("version", model_path.stem),
+                                    "new_rows": int(fresh.sum()), "new_rows_trained": int(len(tr)),
+                                    "held_out_rows_trained": int(carried.sum()),
+                                    "holdout_before": holdout_before, **strategy}})
+    for path in (out_dir / f"metrics_{version}.json", metrics_path):
+        path.write_text(json.dumps(metrics, ensure_ascii=False, indent=2), encoding="utf-8")
+    return metrics, str(versioned)
+
+
+def resolve_cores(cores):
+    available = os.cpu_count() or 1
+    return available if cores is None or cores <= 0 else cores
+
+
+def plan_core_budgets(jobs, cores):
+    """Splits `cores` between technologies proportionally to rows x iterations; None when they must run serially."""
+    if len(jobs) < 2 or cores < len(jobs):
+        return None
+    weights = {tech: max(1, len(subset) * iters) for tech, (subset, iters) in jobs.items()}
+    total = sum(weights.values())
+    budgets = {tech: max(1, int(cores * w / total)) for tech, w in weights.items()}
+    # hand out cores lost to rounding, heaviest technology first
+    for tech in sorted(weights, key=weights.get, reverse=True)[:cores - sum(budgets.values())]:
+        budgets[tech] += 1
+    return budgets
+
+
+def train_within_budget(subset, tech, out_dir, random_iter, cores, options):
+    # BLAS/OpenMP pools inside this process are capped as well, so the process uses exactly `cores`
+    from threadpoolctl import threadpool_limits
+    with threadpool_limits(limits=cores):
+        return train(subset, tech, out_dir, random_iter=random_iter, cores=cores, **options)
+
+
+def train_all(jobs, out_dir, cores, options):
+    """Trains every technology; concurrently in separate processes when the core budget allows it."""
+    budgets = plan_core_budgets(jobs, cores)
+    if budgets is None:
+        return {tech: train_within_budget(subset, tech, out_dir, iters, cores, options)
+                for tech, (subset, iters) in jobs.items()}
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=len(jobs)) as pool:
+        futures = {tech: pool.submit(train_within_budget, subset, tech, out_dir, iters, budgets[tech], options)
+                   for tech, (subset, iters) in jobs.items()}
+        return {tech: future.result() for tech, future in futures.items()}
+
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", type=str, required=True, help="Path to 'signal_data.xlsx'")
     ap.add_argument("--out", type=str, default="artifacts", help="Output folder")
     ap.add_argument("--iters", type=int, default=15, help="RandomizedSearch iterations (digital). FM uses half this.")
+    ap.add_argument("--cleaning", choices=("columnar", "stream", "rowwise"), default="columnar",
+                    help="Cleaning implementation; stream reads the workbook in --chunk-rows chunks with openpyxl "
+                         "(same frame, flat memory); rowwise is the original per-row reference.")
+    ap.add_argument("--sheets", choices=("first", "all"), default="first",
+                    help="all: stream and clean every sheet with the measurement header (adds a `sheet` column)")
+    ap.add_argument("--ingest-workers", type=int, default=1, help="Parallel sheet-cleaning processes (--sheets all)")
+    ap.add_argument("--chunk-rows", type=int, default=STREAM_CHUNK_ROWS, help=f"Rows per streamed cleaning chunk (min {MIN_STREAM_CHUNK_ROWS})")
+    ap.add_argument("--check-cleaning", action="store_true",
+                    help="Only verify that columnar, streaming and rowwise cleaning produce the same frame, then exit.")
+    ap.add_argument("--cache-dir", type=str, default=DEFAULT_CACHE_DIR, help="Folder for the cleaned-data Feather cache")
+    ap.add_argument("--no-cache", action="store_true", help="Always clean the workbook; do not read or write the cache")
+    ap.add_argument("--rebuild-cache", action="store_true", help="Re-clean the workbook and overwrite its cache entry")
+    ap.add_argument("--pipeline-cache-dir", type=str, default=os.path.join(DEFAULT_CACHE_DIR, "pipeline"),
+                    help="joblib.Memory folder for fitted preprocessors shared across search candidates")
+    ap.add_argument("--no-pipeline-cache", action="store_true", help="Refit the preprocessor for every candidate")
+    ap.add_argument("--search", choices=("random", "halving"), default="random",
+                    help="random: RandomizedSearchCV with --iters candidates; halving: successive halving over "
+                         "n_estimators (RF) / rows (DT), candidate count chosen to exhaust the budget")
+    ap.add_argument("--halving-factor", type=int, default=3, help="Candidates kept per halving round = 1/factor")
+    ap.add_argument("--incremental", action="store_true",
+                    help="Update the existing artifacts with rows not seen before instead of a full search")
+    ap.add_argument("--extra-trees", type=int, default=None,
+                    help="Trees added per incremental RandomForest update (default: new rows' share of the forest)")
+    ap.add_argument("--prune-tolerance", type=float, default=None,
+                    help="Keep the smallest (greedy) subset of RandomForest trees whose holdout RMSE is within this "
+                         "fraction of the full forest's, e.g. 0.01; off by default")
+    ap.add_argument("--cores", type=int, default=0,
+                    help="Total core budget (0 = all). Split between technologies trained in parallel processes")
     args = ap.parse_args()
 
-    data = load_and_clean(args.data)
+    if args.check_cleaning:
+        print(json.dumps(check_cleaning_equivalence(args.data, args.chunk_rows), indent=2))
+        return
+
+    if args.cleaning == "rowwise":
+        data = load_and_clean(args.data)
+    else:
+        data = load_cleaned(args.data, None if args.no_cache else args.cache_dir, rebuild=args.rebuild_cache,
+                            stream=args.cleaning == "stream", sheets="all" if args.sheets == "all" else None,
+                            workers=args.ingest_workers, chunk_rows=args.chunk_rows)
+    memory = None if args.no_pipeline_cache else joblib.Memory(ensure_cache_dir(args.pipeline_cache_dir), verbose=0)
     digital = prepare_subset(data, "digital")
     fm = prepare_subset(data, "fm")
 
-    digital_metrics, dm_path = train(digital, "digital", Path(args.out), random_iter=max(5, args.iters))
-    fm_iters = max(4, args.iters // 2)
-    fm_metrics, fm_path = train(fm, "fm", Path(args.out), random_iter=fm_iters)
+    if args.incremental:
+        for tech, subset in (("digital", digital), ("fm", fm)):
+            result = update(subset, tech, Path(args.out), resolve_cores(args.cores), args.extra_trees)
+            if result is not None:
+                print(f"\n{tech.upper()} update:")
+                print(json.dumps(result[0], indent=2, ensure_ascii=False))
+                print(f"Saved model: {result[1]}")
+        return
+
+    options = {"memory": memory, "search_mode": args.search, "halving_factor": args.halving_factor,
+               "prune_tolerance": args.prune_tolerance}
+    jobs = {"digital": (digital, max(5, args.iters)), "fm": (fm, max(4, args.iters // 2))}
+    results = train_all(jobs, Path(args.out), resolve_cores(args.cores), options)
+    (digital_metrics, dm_path), (fm_metrics, fm_path) = results["digital"], results["fm"]
 
     print("Digital metrics:");
     print(json.dumps(digital_metrics, indent=2, ensure_ascii=False))